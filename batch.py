@@ -0,0 +1,317 @@
+# batch.py
+"""
+Offline batch mode using provider Batch APIs, for nightly documentation runs.
+
+Every prompt needed for a set of files (SDD parts, mindmap, summary) is written
+to a Batch-API JSONL file, submitted, polled until the batch finishes and mapped
+back into the file_result dicts the interactive pipeline returns. Batches are
+cheaper and have far higher throughput than interactive calls, at the cost of
+latency.
+
+Oversized inputs need their chunk notes, and summaries need the SDD, before the
+final prompts exist, so each file is described by a batch plan (see
+utils.batch_file_plan) that yields rounds of requests. The rounds of all files
+are merged into one batch per round. Responses are stored in the job directory
+by request hash, so a restarted job replays its plans without resubmitting
+anything that already completed, and resumes polling a batch that was in flight.
+
+Usage:
+    python batch.py src/*.py --options SDD Mindmap Summary --output results.json
+Run the same command again to resume an interrupted job.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+from typing import List, Optional, Tuple
+
+from utils import (
+    batch_file_plan, clean_llm_response, extract_code_from_file, get_current_api_config
+)
+from llm_cache import get_response_cache, is_cache_bypassed
+from llm_clients import lease_client
+
+logger = logging.getLogger(__name__)
+
+# Batch configuration (overridable through environment variables)
+BATCH_DIR = os.getenv(
+    "LLM_BATCH_DIR",
+    os.path.join(os.path.expanduser("~"), ".codedocuai", "batches")
+)
+BATCH_POLL_SECONDS = float(os.getenv("LLM_BATCH_POLL_SECONDS", "30"))
+BATCH_COMPLETION_WINDOW = os.getenv("LLM_BATCH_COMPLETION_WINDOW", "24h")
+BATCH_MAX_ATTEMPTS = int(os.getenv("LLM_BATCH_MAX_ATTEMPTS", "2"))       # Submissions per request before giving up
+BATCH_MAX_REQUESTS = int(os.getenv("LLM_BATCH_MAX_REQUESTS", "50000"))   # Provider limit on lines per batch
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def make_job_id(sources: List[dict], options: List[str], template_name: str, config: dict) -> str:
+    """Derive a stable job id, so rerunning the same command resumes the same job."""
+    payload = json.dumps(
+        [
+            sorted((source['filename'], hashlib.sha256(source['content'].encode("utf-8")).hexdigest())
+                   for source in sources),
+            sorted(options), template_name, config['model'], (config['base_url'] or "").rstrip("/")
+        ]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class BatchJob:
+    """Persistent state of one batch run: inputs, collected responses and the batch in flight."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._state_path = os.path.join(path, "state.json")
+        with open(self._state_path, encoding="utf-8") as f:
+            self.state = json.load(f)
+
+    @classmethod
+    def open(cls, sources: List[dict], options: List[str], template_name: str, config: dict,
+             root: str = BATCH_DIR) -> "BatchJob":
+        """Resume the job for these inputs, or create it."""
+        path = os.path.join(root, make_job_id(sources, options, template_name, config))
+        if not os.path.exists(os.path.join(path, "state.json")):
+            os.makedirs(path, exist_ok=True)
+            state = {
+                'created_at': time.time(),
+                'sources': sources,
+                'options': options,
+                'template': template_name,
+                'results': {},
+                'attempts': {},
+                'batch': None,
+                'rounds': 0
+            }
+            _write_json(os.path.join(path, "state.json"), state)
+        else:
+            logger.info(f"Resuming batch job {path}")
+        return cls(path)
+
+    def save(self) -> None:
+        _write_json(self._state_path, self.state)
+
+    def write_input(self, requests: List[dict]) -> str:
+        """Write a Batch-API JSONL input file for the requests and return its path."""
+        self.state['rounds'] += 1
+        path = os.path.join(self.path, f"input_{self.state['rounds']:03d}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for request in requests:
+                line = {
+                    'custom_id': request['custom_id'],
+                    'method': "POST",
+                    'url': BATCH_ENDPOINT,
+                    'body': request['body']
+                }
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        return path
+
+
+def _write_json(path: str, data) -> None:
+    """Write JSON atomically so a crash never leaves a truncated state file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _parse_output_line(line: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """Parse one line of a batch output or error file into (custom_id, content, error)."""
+    record = json.loads(line)
+    response = record.get('response') or {}
+    body = response.get('body') or {}
+    if response.get('status_code') == 200 and body.get('choices'):
+        return record['custom_id'], body['choices'][0]['message']['content'], None
+    error = record.get('error') or body.get('error') or f"HTTP {response.get('status_code')}"
+    return record['custom_id'], None, json.dumps(error) if not isinstance(error, str) else error
+
+
+class ProviderBatchBackend:
+    """OpenAI-compatible Batch API: upload the JSONL, create a batch, poll it and download the output."""
+
+    def __init__(self, config: dict, poll_seconds: float = BATCH_POLL_SECONDS):
+        if not config['api_key']:
+            raise ValueError("OpenAI API key not configured. Please set your API key in the interface.")
+        self._endpoint = (config['provider'], config['base_url'], config['api_key'])
+        self._poll_seconds = poll_seconds
+
+    def _lease(self):
+        # Lease per request: a batch outlives many pool reconfigurations
+        return lease_client(*self._endpoint)
+
+    def submit(self, input_path: str) -> dict:
+        with self._lease() as client:
+            with open(input_path, "rb") as f:
+                uploaded = client.files.create(file=f, purpose="batch")
+            batch = client.batches.create(
+                input_file_id=uploaded.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=BATCH_COMPLETION_WINDOW,
+                metadata={"source": "codedocuai"}
+            )
+        logger.info(f"Submitted batch {batch.id} ({input_path})")
+        return {'id': batch.id, 'input_file_id': uploaded.id}
+
+    def wait(self, batch_record: dict) -> dict:
+        """Poll until the batch finishes; returns {custom_id: (content, error)} for every line it reports."""
+        while True:
+            with self._lease() as client:
+                batch = client.batches.retrieve(batch_record['id'])
+            if batch.status in TERMINAL_STATUSES:
+                break
+            counts = batch.request_counts
+            logger.info(f"Batch {batch.id} {batch.status}: "
+                        f"{counts.completed if counts else 0}/{counts.total if counts else '?'} done")
+            time.sleep(self._poll_seconds)
+        logger.info(f"Batch {batch.id} finished with status {batch.status}")
+
+        outcomes = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            with self._lease() as client:
+                output = client.files.content(file_id).text
+            for line in output.splitlines():
+                if line.strip():
+                    custom_id, content, error = _parse_output_line(line)
+                    outcomes[custom_id] = (content, error)
+        return outcomes
+
+
+def _collect(job: BatchJob, backend, requests: List[dict]) -> None:
+    """Run one batch for requests still missing a response (or resume the one in flight) and store the results."""
+    if job.state['batch'] is None:
+        requests = requests[:BATCH_MAX_REQUESTS]
+        batch_record = backend.submit(job.write_input(requests))
+        batch_record['custom_ids'] = [request['custom_id'] for request in requests]
+        job.state['batch'] = batch_record
+        job.save()
+
+    batch_record = job.state['batch']
+    outcomes = backend.wait(batch_record)
+    cache = get_response_cache()
+    for custom_id in batch_record['custom_ids']:
+        content, error = outcomes.get(custom_id, (None, "missing from batch output"))
+        if content is not None:
+            response = clean_llm_response(content.strip())
+            job.state['results'][custom_id] = response
+            if response:
+                cache.put(custom_id, response)
+        else:
+            job.state['attempts'][custom_id] = job.state['attempts'].get(custom_id, 0) + 1
+            logger.warning(f"Batch request {custom_id[:12]} failed: {error}")
+    job.state['batch'] = None
+    job.save()
+
+
+def run_batch_job(job: BatchJob, backend, config: dict) -> Tuple[list, list]:
+    """
+    Drive the batch plans of every file in the job to completion.
+
+    Returns:
+        Tuple of (file results in input order, [(filename, error message), ...]),
+        like the interactive pipeline
+    """
+    sources = job.state['sources']
+    plans = {}
+    pending = {}
+    outcomes = {}
+    errors = []
+
+    def advance(i, responses=None):
+        try:
+            pending[i] = plans[i].send(responses)
+        except StopIteration as stop:
+            pending.pop(i, None)
+            outcomes[i] = stop.value
+        except Exception as e:
+            pending.pop(i, None)
+            logger.error(f"Error processing {sources[i]['filename']}: {str(e)}")
+            errors.append((sources[i]['filename'], str(e)))
+
+    for i, source in enumerate(sources):
+        plans[i] = batch_file_plan(source, job.state['options'], job.state['template'], config)
+        advance(i)
+
+    cache = get_response_cache()
+    results = job.state['results']
+    while pending:
+        requests = {request['custom_id']: request for batch in pending.values() for request in batch}
+        if not is_cache_bypassed():
+            for custom_id in requests:
+                if custom_id not in results:
+                    cached_response = cache.get(custom_id)
+                    if cached_response is not None:
+                        results[custom_id] = cached_response
+        missing = [
+            request for custom_id, request in requests.items()
+            if custom_id not in results and job.state['attempts'].get(custom_id, 0) < BATCH_MAX_ATTEMPTS
+        ]
+        if missing or job.state['batch'] is not None:
+            logger.info(f"Batch round with {len(missing)} of {len(requests)} requests to run")
+            _collect(job, backend, missing)
+            continue
+
+        for i, batch in list(pending.items()):
+            advance(i, [results.get(request['custom_id']) for request in batch])
+
+    return [outcomes[i] for i in sorted(outcomes)], errors
+
+
+def run_batch(sources: List[dict], options: List[str], template_name: str,
+              config: Optional[dict] = None, root: str = BATCH_DIR,
+              poll_seconds: float = BATCH_POLL_SECONDS) -> Tuple[list, list]:
+    """
+    Analyze files through the provider's Batch API, resuming the matching job if one exists.
+
+    Args:
+        sources: List of {'filename', 'content'} dicts
+        options: Artifacts to generate ("SDD", "Mindmap", "Summary")
+        template_name: SDD template to use
+        config: API configuration snapshot (defaults to get_current_api_config())
+        root: Directory holding job state
+        poll_seconds: Interval between batch status checks
+
+    Returns:
+        Tuple of (results in input order, [(filename, error message), ...])
+    """
+    config = config or get_current_api_config()
+    job = BatchJob.open(sources, options, template_name, config, root)
+    return run_batch_job(job, ProviderBatchBackend(config, poll_seconds), config)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate documentation for files through a provider Batch API.")
+    parser.add_argument("files", nargs="+", help="Source files to document")
+    parser.add_argument("--options", nargs="+", default=["SDD", "Mindmap", "Summary"],
+                        choices=["SDD", "Mindmap", "Summary"], help="Artifacts to generate")
+    parser.add_argument("--template", default="standard", help="SDD template")
+    parser.add_argument("--output", default="batch_results.json", help="Where to write the results")
+    parser.add_argument("--job-dir", default=BATCH_DIR, help="Directory holding job state")
+    parser.add_argument("--poll", type=float, default=BATCH_POLL_SECONDS, help="Seconds between status checks")
+    args = parser.parse_args(argv)
+
+    sources = []
+    for path in args.files:
+        try:
+            with open(path, "rb") as f:
+                sources.append({'filename': os.path.basename(path), 'content': extract_code_from_file(f)})
+        except ValueError as e:
+            logger.error(f"Skipping {path}: {str(e)}")
+
+    results, errors = run_batch(sources, args.options, args.template, root=args.job_dir, poll_seconds=args.poll)
+    _write_json(args.output, {'results': results, 'errors': errors})
+    for filename, message in errors:
+        print(f"Error processing {filename}: {message}", file=sys.stderr)
+    print(f"Wrote {len(results)} file results to {args.output}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
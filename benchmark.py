@@ -0,0 +1,317 @@
+# benchmark.py
+"""
+End-to-end benchmark of the analysis pipeline against the local mock provider.
+
+For every scenario in the matrix (file count x file size x template x
+concurrency) synthetic source files are written to disk and run through each
+stage on its own: file extraction, get_SDD, get_SDD_perSection, get_mindmap,
+summarize_text, markmap HTML generation and the zip export. Then the whole
+async pipeline runs over all files. The report gives files/minute for the
+pipeline, p50/p95 latency per stage, peak RSS and how far RSS grew above its
+level at the start of the scenario (the process is shared by all scenarios,
+so only the growth is attributable to one). It can be saved as a baseline,
+and later runs flag regressions beyond a relative threshold.
+
+Usage:
+    python benchmark.py --save-baseline                     # record a baseline
+    python benchmark.py --files 1 8 --sizes 4 64 --concurrency 2 8
+    python benchmark.py --profile instant --threshold 0.1   # local overhead only
+Exits with status 1 when a regression is found.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import shutil
+import tempfile
+import threading
+import itertools
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Benchmark configuration
+BASELINE_PATH = os.getenv("BENCHMARK_BASELINE", "benchmark_baseline.json")
+REGRESSION_THRESHOLD = 0.2       # Relative change that counts as a regression
+MIN_LATENCY_DELTA = 0.02         # Seconds; smaller latency changes are noise
+MIN_RSS_DELTA_MB = 5.0           # Megabytes; smaller memory changes are noise
+RSS_SAMPLE_SECONDS = 0.05
+STAGES = ["extract", "sdd", "sdd_per_section", "mindmap", "summary", "markmap_html", "export"]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(pct / 100.0 * len(ordered))) - 1]
+
+
+def _current_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _max_rss_bytes() -> int:
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class RssSampler:
+    """
+    Tracks resident memory at the start and its peak while running; falls back to the
+    process-wide ru_maxrss, whose growth understates memory reused from earlier scenarios.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.start = 0
+        self.peak = 0
+
+    @property
+    def growth(self) -> int:
+        """Peak resident memory above the level at the start."""
+        return max(0, self.peak - self.start)
+
+    def __enter__(self):
+        current = _current_rss_bytes()
+        self.start = current if current is not None else _max_rss_bytes()
+        self.peak = current or 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self.peak = max(self.peak, _current_rss_bytes() or 0)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if not self.peak:
+            self.peak = _max_rss_bytes()
+        return False
+
+
+def synthetic_source(size_kb: int, seed: int) -> str:
+    """Deterministic Python-like source of roughly size_kb kilobytes."""
+    rng = random.Random(seed)
+    nouns = ["order", "invoice", "customer", "payment", "report", "session", "record", "token", "batch", "queue"]
+    verbs = ["load", "validate", "process", "render", "store", "fetch", "merge", "export", "retry", "parse"]
+    parts = [f'"""Synthetic module {seed} for benchmarking."""\n\nimport os\nimport json\n\n']
+    size = len(parts[0])
+    index = 0
+    while size < size_kb * 1024:
+        noun = rng.choice(nouns)
+        cls = (
+            f"class {noun.title()}Service{index}:\n"
+            f'    """Handles {noun} records."""\n\n'
+            f"    def __init__(self, config):\n"
+            f"        self.config = config\n"
+            f"        self.items = []\n\n"
+        )
+        for verb in rng.sample(verbs, 3):
+            cls += (
+                f"    def {verb}_{noun}(self, item, retries=3):\n"
+                f'        """{verb.title()} one {noun}."""\n'
+                f"        for attempt in range(retries):\n"
+                f"            if item.get('{noun}_id') is None:\n"
+                f"                raise ValueError('missing {noun} id')\n"
+                f"            self.items.append(item)\n"
+                f"        return json.dumps(item)\n\n"
+            )
+        parts.append(cls + "\n")
+        size += len(cls) + 1
+        index += 1
+    return "".join(parts)
+
+
+def _timed(timings: dict, stage: str, fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings.setdefault(stage, []).append(time.perf_counter() - started)
+    return result
+
+
+def run_scenario(files: int, size_kb: int, template: str, concurrency: int, workdir: str) -> dict:
+    """Run every stage and the full pipeline for one scenario and return its metrics."""
+    from utils import extract_code_from_file, get_SDD, get_SDD_perSection, get_mindmap, summarize_text
+    from pipeline import analyze_files
+    from markmap_component import generate_markmap_html
+    from export import build_results_archive
+
+    paths = []
+    for i in range(files):
+        path = os.path.join(workdir, f"module_{size_kb}k_{i}.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(synthetic_source(size_kb, seed=size_kb * 1000 + i))
+        paths.append(path)
+
+    timings = {}
+    with RssSampler() as rss:
+        sources = []
+        results = []
+        for path in paths:
+            with open(path, "rb") as f:
+                text = _timed(timings, "extract", extract_code_from_file, f)
+            sources.append({'filename': os.path.basename(path), 'content': text})
+            sdd = _timed(timings, "sdd", get_SDD, text, template)
+            _timed(timings, "sdd_per_section", get_SDD_perSection, text, template, max_workers=concurrency)
+            mindmap = _timed(timings, "mindmap", get_mindmap, text)
+            summary = _timed(timings, "summary", summarize_text, sdd)
+            _timed(timings, "markmap_html", generate_markmap_html, mindmap)
+            results.append({'filename': os.path.basename(path), 'content': text, 'sdd': sdd,
+                            'mindmap': mindmap, 'summary': summary, 'template_used': template})
+        _timed(timings, "export", build_results_archive, results)
+
+        started = time.perf_counter()
+        pipeline_results, errors = analyze_files(
+            sources, ["SDD", "Mindmap", "Summary"], template,
+            max_concurrency=concurrency, per_provider_concurrency=concurrency
+        )
+        pipeline_seconds = time.perf_counter() - started
+
+    def rounded(value, digits=4):
+        return round(value, digits) if value is not None else None
+
+    return {
+        'files_per_minute': round(len(pipeline_results) / pipeline_seconds * 60.0, 2),
+        'pipeline_seconds': round(pipeline_seconds, 3),
+        'pipeline_errors': len(errors),
+        'peak_rss_mb': round(rss.peak / (1024 * 1024), 1),
+        'rss_growth_mb': round(rss.growth / (1024 * 1024), 1),
+        'stages': {
+            stage: {'p50': rounded(percentile(timings[stage], 50)), 'p95': rounded(percentile(timings[stage], 95)),
+                    'calls': len(timings[stage])}
+            for stage in STAGES if stage in timings
+        }
+    }
+
+
+def scenario_key(files: int, size_kb: int, template: str, concurrency: int) -> str:
+    return f"files={files},size_kb={size_kb},template={template},concurrency={concurrency}"
+
+
+def find_regressions(current: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """Compare scenario metrics against a baseline; returns a description of every regression."""
+    regressions = []
+
+    def check(name, old, new, higher_is_better, min_delta):
+        # A zero baseline has no relative change to compare against
+        if old is None or new is None or not old or abs(new - old) < min_delta:
+            return
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > threshold:
+            regressions.append(f"{name}: {old} -> {new} ({change:+.0%} worse)")
+
+    for key, metrics in current.items():
+        old = baseline.get(key)
+        if not old:
+            continue
+        check(f"{key} files_per_minute", old['files_per_minute'], metrics['files_per_minute'], True, 0.0)
+        check(f"{key} rss_growth_mb", old.get('rss_growth_mb'), metrics['rss_growth_mb'], False, MIN_RSS_DELTA_MB)
+        for stage, stats in metrics['stages'].items():
+            if stage in old['stages']:
+                check(f"{key} {stage} p95", old['stages'][stage]['p95'], stats['p95'], False, MIN_LATENCY_DELTA)
+    return regressions
+
+
+def _print_report(report: dict) -> None:
+    for key, metrics in report['scenarios'].items():
+        print(f"\n{key}")
+        print(f"  pipeline: {metrics['files_per_minute']} files/min ({metrics['pipeline_seconds']}s, "
+              f"{metrics['pipeline_errors']} errors) • peak RSS {metrics['peak_rss_mb']} MB "
+              f"(+{metrics['rss_growth_mb']} MB)")
+        for stage, stats in metrics['stages'].items():
+            print(f"  {stage:<16} p50 {stats['p50']:.4f}s  p95 {stats['p95']:.4f}s  ({stats['calls']} calls)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline against the local mock provider.")
+    parser.add_argument("--files", type=int, nargs="+", default=[1, 4], help="File counts")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 48], help="File sizes in KB")
+    parser.add_argument("--templates", nargs="+", default=["standard"], help="SDD templates")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4], help="Pipeline concurrency limits")
+    parser.add_argument("--profile", default="fast", help="Mock server latency profile")
+    parser.add_argument("--seed", type=int, default=1, help="Mock server seed")
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Save this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative change that counts as a regression")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="codedocuai-bench-")
+    try:
+        return _run_benchmark(args, workdir)
+    finally:
+        # Holds the synthetic sources and both SQLite caches
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run_benchmark(args: argparse.Namespace, workdir: str) -> int:
+    # Configure before the app modules are imported: they read these at import time
+    os.environ.setdefault("LLM_CACHE_PATH", os.path.join(workdir, "llm_cache.sqlite3"))
+    os.environ.setdefault("LLM_RESULT_STORE_PATH", os.path.join(workdir, "results.sqlite3"))
+
+    import mock_server
+    from llm_cache import set_cache_bypass
+    server = mock_server.serve(port=0, profile=mock_server.LATENCY_PROFILES[args.profile], seed=args.seed)
+    os.environ.update(
+        OPENAI_API_KEY="mock-key",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        OPENAI_MODEL="mock-model",
+        API_PROVIDER="Mock"
+    )
+    # Every run must reach the provider; cached responses would measure nothing
+    set_cache_bypass(True)
+
+    report = {'profile': args.profile, 'created_at': time.time(), 'scenarios': {}}
+    try:
+        for files, size_kb, template, concurrency in itertools.product(
+                args.files, args.sizes, args.templates, args.concurrency):
+            key = scenario_key(files, size_kb, template, concurrency)
+            print(f"Running {key} ...", flush=True)
+            report['scenarios'][key] = run_scenario(files, size_kb, template, concurrency, workdir)
+    finally:
+        server.shutdown()
+
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get('profile') != args.profile:
+            print(f"\nBaseline was recorded with profile {baseline.get('profile')}; not comparing")
+        else:
+            regressions = find_regressions(report['scenarios'], baseline['scenarios'], args.threshold)
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%} against {args.baseline}")
+            for regression in regressions:
+                print(f"  REGRESSION {regression}")
+            status = 1 if regressions else 0
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# dedup.py
+"""
+Exact and near-duplicate detection across a multi-file upload.
+
+Projects often carry copies of the same file (vendored helpers, per-service
+config loaders, generated clients) that would otherwise each cost a full set
+of LLM calls. Files with identical code tokens are exact duplicates and reuse
+the first copy's results outright. That comparison ignores only layout that
+cannot change behavior: string literals are compared verbatim, and Python
+files also keep the leading indentation of every line, since it decides which
+block a statement belongs to. The rest get a bottom-k MinHash sketch (the
+MINHASH_SIZE smallest 64-bit hashes of their token shingles, where whitespace
+never matters), from which the Jaccard similarity of any two files is
+estimated without comparing them in full. Candidate pairs come from an inverted index over
+sketch values, so a file is only compared with files it shares hashes with.
+A file at least NEAR_DUPLICATE_THRESHOLD similar to an earlier one, with a
+small enough diff, is documented from that sibling's artifacts and the diff
+instead of from scratch (see utils.aderive_artifact).
+"""
+
+import os
+import re
+import heapq
+import difflib
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from skeleton import PYTHON_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Duplicate detection configuration (overridable through environment variables)
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("LLM_NEAR_DUPLICATE_THRESHOLD", "0.8"))  # Estimated Jaccard similarity
+MINHASH_SIZE = int(os.getenv("LLM_MINHASH_SIZE", "128"))                            # Hashes kept per sketch
+MAX_SIBLING_DIFF_CHARS = int(os.getenv("LLM_MAX_SIBLING_DIFF_CHARS", "12000"))      # Larger diffs are documented in full
+MIN_NEAR_DUPLICATE_CHARS = 1000  # Smaller files cost no more to document than their diff
+SHINGLE_TOKENS = 5
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+# Exact fingerprints keep string literals whole, and for Python the indentation starting each line
+STRING_LITERAL = r'"""[\s\S]*?"""|' r"'''[\s\S]*?'''|" r'"(?:\\.|[^"\\\n])*"|' r"'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`"
+EXACT_TOKEN_PATTERN = re.compile(rf"{STRING_LITERAL}|\w+|[^\w\s]")
+PYTHON_EXACT_TOKEN_PATTERN = re.compile(rf"^[ \t]+(?=\S)|{STRING_LITERAL}|\w+|[^\w\s]", re.MULTILINE)
+
+
+class Duplicate:
+    """A file that repeats an earlier file of the same upload, exactly or nearly."""
+
+    def __init__(self, index: int, sibling: int, similarity: float, diff: Optional[str] = None):
+        self.index = index
+        self.sibling = sibling
+        self.similarity = similarity
+        self.diff = diff    # Unified diff from the sibling; None for an exact duplicate
+
+    @property
+    def exact(self) -> bool:
+        return self.diff is None
+
+
+def _fingerprint(name: str, text: str) -> str:
+    """Hash of a file's code tokens with string literals verbatim, and for Python each line's indentation."""
+    python = os.path.splitext(name.lower())[1] in PYTHON_TYPES
+    tokens = (PYTHON_EXACT_TOKEN_PATTERN if python else EXACT_TOKEN_PATTERN).findall(text)
+    return hashlib.sha256("\0".join(tokens).encode("utf-8")).hexdigest()
+
+
+def sketch(tokens: List[str], size: int = MINHASH_SIZE) -> List[int]:
+    """Bottom-k MinHash sketch: the size smallest 64-bit hashes of the token shingles, ascending."""
+    count = max(1, len(tokens) - SHINGLE_TOKENS + 1)
+    hashes = {
+        int.from_bytes(hashlib.blake2b(" ".join(tokens[i:i + SHINGLE_TOKENS]).encode("utf-8"),
+                                       digest_size=8).digest(), "big")
+        for i in range(count)
+    }
+    return heapq.nsmallest(size, hashes)
+
+
+def similarity(a: List[int], b: List[int], size: int = MINHASH_SIZE) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two sketches."""
+    if not a or not b:
+        return 0.0
+    set_a, set_b = set(a), set(b)
+    union = heapq.nsmallest(size, set_a | set_b)
+    return sum(1 for h in union if h in set_a and h in set_b) / len(union)
+
+
+def sibling_diff(sibling_name: str, sibling_text: str, filename: str, text: str) -> str:
+    """Unified diff turning the sibling's text into text."""
+    return "".join(difflib.unified_diff(
+        sibling_text.splitlines(keepends=True), text.splitlines(keepends=True),
+        fromfile=sibling_name, tofile=filename, n=2
+    ))
+
+
+def find_duplicates(names: List[str], texts: List[Optional[str]],
+                    threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Dict[int, Duplicate]:
+    """
+    Duplicates among the files of an upload, keyed by file index. An exact duplicate points at
+    the first copy of its text, which may itself be a near duplicate; a near duplicate points
+    at an earlier file that is documented in full. Texts that are None (unreadable) are ignored.
+    """
+    duplicates = {}
+    originals = {}     # token fingerprint -> index of its first file
+    sketches = {}      # index of a documented file -> sketch
+    postings = {}      # sketch hash -> indexes of documented files containing it
+    for index, text in enumerate(texts):
+        if text is None:
+            continue
+        tokens = TOKEN_PATTERN.findall(text)
+        if not tokens:
+            continue
+        fingerprint = _fingerprint(names[index], text)
+        if fingerprint in originals:
+            duplicates[index] = Duplicate(index, originals[fingerprint], 1.0)
+            continue
+        originals[fingerprint] = index
+        current = sketch(tokens)
+        if len(text) >= MIN_NEAR_DUPLICATE_CHARS:
+            shared = {}
+            for h in current:
+                for other in postings.get(h, ()):
+                    shared[other] = shared.get(other, 0) + 1
+            # Two sketches of files with similarity J share about 2J/(1+J) of their hashes
+            minimum = threshold * len(current) / 2
+            best = None
+            for other in sorted(shared, key=lambda i: (-shared[i], i)):
+                if shared[other] < minimum:
+                    break
+                score = similarity(current, sketches[other])
+                if score >= threshold and (best is None or score > best[1]):
+                    best = (other, score)
+            if best is not None:
+                diff = sibling_diff(names[best[0]], texts[best[0]], names[index], text)
+                if len(diff) <= min(MAX_SIBLING_DIFF_CHARS, len(text) // 2):
+                    duplicates[index] = Duplicate(index, best[0], best[1], diff)
+                    continue
+        sketches[index] = current
+        for h in current:
+            postings.setdefault(h, []).append(index)
+    if duplicates:
+        exact = sum(1 for duplicate in duplicates.values() if duplicate.exact)
+        logger.info(f"Found {exact} exact and {len(duplicates) - exact} near duplicates in {len(texts)} files")
+    return duplicates
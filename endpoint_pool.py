@@ -0,0 +1,251 @@
+# endpoint_pool.py
+"""
+Weighted load balancing across a pool of (provider, base_url, model, key) endpoints.
+
+Every call leases one endpoint from the pool formed by the active API
+configuration plus any extra endpoints. Endpoints are picked at random in
+proportion to their configured weight, scaled down by their observed latency,
+recent error rate and current load, and never beyond their concurrency cap.
+Endpoints without an explicit max_concurrency are uncapped, so the pool never
+throttles a single configured endpoint on its own.
+Because each endpoint has its own API key, rate-limit bucket and connection
+pool, aggregate throughput grows with the number of keys.
+"""
+
+import os
+import json
+import hashlib
+import time
+import random
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration
+LATENCY_SMOOTHING = 0.2          # EWMA weight of each new latency sample
+ERROR_SMOOTHING = 0.3            # EWMA weight of each new success/failure
+ERROR_HALF_LIFE_SECONDS = 60.0   # Error rate halves every minute without new calls
+MIN_SELECTION_WEIGHT = 0.01      # Failing endpoints keep a small chance so they can recover
+WAIT_POLL_SECONDS = 1.0          # Async waiters re-check at least this often
+
+
+def endpoint_label(config: dict) -> str:
+    """Human-readable endpoint name that distinguishes keys by a fingerprint without revealing them."""
+    api_key = config.get('api_key') or ""
+    if not api_key:
+        return config['provider']
+    return f"{config['provider']} #{hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _endpoint_key(config: dict) -> tuple:
+    return (config['provider'], (config['base_url'] or "").rstrip("/"), config['model'], config.get('api_key') or "")
+
+
+def _concurrency_cap(config: dict) -> Optional[int]:
+    """Explicit concurrency cap of an endpoint, or None if it is uncapped."""
+    max_concurrency = config.get('max_concurrency')
+    return int(max_concurrency) if max_concurrency else None
+
+
+class _EndpointState:
+    """Load and health of one endpoint."""
+
+    def __init__(self, config: dict):
+        self.label = endpoint_label(config)
+        self.weight = float(config.get('weight') or 1.0)
+        self.max_concurrency = _concurrency_cap(config)
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.latency = None
+        self.error_rate = 0.0
+        self.error_updated = time.monotonic()
+
+    def current_error_rate(self, now: float) -> float:
+        return self.error_rate * 0.5 ** ((now - self.error_updated) / ERROR_HALF_LIFE_SECONDS)
+
+    def score(self, now: float, default_latency: float) -> float:
+        latency = self.latency or default_latency
+        health = (1.0 - self.current_error_rate(now)) ** 2
+        return max(MIN_SELECTION_WEIGHT, self.weight * health) / (latency * (self.in_flight + 1))
+
+
+class EndpointPool:
+    """Process-wide pool of extra endpoints plus per-endpoint load and health statistics."""
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._extra = []
+        self._states = {}
+        self._async_waiters = []
+        self._load_from_env()
+
+    def _load_from_env(self) -> None:
+        raw = os.getenv("LLM_ENDPOINT_POOL")
+        if not raw:
+            return
+        try:
+            for config in json.loads(raw):
+                self.add_endpoint(config)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.error(f"Ignoring invalid LLM_ENDPOINT_POOL: {str(e)}")
+
+    def add_endpoint(self, config: dict) -> None:
+        """Add an extra endpoint (provider, base_url, model, api_key, optional weight/max_concurrency)."""
+        endpoint = {
+            'provider': config['provider'],
+            'base_url': config['base_url'],
+            'model': config['model'],
+            'api_key': config['api_key'],
+            'weight': float(config.get('weight') or 1.0),
+            'max_concurrency': _concurrency_cap(config),
+        }
+        with self._lock:
+            self._extra = [e for e in self._extra if _endpoint_key(e) != _endpoint_key(endpoint)] + [endpoint]
+            self._states.pop(_endpoint_key(endpoint), None)
+        logger.info(f"Added endpoint {endpoint_label(endpoint)} to the pool")
+
+    def remove_endpoint(self, label: str) -> None:
+        with self._lock:
+            removed = [e for e in self._extra if endpoint_label(e) == label]
+            self._extra = [e for e in self._extra if endpoint_label(e) != label]
+            for endpoint in removed:
+                self._states.pop(_endpoint_key(endpoint), None)
+
+    def extra_endpoints(self) -> List[dict]:
+        """Snapshot of the extra endpoints, for inclusion in an API configuration."""
+        with self._lock:
+            return [dict(endpoint) for endpoint in self._extra]
+
+    def _state(self, config: dict) -> _EndpointState:
+        key = _endpoint_key(config)
+        state = self._states.get(key)
+        if state is None:
+            state = _EndpointState(config)
+            self._states[key] = state
+        return state
+
+    def _try_acquire(self, config: dict) -> Optional[tuple]:
+        """Pick and reserve an endpoint under the lock, or return None if all are at capacity."""
+        candidates = [config] + list(config.get('endpoints') or [])
+        states = [(endpoint, self._state(endpoint)) for endpoint in candidates]
+        available = [(endpoint, state) for endpoint, state in states
+                     if state.max_concurrency is None or state.in_flight < state.max_concurrency]
+        if not available:
+            return None
+
+        now = time.monotonic()
+        # Endpoints without latency samples are scored optimistically so they get tried
+        known = [state.latency for _, state in states if state.latency]
+        default_latency = min(known) if known else 1.0
+        scores = [state.score(now, default_latency) for _, state in available]
+        endpoint, state = random.choices(available, weights=scores)[0]
+        state.in_flight += 1
+        state.requests += 1
+        return endpoint, state
+
+    def _release(self, state: _EndpointState, seconds: Optional[float], failed: bool) -> None:
+        """Free the endpoint's slot and update its health; seconds is None for cancelled calls."""
+        with self._lock:
+            state.in_flight -= 1
+            if seconds is not None:
+                now = time.monotonic()
+                error_rate = state.current_error_rate(now)
+                if failed:
+                    state.errors += 1
+                    state.error_rate = error_rate + ERROR_SMOOTHING * (1.0 - error_rate)
+                else:
+                    state.error_rate = error_rate * (1.0 - ERROR_SMOOTHING)
+                    state.latency = seconds if state.latency is None else (
+                        state.latency + LATENCY_SMOOTHING * (seconds - state.latency)
+                    )
+                state.error_updated = now
+            self._lock.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(lambda w=waiter: w.done() or w.set_result(None))
+            except RuntimeError:
+                pass  # The waiter's event loop has already closed
+
+    @contextmanager
+    def lease(self, config: dict):
+        """
+        Borrow an endpoint for one request, blocking while every endpoint is at capacity.
+        Yields the endpoint's configuration; latency and failures are recorded on exit.
+        """
+        with self._lock:
+            acquired = self._try_acquire(config)
+            while acquired is None:
+                self._lock.wait()
+                acquired = self._try_acquire(config)
+        endpoint, state = acquired
+        started = time.monotonic()
+        try:
+            yield endpoint
+        except GeneratorExit:
+            # A streaming consumer stopped reading; that says nothing about the endpoint's health
+            self._release(state, None, False)
+            raise
+        except BaseException:
+            self._release(state, time.monotonic() - started, True)
+            raise
+        self._release(state, time.monotonic() - started, False)
+
+    @asynccontextmanager
+    async def alease(self, config: dict):
+        """Async variant of lease; waits on the event loop instead of blocking it."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                acquired = self._try_acquire(config)
+                if acquired is None:
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+            if acquired is not None:
+                break
+            try:
+                await asyncio.wait_for(waiter, WAIT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        endpoint, state = acquired
+        started = time.monotonic()
+        try:
+            yield endpoint
+        except asyncio.CancelledError:
+            # Cancelled calls (e.g. a losing hedge) say nothing about the endpoint's health
+            self._release(state, None, False)
+            raise
+        except BaseException:
+            self._release(state, time.monotonic() - started, True)
+            raise
+        self._release(state, time.monotonic() - started, False)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                state.label: {
+                    'weight': state.weight,
+                    'in_flight': state.in_flight,
+                    'max_concurrency': state.max_concurrency,
+                    'requests': state.requests,
+                    'errors': state.errors,
+                    'error_rate': round(state.current_error_rate(now), 3),
+                    'latency': round(state.latency, 2) if state.latency is not None else None,
+                }
+                for state in self._states.values()
+            }
+
+
+# Process-wide pool shared by all sessions
+_pool = EndpointPool()
+
+
+def get_endpoint_pool() -> EndpointPool:
+    """Get the shared endpoint pool."""
+    return _pool
@@ -0,0 +1,59 @@
+# export.py
+"""
+Packaging of analysis results for download.
+"""
+
+import os
+import io
+import zipfile
+from typing import Dict, List
+
+from markmap_component import create_markmap_download_link
+
+
+def export_entries(result: dict) -> Dict[str, str]:
+    """
+    Archive members for one file result: SDD, mindmap (markdown and interactive HTML) and
+    summary. The pipeline precomputes these as its export step and stores them under 'exports'.
+    Names keep the file's extension, so src/foo.c and src/foo.h get distinct members.
+    """
+    base_name = result['filename']
+    entries = {}
+    if result.get('sdd'):
+        entries[f"{base_name}_SDD.md"] = result['sdd']
+    if result.get('mindmap'):
+        entries[f"{base_name}_mindmap.md"] = result['mindmap']
+        # Add interactive HTML mindmap
+        entries[f"{base_name}_mindmap.html"] = create_markmap_download_link(result['mindmap'], base_name)
+    if result.get('summary'):
+        entries[f"{base_name}_summary.md"] = result['summary']
+    return entries
+
+
+def build_results_archive(results: List[dict]) -> bytes:
+    """
+    Bundle every generated artifact of every file into a zip.
+
+    Args:
+        results: file_result dicts as returned by the analysis pipeline
+
+    Returns:
+        Zip file contents
+    """
+    zip_buffer = io.BytesIO()
+
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        written = set()
+        for result in results:
+            entries = result.get('exports') or export_entries(result)
+            for name, content in entries.items():
+                # Uploads with the same name (from different folders) must not overwrite each other
+                stem, ext = os.path.splitext(name)
+                copy = 1
+                while name in written:
+                    copy += 1
+                    name = f"{stem} ({copy}){ext}"
+                written.add(name)
+                zip_file.writestr(name, content)
+
+    return zip_buffer.getvalue()
@@ -0,0 +1,227 @@
+# hedging.py
+"""
+Hedged requests and provider failover.
+
+Successful call latencies are tracked per provider. When a call to the
+primary provider runs past a chosen latency percentile, a duplicate request
+is sent to the secondary provider and the first response wins; the loser is
+cancelled (async) or abandoned (threads). Hard failures of the primary fail
+over to the secondary. The hedge delay runs from the moment the primary's
+request is dispatched, so time spent waiting for a concurrency slot, endpoint
+or rate limit never triggers a hedge. Synchronous primaries run on a thread
+of their own rather than a shared pool, so hedging never caps how many calls
+run at once.
+"""
+
+import os
+import math
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Hedging configuration (overridable through environment variables)
+LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))           # Recent calls kept per provider
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))      # Samples needed before hedging
+HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))         # Never hedge calls faster than this
+HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "16"))              # Threads for synchronous hedges
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies per provider, with percentiles."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self._samples = {}
+        self._hedges = {}
+        self._hedge_wins = {}
+        self._failovers = {}
+
+    def record(self, provider: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(provider, deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, provider: str, pct: float, min_samples: int = 1) -> Optional[float]:
+        """Nearest-rank percentile of recent latencies, or None with fewer than min_samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(provider, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        rank = max(1, math.ceil(pct / 100.0 * len(samples)))
+        return samples[rank - 1]
+
+    def _count(self, counter: dict, provider: str) -> None:
+        with self._lock:
+            counter[provider] = counter.get(provider, 0) + 1
+
+    def record_hedge(self, provider: str, won: bool) -> None:
+        """Count a hedge sent on behalf of provider, and whether the hedge won."""
+        self._count(self._hedges, provider)
+        if won:
+            self._count(self._hedge_wins, provider)
+
+    def record_failover(self, provider: str) -> None:
+        self._count(self._failovers, provider)
+
+    def stats(self) -> dict:
+        with self._lock:
+            providers = list(dict.fromkeys([*self._samples, *self._hedges, *self._failovers]))
+        stats = {}
+        for provider in providers:
+            p50, p95, p99 = (self.percentile(provider, pct) for pct in (50, 95, 99))
+            with self._lock:
+                stats[provider] = {
+                    'samples': len(self._samples.get(provider, ())),
+                    'p50': round(p50, 2) if p50 is not None else None,
+                    'p95': round(p95, 2) if p95 is not None else None,
+                    'p99': round(p99, 2) if p99 is not None else None,
+                    'hedges': self._hedges.get(provider, 0),
+                    'hedge_wins': self._hedge_wins.get(provider, 0),
+                    'failovers': self._failovers.get(provider, 0),
+                }
+        return stats
+
+
+# Process-wide tracker shared by all sessions
+_latency_tracker = LatencyTracker()
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Get the shared latency tracker."""
+    return _latency_tracker
+
+
+def hedge_delay(provider: str, percentile: Optional[float]) -> Optional[float]:
+    """Seconds to wait before hedging calls to provider, or None when hedging is off or untuned."""
+    if not percentile:
+        return None
+    threshold = _latency_tracker.percentile(provider, percentile, HEDGE_MIN_SAMPLES)
+    return max(threshold, HEDGE_MIN_DELAY) if threshold is not None else None
+
+
+def _start_thread(fn: Callable) -> Future:
+    """Run fn on a new thread of its own and return a future of its result."""
+    future = Future()
+    # Copy the context so per-session settings (e.g. cache bypass) apply in the thread
+    context = contextvars.copy_context()
+
+    def run():
+        try:
+            future.set_result(context.run(fn))
+        except BaseException as e:
+            future.set_exception(e)
+
+    future.set_running_or_notify_cancel()
+    threading.Thread(target=run, name="llm-primary", daemon=True).start()
+    return future
+
+
+def _fail_over(secondary_fn: Callable, provider: str, error: BaseException):
+    """Retry a failed primary call on the secondary provider; if that fails too, raise the primary's error."""
+    logger.warning(f"Primary provider {provider} failed ({str(error)}); failing over")
+    _latency_tracker.record_failover(provider)
+    try:
+        return secondary_fn()
+    except Exception as secondary_error:
+        logger.warning(f"Secondary provider failed too: {str(secondary_error)}")
+        raise error
+
+
+def call_hedged(primary_fn: Callable, secondary_fn: Callable, provider: str, delay: Optional[float],
+                dispatched: Optional[Future] = None):
+    """
+    Run primary_fn, hedging with secondary_fn after delay seconds (no hedge if delay is None)
+    and failing over to it if the primary raises. The first successful result wins; if both
+    fail, the primary's error is raised.
+
+    Args:
+        primary_fn: Blocking request against the primary provider
+        secondary_fn: Blocking request against the secondary provider
+        provider: Primary provider name, used for counters
+        delay: Hedge threshold in seconds, usually a latency percentile
+        dispatched: Future that primary_fn resolves once its request is sent; the delay
+            starts from there, so waiting for a slot, endpoint or rate limit never hedges
+
+    Returns:
+        Tuple of (result, True if the secondary provider produced it)
+    """
+    if delay is None:
+        try:
+            return primary_fn(), False
+        except Exception as e:
+            return _fail_over(secondary_fn, provider, e), True
+
+    # The primary cannot run on the caller's thread: a winning hedge must be able to return
+    # while it is still blocked, so it gets a thread of its own and only hedges use the pool
+    primary = _start_thread(primary_fn)
+    if dispatched is not None:
+        wait([primary, dispatched], return_when=FIRST_COMPLETED)
+    done, _ = wait([primary], timeout=delay)
+    if primary in done and primary.exception() is None:
+        return primary.result(), False
+
+    if primary in done:
+        return _fail_over(secondary_fn, provider, primary.exception()), True
+
+    logger.info(f"{provider} call exceeded {delay:.1f}s; sending hedged request")
+    # Copy the context so per-session settings (e.g. cache bypass) apply in the hedge threads
+    secondary = _hedge_executor.submit(contextvars.copy_context().run, secondary_fn)
+    pending = {primary, secondary}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                _latency_tracker.record_hedge(provider, won=future is secondary)
+                # Threads cannot be interrupted; the loser finishes in the background and is discarded
+                for loser in pending:
+                    loser.cancel()
+                return future.result(), future is secondary
+    _latency_tracker.record_hedge(provider, won=False)
+    logger.warning(f"Hedged request to the secondary provider failed too: {str(secondary.exception())}")
+    raise primary.exception()
+
+
+async def acall_hedged(primary_fn: Callable, secondary_fn: Callable, provider: str, delay: Optional[float],
+                       dispatched: Optional[asyncio.Future] = None):
+    """Async variant of call_hedged; the losing request is cancelled."""
+    primary = asyncio.ensure_future(primary_fn())
+    secondary = None
+    try:
+        if dispatched is not None and delay is not None:
+            await asyncio.wait({primary, dispatched}, return_when=asyncio.FIRST_COMPLETED)
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if primary in done:
+            try:
+                return primary.result(), False
+            except Exception as e:
+                logger.warning(f"Primary provider {provider} failed ({str(e)}); failing over")
+                _latency_tracker.record_failover(provider)
+                try:
+                    return await secondary_fn(), True
+                except Exception as secondary_error:
+                    logger.warning(f"Secondary provider failed too: {str(secondary_error)}")
+                    raise e
+
+        logger.info(f"{provider} call exceeded {delay:.1f}s; sending hedged request")
+        secondary = asyncio.ensure_future(secondary_fn())
+        pending = {primary, secondary}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    _latency_tracker.record_hedge(provider, won=task is secondary)
+                    return task.result(), task is secondary
+        _latency_tracker.record_hedge(provider, won=False)
+        logger.warning(f"Hedged request to the secondary provider failed too: {str(secondary.exception())}")
+        raise primary.exception()
+    finally:
+        for task in (primary, secondary):
+            if task is not None and not task.done():
+                task.cancel()
@@ -0,0 +1,158 @@
+# ingest.py
+"""
+Streaming ingestion of whole projects: .zip and .tar(.gz) archives and local directories.
+
+Members are visited one at a time, filtered by SUPPORTED_FILE_TYPES, size and
+directory (VCS metadata, virtualenvs, build output), and handed on as
+{'filename', 'file'} sources for the analysis pipeline, whose extract tasks
+decode them on worker threads. Archives are never loaded whole: zip members
+are read individually through the central directory and tar archives are
+read as a forward-only stream. The pipeline pulls the next source only when
+a file slot frees up, so memory stays flat regardless of project size.
+"""
+
+import io
+import os
+import tarfile
+import zipfile
+import logging
+from typing import Iterator, Optional
+
+from utils import SUPPORTED_FILE_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Ingestion configuration (overridable through environment variables)
+INGEST_MAX_FILE_BYTES = int(os.getenv("INGEST_MAX_FILE_BYTES", str(512 * 1024)))  # Larger files are skipped
+INGEST_MAX_FILES = int(os.getenv("INGEST_MAX_FILES", "1000"))                      # Files taken from one project
+ARCHIVE_TYPES = ('.zip', '.tar', '.tar.gz', '.tgz')
+SKIPPED_DIRECTORIES = {
+    "node_modules", "__pycache__", "venv", "site-packages", "build", "dist", "target", "vendor"
+}
+VIRTUALENV_MARKER = "pyvenv.cfg"  # Any other directory holding this file is a virtualenv
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_TYPES)
+
+
+def is_analyzable(path: str, size: int) -> bool:
+    """Whether an archive member or file should be analyzed."""
+    parts = [part for part in path.replace("\\", "/").split("/") if part not in ("", ".")]
+    if not parts:
+        return False
+    # Hidden directories (.git, .venv, .tox, ...) and dependency/build output are never project code
+    if any(part.startswith(".") or part in SKIPPED_DIRECTORIES for part in parts[:-1]):
+        return False
+    _, ext = os.path.splitext(parts[-1].lower())
+    if ext not in SUPPORTED_FILE_TYPES:
+        return False
+    if size > INGEST_MAX_FILE_BYTES:
+        logger.info(f"Skipping {path}: {size} bytes exceeds the {INGEST_MAX_FILE_BYTES} byte limit")
+        return False
+    return size > 0
+
+
+def _source(name: str, data: bytes) -> dict:
+    """Wrap member bytes like an uploaded file, so extract_code_from_file can decode it."""
+    buffer = io.BytesIO(data)
+    buffer.name = name
+    return {'filename': name, 'file': buffer}
+
+
+def _virtualenv_prefixes(names) -> tuple:
+    """Directory prefixes of the virtualenvs among archive member names."""
+    prefixes = set()
+    for name in names:
+        directory, _, filename = name.replace("\\", "/").rpartition("/")
+        if filename == VIRTUALENV_MARKER and directory:
+            prefixes.add(f"{directory}/")
+    return tuple(prefixes)
+
+
+def _iter_zip(fileobj) -> Iterator[dict]:
+    with zipfile.ZipFile(fileobj) as archive:
+        infos = archive.infolist()
+        virtualenvs = _virtualenv_prefixes(info.filename for info in infos)
+        for info in infos:
+            if info.is_dir() or not is_analyzable(info.filename, info.file_size):
+                continue
+            if virtualenvs and info.filename.replace("\\", "/").startswith(virtualenvs):
+                continue
+            with archive.open(info) as member:
+                # Read one byte past the limit: sizes in the directory are not trusted
+                data = member.read(INGEST_MAX_FILE_BYTES + 1)
+            if len(data) <= INGEST_MAX_FILE_BYTES:
+                yield _source(info.filename, data)
+
+
+def _iter_tar(fileobj) -> Iterator[dict]:
+    # "r|*" reads the (optionally compressed) archive strictly front to back, without seeking.
+    # A stream cannot be scanned ahead for pyvenv.cfg, but a virtualenv's site-packages is still skipped.
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile() and is_analyzable(member.name, member.size):
+                yield _source(member.name, archive.extractfile(member).read())
+
+
+def _iter_archive(project, name: str) -> Iterator[dict]:
+    if isinstance(project, (str, os.PathLike)):
+        with open(project, "rb") as f:
+            yield from _iter_archive(f, name)
+        return
+    project.seek(0)
+    yield from (_iter_zip(project) if name.lower().endswith(".zip") else _iter_tar(project))
+
+
+def _iter_directory(root: str) -> Iterator[dict]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            d for d in dirnames
+            if not d.startswith(".") and d not in SKIPPED_DIRECTORIES
+            and not os.path.isfile(os.path.join(dirpath, d, VIRTUALENV_MARKER))
+        )
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            relative = os.path.relpath(path, root).replace(os.sep, "/")
+            try:
+                if not is_analyzable(relative, os.path.getsize(path)):
+                    continue
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError as e:
+                logger.warning(f"Skipping {relative}: {str(e)}")
+                continue
+            yield _source(relative, data)
+
+
+def iter_project_sources(project, name: Optional[str] = None, max_files: int = INGEST_MAX_FILES) -> Iterator[dict]:
+    """
+    Lazily yield {'filename', 'file'} sources for every analyzable file of a project.
+
+    Args:
+        project: Directory path, archive path, or a file-like archive (e.g. a Streamlit UploadedFile)
+        name: Archive name used to detect its type, when project is a file-like object without .name
+        max_files: Stop after this many files
+
+    Raises:
+        ValueError: If project is neither a directory nor a supported archive
+    """
+    if isinstance(project, (str, os.PathLike)) and os.path.isdir(project):
+        members = _iter_directory(os.fspath(project))
+    else:
+        name = name or getattr(project, 'name', None) or os.fspath(project)
+        if not is_archive(name):
+            raise ValueError(f"Unsupported project source: {name}. Use a directory or one of: {', '.join(ARCHIVE_TYPES)}")
+        members = _iter_archive(project, name)
+    return _take(members, max_files)
+
+
+def _take(members: Iterator[dict], max_files: int) -> Iterator[dict]:
+    count = 0
+    for source in members:
+        if count >= max_files:
+            logger.warning(f"Project has more than {max_files} analyzable files; only the first {max_files} are analyzed")
+            break
+        count += 1
+        yield source
+    logger.info(f"Ingested {count} files")
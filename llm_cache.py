@@ -0,0 +1,209 @@
+# llm_cache.py
+"""
+Content-addressed persistent cache for LLM responses.
+
+Responses are stored zlib-compressed in a SQLite database keyed by a hash of
+(model, base_url, temperature, full prompt), with a TTL and an LRU size cap.
+
+A second store of the same kind keeps finished artifacts (SDD, mindmap,
+summary) keyed by (input content hash, artifact, template, model, prompt
+version), so re-analyzing an unchanged file skips the LLM entirely.
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration (overridable through environment variables)
+CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".codedocuai", "llm_cache.sqlite3")
+)
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESULT_STORE_PATH = os.getenv(
+    "LLM_RESULT_STORE_PATH",
+    os.path.join(os.path.expanduser("~"), ".codedocuai", "results.sqlite3")
+)
+RESULT_STORE_MAX_BYTES = int(os.getenv("LLM_RESULT_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+RESULT_STORE_TTL_SECONDS = int(os.getenv("LLM_RESULT_STORE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Per-session bypass switch; Streamlit runs each session in its own context
+_bypass = ContextVar("llm_cache_bypass", default=False)
+
+
+def make_cache_key(model: str, base_url: str, temperature: float, prompt: str) -> str:
+    """Hash the request parameters that determine an LLM response."""
+    payload = json.dumps(
+        [model, (base_url or "").rstrip("/"), round(float(temperature), 4), prompt],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def make_artifact_key(text: str, artifact: str, template_name: str, model: str, base_url: str,
+                      prompt_version: str) -> str:
+    """Hash what determines a finished artifact: its input content, template, model and prompts."""
+    payload = json.dumps(
+        [hashlib.sha256(text.encode("utf-8")).hexdigest(), artifact, template_name, model,
+         (base_url or "").rstrip("/"), prompt_version],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed response cache with TTL expiry, LRU eviction by total
+    compressed size and hit/miss counters.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES,
+                 ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on miss/expiry."""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or now - row[1] > self.ttl_seconds:
+                    if row is not None:
+                        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._misses += 1
+                    return None
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self._hits += 1
+                return zlib.decompress(row[0]).decode("utf-8")
+        except (sqlite3.Error, zlib.error) as e:
+            logger.warning(f"Response cache read failed: {str(e)}")
+            self._misses += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        """Store a response and evict least-recently-used entries over the size cap."""
+        blob = zlib.compress(value.encode("utf-8"), 6)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, blob, len(blob), now, now)
+                )
+                self._stores += 1
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache write failed: {str(e)}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        expired = conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self._evictions += max(expired, 0)
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Drop oldest-accessed entries until we are back under the cap
+        for key, size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self._evictions += 1
+
+    def clear(self) -> None:
+        """Remove every cached response."""
+        with self._lock:
+            self._connect().execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current cache size."""
+        with self._lock:
+            try:
+                entries, size = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+            except sqlite3.Error:
+                entries, size = 0, 0
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0,
+                'stores': self._stores,
+                'evictions': self._evictions,
+                'entries': entries,
+                'size_bytes': size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Process-wide caches shared by all sessions
+_cache = ResponseCache()
+_result_store = ResponseCache(RESULT_STORE_PATH, RESULT_STORE_MAX_BYTES, RESULT_STORE_TTL_SECONDS)
+
+
+def get_response_cache() -> ResponseCache:
+    """Get the shared response cache."""
+    return _cache
+
+
+def get_result_store() -> ResponseCache:
+    """Get the shared store of finished artifacts."""
+    return _result_store
+
+
+def set_cache_bypass(bypass: bool) -> None:
+    """Enable or disable cache bypass for the current session/context."""
+    _bypass.set(bool(bypass))
+
+
+def is_cache_bypassed() -> bool:
+    """Check whether the current session asked to skip the response cache."""
+    return _bypass.get()
@@ -0,0 +1,286 @@
+# llm_clients.py
+"""
+Process-wide registry of pooled, keep-alive LLM clients.
+
+Clients are shared across Streamlit sessions and threads and are keyed by
+(provider, base_url, api_key), so repeated calls reuse open HTTP connections
+instead of paying for a new TLS handshake every time. Async clients are bound
+to the event loop that created them and are pooled per loop, held weakly so a
+finished loop's clients are dropped rather than handed to a later loop.
+Requests borrow a client through a lease; a client replaced or closed while
+leased is retired and closed only once its last lease is returned.
+"""
+
+import os
+import asyncio
+import hashlib
+import logging
+import weakref
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration (overridable through environment variables)
+POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "90"))
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "300"))
+
+
+def _client_key(provider: str, base_url: str, api_key: str) -> tuple:
+    """Build a registry key without keeping the raw API key in memory twice."""
+    key_digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    return (provider or "", (base_url or "").rstrip("/"), key_digest)
+
+
+class ClientRegistry:
+    """
+    Thread-safe registry of OpenAI-compatible clients backed by a shared
+    keep-alive connection pool per (provider, base_url, api_key).
+    """
+
+    def __init__(self, max_connections: int = POOL_MAX_CONNECTIONS,
+                 keepalive_expiry: float = POOL_KEEPALIVE_EXPIRY):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()    # event loop -> {client key: client}
+        self._max_connections = max_connections
+        self._keepalive_expiry = keepalive_expiry
+        self._hits = 0
+        self._misses = 0
+        self._new_connections = 0
+        self._in_use = 0
+        self._leases = {}      # id(client) -> requests currently using it
+        self._retired = {}     # id(client) -> client to close once its leases are returned
+
+    def _on_connect(self, event_name: str, info: dict) -> None:
+        """httpcore trace callback; counts freshly opened TCP connections."""
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self._new_connections += 1
+
+    def _on_request(self, request) -> None:
+        request.extensions["trace"] = self._on_connect
+
+    async def _on_connect_async(self, event_name: str, info: dict) -> None:
+        self._on_connect(event_name, info)
+
+    async def _on_request_async(self, request) -> None:
+        request.extensions["trace"] = self._on_connect_async
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self._max_connections,
+            max_keepalive_connections=self._max_connections,
+            keepalive_expiry=self._keepalive_expiry,
+        )
+
+    def _build_client(self, api_key: str, base_url: str) -> OpenAI:
+        http_client = DefaultHttpxClient(
+            limits=self._limits(),
+            timeout=REQUEST_TIMEOUT,
+            event_hooks={"request": [self._on_request]},
+        )
+        # Retries are handled by rate_limiter so they respect per-provider budgets
+        return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+    def _build_async_client(self, api_key: str, base_url: str) -> AsyncOpenAI:
+        http_client = DefaultAsyncHttpxClient(
+            limits=self._limits(),
+            timeout=REQUEST_TIMEOUT,
+            event_hooks={"request": [self._on_request_async]},
+        )
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+    def _get_locked(self, provider: str, base_url: str, api_key: str) -> OpenAI:
+        key = _client_key(provider, base_url, api_key)
+        client = self._clients.get(key)
+        if client is not None:
+            self._hits += 1
+            return client
+
+        self._misses += 1
+        client = self._build_client(api_key, base_url)
+        self._clients[key] = client
+        logger.info(f"Created pooled LLM client for {provider} ({base_url})")
+        return client
+
+    def get(self, provider: str, base_url: str, api_key: str) -> OpenAI:
+        """Return the pooled client for this endpoint, creating it on first use."""
+        with self._lock:
+            return self._get_locked(provider, base_url, api_key)
+
+    def _acquire_locked(self, client) -> None:
+        self._in_use += 1
+        self._leases[id(client)] = self._leases.get(id(client), 0) + 1
+
+    def _get_and_acquire(self, provider: str, base_url: str, api_key: str) -> OpenAI:
+        """
+        Look up and lease the client under one lock acquisition, so a concurrent configure()
+        always sees the lease and never closes the client before the request uses it.
+        """
+        with self._lock:
+            client = self._get_locked(provider, base_url, api_key)
+            self._acquire_locked(client)
+            return client
+
+    def _return(self, client) -> bool:
+        """End one lease of client; True if the client was retired and is now free to close."""
+        with self._lock:
+            self._in_use -= 1
+            remaining = self._leases[id(client)] - 1
+            if remaining:
+                self._leases[id(client)] = remaining
+                return False
+            del self._leases[id(client)]
+            return self._retired.pop(id(client), None) is not None
+
+    def _retire(self, clients: list) -> list:
+        """Of clients just removed from the registry, those free to close now; the rest close when returned."""
+        with self._lock:
+            idle = [client for client in clients if id(client) not in self._leases]
+            self._retired.update((id(client), client) for client in clients if id(client) in self._leases)
+        return idle
+
+    @staticmethod
+    def _close(client) -> None:
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"Error closing pooled client: {str(e)}")
+
+    @contextmanager
+    def lease(self, provider: str, base_url: str, api_key: str):
+        """Borrow the pooled client for the duration of a request."""
+        client = self._get_and_acquire(provider, base_url, api_key)
+        try:
+            yield client
+        finally:
+            if self._return(client):
+                self._close(client)
+
+    def _get_async_locked(self, provider: str, base_url: str, api_key: str) -> AsyncOpenAI:
+        # Clients of a loop that closed without aclose_loop_clients() can no longer be used or closed
+        for loop in [loop for loop in self._async_clients if loop.is_closed()]:
+            del self._async_clients[loop]
+        clients = self._async_clients.setdefault(asyncio.get_running_loop(), {})
+        key = _client_key(provider, base_url, api_key)
+        client = clients.get(key)
+        if client is not None:
+            self._hits += 1
+            return client
+
+        self._misses += 1
+        client = self._build_async_client(api_key, base_url)
+        clients[key] = client
+        logger.info(f"Created pooled async LLM client for {provider} ({base_url})")
+        return client
+
+    def get_async(self, provider: str, base_url: str, api_key: str) -> AsyncOpenAI:
+        """Return the pooled async client for this endpoint on the running event loop."""
+        with self._lock:
+            return self._get_async_locked(provider, base_url, api_key)
+
+    def _get_and_acquire_async(self, provider: str, base_url: str, api_key: str) -> AsyncOpenAI:
+        """Async-client variant of _get_and_acquire."""
+        with self._lock:
+            client = self._get_async_locked(provider, base_url, api_key)
+            self._acquire_locked(client)
+            return client
+
+    @asynccontextmanager
+    async def async_lease(self, provider: str, base_url: str, api_key: str):
+        """Borrow the pooled async client for the duration of a request."""
+        client = self._get_and_acquire_async(provider, base_url, api_key)
+        try:
+            yield client
+        finally:
+            if self._return(client):
+                await self._aclose(client)
+
+    @staticmethod
+    async def _aclose(client) -> None:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Error closing pooled async client: {str(e)}")
+
+    async def aclose_loop_clients(self) -> None:
+        """Close the async clients bound to the running event loop (leased ones once returned)."""
+        with self._lock:
+            clients = list(self._async_clients.pop(asyncio.get_running_loop(), {}).values())
+        for client in self._retire(clients):
+            await self._aclose(client)
+
+    def configure(self, max_connections: int = None, keepalive_expiry: float = None) -> None:
+        """
+        Change pool limits. Existing clients are retired and rebuilt lazily so
+        the new limits take effect on the next request; clients leased by requests
+        in flight are closed when those requests return them.
+        """
+        with self._lock:
+            if max_connections is not None:
+                self._max_connections = max_connections
+            if keepalive_expiry is not None:
+                self._keepalive_expiry = keepalive_expiry
+            stale = list(self._clients.values())
+            self._clients.clear()
+        for client in self._retire(stale):
+            self._close(client)
+
+    def stats(self) -> dict:
+        """Return reuse and lease statistics for the registry."""
+        with self._lock:
+            return {
+                'clients': len(self._clients),
+                'async_clients': sum(len(clients) for clients in self._async_clients.values()),
+                'hits': self._hits,
+                'misses': self._misses,
+                'new_connections': self._new_connections,
+                'in_use': self._in_use,
+                'leased_clients': len(self._leases),
+                'retired_clients': len(self._retired),
+                'max_connections': self._max_connections,
+                'keepalive_expiry': self._keepalive_expiry,
+            }
+
+    def close_all(self) -> None:
+        """Close every pooled client (used on shutdown and in benchmarks); leased ones once returned."""
+        self.configure()
+
+
+# Process-wide registry shared by all sessions
+_registry = ClientRegistry()
+
+
+def get_client(provider: str, base_url: str, api_key: str) -> OpenAI:
+    """Get the shared pooled client for an endpoint."""
+    return _registry.get(provider, base_url, api_key)
+
+
+def lease_client(provider: str, base_url: str, api_key: str):
+    """Context manager that borrows a pooled client and tracks it as in use."""
+    return _registry.lease(provider, base_url, api_key)
+
+
+def async_lease_client(provider: str, base_url: str, api_key: str):
+    """Async context manager that borrows the pooled async client for the running loop."""
+    return _registry.async_lease(provider, base_url, api_key)
+
+
+async def aclose_loop_clients() -> None:
+    """Close async clients created on the running event loop (call before the loop ends)."""
+    await _registry.aclose_loop_clients()
+
+
+def configure_pool(max_connections: int = None, keepalive_expiry: float = None) -> None:
+    """Update connection pool size and idle timeout for all pooled clients."""
+    _registry.configure(max_connections=max_connections, keepalive_expiry=keepalive_expiry)
+
+
+def get_pool_stats() -> dict:
+    """Get connection pool statistics (hits, new connections, in-use)."""
+    return _registry.stats()
@@ -1,11 +1,21 @@
 import streamlit as st
 from utils import (
-    summarize_text, get_SDD, extract_code_from_file, get_mindmap, 
     get_available_sdd_templates, preview_sdd_template, test_api_connection,
-    get_api_configs, set_api_config,clean_markdown_wrappers
+    get_api_configs, set_api_config, get_connection_pool_stats,
+    get_response_cache_stats, clear_response_cache, get_provider_rate_limit_stats,
+    get_result_store_stats, clear_result_store,
+    get_prompt_cache_stats, get_single_flight_stats, get_provider_latency_stats,
+    get_secondary_api_config, set_secondary_api_config, add_api_endpoint, remove_api_endpoint,
+    get_api_endpoints, get_endpoint_pool_stats, get_call_metrics_summary, export_call_metrics
 )
+from pipeline import analyze_files
+from llm_cache import set_cache_bypass
 from markmap_component import render_markmap, create_markmap_download_link
+from export import build_results_archive
+from ingest import is_archive, iter_project_sources, ARCHIVE_TYPES
+from skeleton import FIDELITY_LEVELS, SKELETON_FIDELITY
 import os
+import itertools
 from typing import List, Dict
 
 # Enhanced page configuration with icon
@@ -396,6 +406,111 @@ with st.expander("Configure your API Settings", expanded=not st.session_state.ge
             else:
                 st.error("Please save configuration first!")
 
+with st.expander("🛟 Failover & Hedging (optional)"):
+    st.caption(
+        "Failed calls are retried on the secondary provider. With hedging on, calls slower than the "
+        "chosen latency percentile of the primary provider also get a duplicate request to the "
+        "secondary provider, and the first response wins."
+    )
+    secondary_config = get_secondary_api_config()
+    secondary_options = list(api_configs.keys())
+    col1, col2 = st.columns([1, 1])
+    
+    with col1:
+        secondary_provider = st.selectbox(
+            "Secondary Provider",
+            options=secondary_options,
+            index=secondary_options.index(secondary_config['provider']) if secondary_config else 0,
+            key="secondary_provider_select"
+        )
+        secondary_api_key = st.text_input(
+            "Secondary API Key",
+            type="password",
+            placeholder="Leave empty to disable failover",
+            key="secondary_api_key"
+        )
+        hedge_choice = st.selectbox(
+            "Hedge slow requests after",
+            options=["Off", "p90", "p95", "p99"],
+            index=2,
+            help="Latency percentile of the primary provider; hedging starts once enough calls have been timed",
+            key="hedge_percentile_select"
+        )
+    
+    with col2:
+        secondary_base_url = st.text_input(
+            "Secondary Base URL",
+            value=api_configs[secondary_provider]['base_url'],
+            key=f"secondary_base_url_{secondary_provider}"
+        )
+        secondary_model = st.text_input(
+            "Secondary Model Name",
+            value=api_configs[secondary_provider]['model'],
+            key=f"secondary_model_{secondary_provider}"
+        )
+    
+    if st.button("💾 Save Failover Settings", key="save_secondary_config"):
+        hedge_percentile = None if hedge_choice == "Off" else float(hedge_choice[1:])
+        set_secondary_api_config(secondary_provider, secondary_base_url, secondary_model,
+                                 secondary_api_key, hedge_percentile)
+        if secondary_api_key:
+            st.success(f"✅ Failing over to {secondary_provider}")
+        else:
+            st.info("Failover disabled")
+    elif secondary_config:
+        st.caption(f"Active secondary provider: {secondary_config['provider']} ({secondary_config['model']})")
+
+with st.expander("🔀 API Key Pool (optional)"):
+    st.caption(
+        "Extra API keys share the load with the configured key. Each call goes to an endpoint picked by "
+        "weight, favouring fast and healthy ones, and each key gets its own rate limits, so throughput "
+        "grows with the number of keys. Pooled keys must serve the configured model, since responses are "
+        "cached under it; keys left on another model after a model change take no calls."
+    )
+    pool_options = list(api_configs.keys())
+    col1, col2 = st.columns([1, 1])
+    
+    with col1:
+        pool_provider = st.selectbox("Provider", options=pool_options, key="pool_provider_select")
+        pool_api_key = st.text_input("API Key", type="password", key="pool_api_key")
+        pool_weight = st.number_input("Weight", min_value=0.1, value=1.0, step=0.5, key="pool_weight")
+    
+    with col2:
+        pool_base_url = st.text_input(
+            "Base URL",
+            value=api_configs[pool_provider]['base_url'],
+            key=f"pool_base_url_{pool_provider}"
+        )
+        pool_model = st.text_input(
+            "Model Name",
+            value=os.getenv("OPENAI_MODEL") or api_configs[pool_provider]['model'],
+            key=f"pool_model_{pool_provider}"
+        )
+        pool_concurrency = st.number_input("Max Concurrent Calls", min_value=0, value=0, key="pool_concurrency",
+                                           help="0 leaves the endpoint uncapped")
+    
+    if st.button("➕ Add Endpoint", key="add_pool_endpoint"):
+        if pool_api_key:
+            try:
+                add_api_endpoint(pool_provider, pool_base_url, pool_model, pool_api_key,
+                                 pool_weight, int(pool_concurrency) or None)
+                st.success(f"✅ Added {pool_provider} endpoint")
+            except ValueError as e:
+                st.error(str(e))
+        else:
+            st.error("Please enter an API key!")
+    
+    for endpoint in get_api_endpoints():
+        endpoint_col, remove_col = st.columns([4, 1])
+        with endpoint_col:
+            cap = f"max {endpoint['max_concurrency']} concurrent" if endpoint['max_concurrency'] else "uncapped"
+            st.write(f"**{endpoint['label']}** • {endpoint['model']} • weight {endpoint['weight']} • {cap}"
+                     + ("" if endpoint['active'] else " • ⏸️ not used: serves another model"))
+        with remove_col:
+            if st.button("Remove", key=f"remove_endpoint_{endpoint['label']}"):
+                remove_api_endpoint(endpoint['label'])
+                st.rerun()
+
 st.markdown("---")
 
 # Enhanced sidebar
@@ -434,6 +549,89 @@ with st.sidebar:
     
     st.markdown("---")
     
+    # Response cache controls
+    st.markdown("### 💾 Response Cache")
+    bypass_cache = st.checkbox(
+        "Bypass response cache",
+        help="Always call the LLM and refresh cached responses and stored results for this session",
+        key="bypass_llm_cache"
+    )
+    set_cache_bypass(bypass_cache)
+    
+    cache_stats = get_response_cache_stats()
+    st.caption(
+        f"{cache_stats['entries']} entries • {cache_stats['size_bytes'] / 1024:.0f} KB • "
+        f"{cache_stats['hits']} hits / {cache_stats['misses']} misses"
+    )
+    flight_stats = get_single_flight_stats()
+    st.caption(
+        f"{flight_stats['coalesced']} duplicate requests joined in flight • "
+        f"{flight_stats['in_flight']} in flight now"
+    )
+    if st.button("🗑️ Clear Cache", key="clear_llm_cache"):
+        clear_response_cache()
+        st.rerun()
+    
+    store_stats = get_result_store_stats()
+    st.caption(
+        f"♻️ {store_stats['entries']} stored results • {store_stats['size_bytes'] / 1024:.0f} KB • "
+        f"{store_stats['hits']} reused"
+    )
+    if st.button("🗑️ Clear Stored Results", key="clear_result_store",
+                 help="Unchanged files are served from stored results; clear them to regenerate everything"):
+        clear_result_store()
+        st.rerun()
+    
+    st.markdown("---")
+    
+    # Generation behaviour
+    st.markdown("### ⚡ Generation")
+    stream_results = st.checkbox(
+        "Stream results live",
+        value=True,
+        help="Show SDD, mindmap and summary text as it is generated instead of waiting for the full response",
+        key="stream_results"
+    )
+    summary_from_source = st.checkbox(
+        "Summarize source in parallel",
+        value=False,
+        help="Summarize the source code alongside the SDD instead of summarizing the finished SDD. "
+             "Faster, but the summary no longer builds on the SDD",
+        key="summary_from_source"
+    )
+    code_facts = st.checkbox(
+        "Extract code facts first",
+        value=True,
+        help="Condense large files into a structured code-facts document once and generate the SDD, "
+             "mindmap and summary from it. Cuts prompt tokens, and a template change only reruns the SDD",
+        key="code_facts"
+    )
+    skeleton_fidelity = st.selectbox(
+        "Code skeleton fidelity",
+        FIDELITY_LEVELS,
+        index=FIDELITY_LEVELS.index(SKELETON_FIDELITY),
+        help="Compress large code files locally before prompting: 'detailed' keeps docstrings, attributes "
+             "and calls, 'signatures' first docstring lines, 'outline' only imports, classes and signatures. "
+             "'full' sends the source as it is",
+        key="skeleton_fidelity"
+    )
+    cross_file_context = st.checkbox(
+        "Cross-file context",
+        value=True,
+        help="Index all uploaded files together and give each file's prompts the signatures of the "
+             "functions and classes it uses from the other files, instead of analyzing files in isolation",
+        key="cross_file_context"
+    )
+    deduplicate = st.checkbox(
+        "Skip duplicate files",
+        value=True,
+        help="Reuse the results of identical uploaded files, and document near-identical files from "
+             "the first copy's documents and their diff instead of from scratch",
+        key="deduplicate"
+    )
+    
+    st.markdown("---")
+    
     # Enhanced template descriptions
     st.markdown("### 📚 Template Descriptions")
     for name, desc in available_templates.items():
@@ -465,6 +663,89 @@ with st.sidebar:
         st.info("📁 No Files Loaded")
     
     st.markdown("</div>", unsafe_allow_html=True)
+    
+    # Shared LLM connection pool statistics
+    with st.expander("🔌 Connection Pool"):
+        pool_stats = get_connection_pool_stats()
+        st.write(f"**Clients**: {pool_stats['clients']} (reused {pool_stats['hits']}×, created {pool_stats['misses']}×)")
+        st.write(f"**New Connections**: {pool_stats['new_connections']}")
+        st.write(f"**In Use**: {pool_stats['in_use']} requests on {pool_stats['leased_clients']} clients"
+                 + (f" ({pool_stats['retired_clients']} retired, closing when returned)" if pool_stats['retired_clients'] else ""))
+        st.caption(f"Pool size {pool_stats['max_connections']} • idle timeout {pool_stats['keepalive_expiry']:.0f}s")
+    
+    # Adaptive per-provider rate limits
+    with st.expander("🚦 Rate Limits"):
+        rate_limit_stats = get_provider_rate_limit_stats()
+        if not rate_limit_stats:
+            st.caption("No API calls made yet")
+        for provider, stats in rate_limit_stats.items():
+            st.write(f"**{provider}**: {stats['rpm']} rpm • {stats['tpm']} tpm (×{stats['rate_scale']})")
+            st.caption(
+                f"{stats['requests']} requests • {stats['rate_limited']} rate-limited • "
+                f"{stats['retries']} retries • {stats['wait_seconds']}s waiting"
+            )
+    
+    # Load and health of each pooled API endpoint
+    with st.expander("🔀 Endpoints"):
+        endpoint_stats = get_endpoint_pool_stats()
+        if not endpoint_stats:
+            st.caption("No API calls made yet")
+        for label, stats in endpoint_stats.items():
+            latency = f"{stats['latency']}s" if stats['latency'] is not None else "n/a"
+            cap = f"/{stats['max_concurrency']}" if stats['max_concurrency'] else ""
+            st.write(f"**{label}**: {stats['in_flight']}{cap} in flight • {latency}")
+            st.caption(
+                f"weight {stats['weight']} • {stats['requests']} requests • {stats['errors']} errors "
+                f"({stats['error_rate']:.0%} recent)"
+            )
+    
+    # Per-provider call latency for tuning the hedge threshold
+    with st.expander("⏱️ Latency"):
+        latency_stats = get_provider_latency_stats()
+        if not latency_stats:
+            st.caption("No API calls made yet")
+        for provider, stats in latency_stats.items():
+            if stats['samples']:
+                st.write(f"**{provider}**: p50 {stats['p50']}s • p95 {stats['p95']}s • p99 {stats['p99']}s")
+            else:
+                st.write(f"**{provider}**")
+            st.caption(
+                f"{stats['samples']} timed calls • {stats['hedges']} hedged ({stats['hedge_wins']} won) • "
+                f"{stats['failovers']} failovers"
+            )
+    
+    # Per-call latency, token and error metrics
+    with st.expander("📈 Call Metrics"):
+        metrics_group = st.radio("Group by", ["provider", "task"], horizontal=True, key="metrics_group_by")
+        metrics_summary = get_call_metrics_summary(metrics_group)
+        if not metrics_summary:
+            st.caption("No API calls made yet")
+        for name, stats in metrics_summary.items():
+            if stats['p50'] is not None:
+                st.write(f"**{name}**: p50 {stats['p50']}s • p95 {stats['p95']}s • first token {stats['ttft_p50']}s")
+            else:
+                st.write(f"**{name}**")
+            st.caption(
+                f"{stats['requests']} requests • {stats['errors']} errors • {stats['queue_wait_mean']}s queued on average • "
+                f"{stats['prompt_tokens']} prompt ({stats['cached_tokens']} cached) / {stats['completion_tokens']} completion tokens"
+            )
+        if metrics_summary:
+            st.download_button("⬇️ Prometheus", export_call_metrics('prometheus'),
+                               file_name="llm_metrics.prom", mime="text/plain", key="download_metrics_prom")
+            st.download_button("⬇️ JSON Lines", export_call_metrics('jsonl'),
+                               file_name="llm_calls.jsonl", mime="application/x-ndjson", key="download_metrics_jsonl")
+    
+    # Provider-side prompt prefix caching
+    with st.expander("🧠 Prompt Cache"):
+        prompt_cache_stats = get_prompt_cache_stats()
+        if not prompt_cache_stats:
+            st.caption("No token usage reported yet")
+        for provider, stats in prompt_cache_stats.items():
+            st.write(f"**{provider}**: {stats['cache_rate']:.1%} of prompt tokens cached")
+            st.caption(
+                f"{stats['calls']} calls • {stats['cached_tokens']} cached • "
+                f"{stats['uncached_tokens']} uncached tokens"
+            )
 
 # Main content area
 col1, col2 = st.columns([2, 1])
@@ -473,12 +754,19 @@ with col1:
     # Enhanced file uploader
     st.markdown("### 📁 Upload Your Code Files")
     uploaded_files = st.file_uploader(
-        "Choose one or more code files to analyze",
-        type=['txt', 'js', 'py', 'md', 'java', 'c', 'cpp', 'h'],
+        "Choose one or more code files or project archives to analyze",
+        type=['txt', 'js', 'py', 'md', 'java', 'c', 'cpp', 'h', 'zip', 'tar', 'gz', 'tgz'],
         accept_multiple_files=True,
-        help="Supported formats: .txt, .js, .py, .md, .java, .c, .cpp, .h",
+        help="Supported formats: .txt, .js, .py, .md, .java, .c, .cpp, .h, or a whole project as "
+             + ", ".join(ARCHIVE_TYPES),
         key="file_uploader"
     )
+    project_directory = st.text_input(
+        "Or analyze a local project directory",
+        placeholder="/path/to/project",
+        help="Every supported file under this directory is analyzed (VCS, dependency and build folders are skipped)",
+        key="project_directory"
+    ).strip()
 
 with col2:
     if uploaded_files:
@@ -508,12 +796,15 @@ if uploaded_files:
     st.session_state.uploaded_files = uploaded_files
 
 # Simple status line
-if st.session_state.uploaded_files:
+if st.session_state.uploaded_files or project_directory:
     st.markdown("---")
     col1, col2, col3 = st.columns([1, 1, 1])
     
     with col1:
-        st.info(f"📁 **Files:** {len(st.session_state.uploaded_files)}")
+        if project_directory:
+            st.info(f"📁 **Project:** {os.path.basename(os.path.normpath(project_directory))}")
+        else:
+            st.info(f"📁 **Files:** {len(st.session_state.uploaded_files)}")
     with col2:
         template_name = selected_template.replace('_', ' ').title()
         st.info(f"📋 **Template:** {template_name}")
@@ -550,7 +841,7 @@ def show_animated_progress(current, total, filename):
 analyze_button = False
 generate_options = ["SDD", "Mindmap", "Summary"]  # Default value
 
-if st.session_state.uploaded_files:
+if st.session_state.uploaded_files or project_directory:
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         analyze_button = st.button(
@@ -560,7 +851,7 @@ if st.session_state.uploaded_files:
             use_container_width=True
         )
 
-if analyze_button and st.session_state.uploaded_files:
+if analyze_button and (st.session_state.uploaded_files or project_directory):
     # Check if API key is configured
     if not (st.session_state.get('api_key_set', False) or os.getenv("OPENAI_API_KEY")):
         st.error("❌ Please configure your API settings first!")
@@ -598,65 +889,87 @@ if analyze_button and st.session_state.uploaded_files:
     """, unsafe_allow_html=True)
     
     progress_container = st.empty()
+    live_container = st.empty()
     
     try:
-        results = []
-        total_files = len(st.session_state.uploaded_files)
+        # Files are read by the pipeline's extract tasks, alongside the analysis of other files
+        sources = [
+            {'filename': uploaded_file.name, 'file': uploaded_file}
+            for uploaded_file in st.session_state.uploaded_files
+            if not is_archive(uploaded_file.name)
+        ]
+        # Archives and directories are streamed: the pipeline pulls their files as slots free up
+        projects = [
+            iter_project_sources(uploaded_file)
+            for uploaded_file in st.session_state.uploaded_files
+            if is_archive(uploaded_file.name)
+        ]
+        if project_directory:
+            if not os.path.isdir(project_directory):
+                st.error(f"❌ Directory not found: {project_directory}")
+                st.stop()
+            projects.append(iter_project_sources(project_directory))
+        if projects:
+            sources = itertools.chain(sources, *projects)
+        
+        # Live result tabs, one per file, updated as responses stream in
+        # (not for projects, whose files are only known once they are read)
+        live_placeholders = {}
+        live_options = [option for option in ["SDD", "Mindmap", "Summary"] if option in generate_options]
+        if stream_results and not projects and sources and live_options:
+            with live_container.container():
+                st.markdown("#### ✍️ Live Output")
+                file_tabs = st.tabs([f"📄 {source['filename']}" for source in sources])
+                for index, file_tab in enumerate(file_tabs):
+                    with file_tab:
+                        for option, live_tab in zip(live_options, st.tabs(live_options)):
+                            with live_tab:
+                                live_placeholders[(index, option)] = st.empty()
         
-        for i, uploaded_file in enumerate(st.session_state.uploaded_files):
-            # Update progress
+        def update_progress(done, total, label):
             progress_container.markdown(
-                show_animated_progress(i+1, total_files, uploaded_file.name), 
+                show_animated_progress(done, total, label), 
                 unsafe_allow_html=True
             )
-            
-            try:
-                # Read file content
-                text = extract_code_from_file(uploaded_file)
-                
-                if not text.strip():
-                    st.warning(f"File {uploaded_file.name} is empty! Skipping...")
-                    continue
-                
-                # Store results for each file
-                file_result = {
-                    'filename': uploaded_file.name,
-                    'content': text,
-                    'sdd': None,
-                    'mindmap': None,
-                    'summary': None,
-                    'template_used': selected_template
-                }
-                
-                # Process file content based on selected options
-                if "SDD" in generate_options:
-                    with st.spinner(f"Generating SDD for {uploaded_file.name} using {selected_template} template..."):
-                        raw_SDD = get_SDD(text, selected_template)
-                        file_result['sdd'] = clean_markdown_wrappers(raw_SDD)
-                
-                if "Mindmap" in generate_options:
-                    with st.spinner(f"Generating mindmap for {uploaded_file.name}..."):
-                        file_result['mindmap'] = get_mindmap(text)
-                
-                if "Summary" in generate_options:
-                    with st.spinner(f"Summarizing {uploaded_file.name}..."):
-                        # Use SDD for summary if available, otherwise use original content
-                        summary_source = file_result['sdd'] if file_result['sdd'] else text
-                        file_result['summary'] = summarize_text(summary_source)
-                
-                results.append(file_result)
-                
-            except Exception as e:
-                st.error(f"Error processing {uploaded_file.name}: {str(e)}")
-                continue
+        
+        def update_live_output(index, artifact, partial_text):
+            placeholder = live_placeholders.get((index, artifact))
+            if placeholder is not None:
+                placeholder.markdown(partial_text + " ▌")
+        
+        results = []
+        if projects or sources:
+            file_count = "project" if projects else f"{len(sources)} file(s)"
+            with st.spinner(f"Analyzing {file_count} using {selected_template} template..."):
+                results, errors = analyze_files(
+                    sources,
+                    generate_options,
+                    selected_template,
+                    stream=stream_results,
+                    summary_from_source=summary_from_source,
+                    code_facts=code_facts,
+                    skeleton_fidelity=skeleton_fidelity,
+                    cross_file_context=cross_file_context,
+                    deduplicate=deduplicate,
+                    on_progress=update_progress,
+                    on_partial=update_live_output
+                )
+            for filename, message in errors:
+                st.error(f"Error processing {filename}: {message}")
         
         # Store results in session state for export
         st.session_state.results = results
         st.session_state.analysis_complete = True
         
         progress_container.empty()
+        live_container.empty()
         
         if results:
+            duplicates = [result for result in results if result.get('duplicate_of') or result.get('near_duplicate_of')]
+            dedup_note = (
+                f" {len(duplicates)} duplicate files were derived from their first copy, saving "
+                f"{sum(result['calls_saved'] for result in duplicates)} LLM calls."
+            ) if duplicates else ""
             # Enhanced success message
             st.markdown(f"""
             <div style="
@@ -670,7 +983,7 @@ if analyze_button and st.session_state.uploaded_files:
             ">
                 <h2 style="margin: 0;">🎉 Analysis Complete!</h2>
                 <p style="margin: 0.5rem 0 0 0; font-size: 1.1rem;">
-                    Successfully processed {len(results)} files. Your documentation is ready!
+                    Successfully processed {len(results)} files. Your documentation is ready!{dedup_note}
                 </p>
             </div>
             """, unsafe_allow_html=True)
@@ -715,10 +1028,40 @@ if st.session_state.analysis_complete and st.session_state.results:
     """, unsafe_allow_html=True)
     
     # Create tabs for each processed file
-    tabs = st.tabs([f"📄 {res['filename']}" for res in st.session_state.results])
+    tabs = st.tabs([
+        f"📄 {res['filename']}" + (" ♻️" if res.get('reused') and not res.get('regenerated') else "")
+        for res in st.session_state.results
+    ])
     
     for tab, result in zip(tabs, st.session_state.results):
         with tab:
+            # Which artifacts came from the result store and which were generated in this run
+            reuse_info = " • ".join(
+                f"{label}: {', '.join(result[key])}"
+                for key, label in [('reused', "♻️ Reused"), ('regenerated', "🔄 Regenerated"),
+                                   ('fallbacks', "⚠️ Fallback, not stored")]
+                if result.get(key)
+            )
+            dependency_info = " • ".join(
+                f"{label}: {', '.join(result[key])}"
+                for key, label in [('depends_on', "🔗 Depends on"), ('used_by', "↩️ Used by")]
+                if result.get(key)
+            )
+            if dependency_info:
+                reuse_info += (" • " if reuse_info else "") + dependency_info
+            if result.get('duplicate_of') or result.get('near_duplicate_of'):
+                reuse_info += (" • " if reuse_info else "") + (
+                    f"👯 Copy of {result['duplicate_of']}" if result.get('duplicate_of') else
+                    f"👯 {result['similarity']:.0%} similar to {result['near_duplicate_of']}, derived from its diff"
+                ) + f" ({result['calls_saved']} LLM calls saved)"
+            if result.get('skeleton'):
+                skeleton_stats = result['skeleton']
+                saved = 1 - skeleton_stats['skeleton_tokens'] / max(1, skeleton_stats['source_tokens'])
+                reuse_info += (" • " if reuse_info else "") + (
+                    f"🦴 {skeleton_stats['fidelity'].title()} skeleton: {skeleton_stats['source_tokens']} → "
+                    f"{skeleton_stats['skeleton_tokens']} tokens (-{saved:.0%})"
+                )
+            
             # Enhanced file info header
             st.markdown(f"""
             <div style="
@@ -732,6 +1075,9 @@ if st.session_state.analysis_complete and st.session_state.results:
                 <p style="margin: 0.5rem 0 0 0; color: #6c757d;">
                     Template: {result['template_used'].replace('_', ' ').title()}
                 </p>
+                <p style="margin: 0.25rem 0 0 0; color: #6c757d; font-size: 0.9rem;">
+                    {reuse_info}
+                </p>
             </div>
             """, unsafe_allow_html=True)
             
@@ -1139,31 +1485,9 @@ if st.session_state.analysis_complete and st.session_state.results:
         # Enhanced export all results
         if st.button("📦 Export All Results", type="secondary", key="export_all", use_container_width=True):
             try:
-                import zipfile
-                import io
-                
-                # Create a zip file in memory
-                zip_buffer = io.BytesIO()
-                
-                with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                    for result in st.session_state.results:
-                        base_name = os.path.splitext(result['filename'])[0]
-                        
-                        if result.get('sdd'):
-                            zip_file.writestr(f"{base_name}_SDD.md", result['sdd'])
-                        if result.get('mindmap'):
-                            zip_file.writestr(f"{base_name}_mindmap.md", result['mindmap'])
-                            # Add interactive HTML mindmap
-                            html_content = create_markmap_download_link(result['mindmap'], base_name)
-                            zip_file.writestr(f"{base_name}_mindmap.html", html_content)
-                        if result.get('summary'):
-                            zip_file.writestr(f"{base_name}_summary.md", result['summary'])
-                
-                zip_buffer.seek(0)
-                
                 st.download_button(
                     label="📥 Download Complete Package",
-                    data=zip_buffer.getvalue(),
+                    data=build_results_archive(st.session_state.results),
                     file_name="CodeDocuAI_Analysis_Results.zip",
                     mime="application/zip",
                     key="download_zip_final",
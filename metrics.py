@@ -0,0 +1,283 @@
+# metrics.py
+"""
+Per-call LLM metrics with Prometheus text and JSON lines export.
+
+Every request sent to a provider is recorded with its queue wait (time from
+the call until the request is dispatched: concurrency slots, endpoint lease
+and rate limiting), time to first token, total duration, prompt, completion
+and cached tokens, finish reason or error class, provider, model and task.
+Records feed in-process histograms and a bounded log of recent calls.
+"""
+
+import os
+import json
+import time
+import bisect
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional, Sequence
+
+from token_budget import cached_prompt_tokens
+
+logger = logging.getLogger(__name__)
+
+# Metrics configuration (overridable through environment variables)
+METRICS_WINDOW = int(os.getenv("LLM_METRICS_WINDOW", "1000"))   # Recent call records kept for JSON lines export
+SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+# name: (help text, buckets, record field)
+HISTOGRAMS = {
+    'llm_queue_wait_seconds': (
+        "Time from the call until the request was dispatched", SECONDS_BUCKETS, 'queue_wait'),
+    'llm_time_to_first_token_seconds': (
+        "Time from dispatch until the first response token (the whole response when not streaming)",
+        SECONDS_BUCKETS, 'time_to_first_token'),
+    'llm_request_duration_seconds': (
+        "Time from dispatch until the response was complete, including retries", SECONDS_BUCKETS, 'duration'),
+    'llm_prompt_tokens': ("Prompt tokens reported by the provider", TOKEN_BUCKETS, 'prompt_tokens'),
+    'llm_completion_tokens': ("Completion tokens reported by the provider", TOKEN_BUCKETS, 'completion_tokens'),
+}
+COUNTERS = {
+    'llm_requests_total': "Requests sent to the provider",
+    'llm_errors_total': "Failed requests by error class",
+    'llm_finish_reasons_total': "Completed requests by finish reason",
+    'llm_cached_prompt_tokens_total': "Prompt tokens served from the provider's prefix cache",
+}
+
+
+class Histogram:
+    """Prometheus-style histogram; counts[i] holds observations in (buckets[i-1], buckets[i]]."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside its bucket, like histogram_quantile()."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets, self.counts):
+            if count and cumulative + count >= rank:
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = upper
+        return self.buckets[-1]
+
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+
+def _format_labels(labels: tuple) -> str:
+    """Render label pairs as {name="value",...} with Prometheus escaping."""
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """Process-wide histograms and counters keyed by (provider, model, task), plus recent call records."""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=window)
+        self._histograms = {}
+        self._counters = {}
+
+    def _count(self, name: str, labels: tuple, amount: float = 1) -> None:
+        self._counters[(name, labels)] = self._counters.get((name, labels), 0) + amount
+
+    def record(self, record: dict) -> None:
+        """Add one call record (see CallTracker.to_record)."""
+        labels = (('provider', record['provider']), ('model', record['model']), ('task', record['task']))
+        with self._lock:
+            self._records.append(record)
+            self._count('llm_requests_total', labels)
+            if record['error']:
+                self._count('llm_errors_total', labels + (('error', record['error']),))
+            else:
+                self._count('llm_finish_reasons_total', labels + (('finish_reason', record['finish_reason'] or "unknown"),))
+            if record['cached_tokens']:
+                self._count('llm_cached_prompt_tokens_total', labels, record['cached_tokens'])
+            for name, (_, buckets, field) in HISTOGRAMS.items():
+                if record[field] is not None:
+                    histogram = self._histograms.get((name, labels))
+                    if histogram is None:
+                        histogram = self._histograms[(name, labels)] = Histogram(buckets)
+                    histogram.observe(record[field])
+
+    def prometheus_text(self) -> str:
+        """Export all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, help_text in COUNTERS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for (counter, labels), value in self._counters.items():
+                    if counter == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            for name, (help_text, buckets, _) in HISTOGRAMS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (histogram_name, labels), histogram in self._histograms.items():
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for upper, count in zip(list(buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', upper),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def json_lines(self) -> str:
+        """Export the recent call records, one JSON object per line."""
+        with self._lock:
+            records = list(self._records)
+        return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+    def summary(self, group_by: str = 'provider') -> dict:
+        """Aggregate the histograms and counters by 'provider', 'model' or 'task' for display."""
+        groups = {}
+        with self._lock:
+            for (name, labels), histogram in self._histograms.items():
+                group = groups.setdefault(dict(labels)[group_by], {})
+                merged = group.setdefault(name, Histogram(histogram.buckets))
+                merged.merge(histogram)
+            counters = {}
+            for (name, labels), value in self._counters.items():
+                key = (dict(labels)[group_by], name)
+                counters[key] = counters.get(key, 0) + value
+                groups.setdefault(dict(labels)[group_by], {})
+
+        def rounded(value, digits=2):
+            return round(value, digits) if value is not None else None
+
+        summary = {}
+        for group, histograms in groups.items():
+            empty = Histogram(SECONDS_BUCKETS)
+            duration = histograms.get('llm_request_duration_seconds', empty)
+            summary[group] = {
+                'requests': int(counters.get((group, 'llm_requests_total'), 0)),
+                'errors': int(counters.get((group, 'llm_errors_total'), 0)),
+                'p50': rounded(duration.quantile(0.5)),
+                'p95': rounded(duration.quantile(0.95)),
+                'ttft_p50': rounded(histograms.get('llm_time_to_first_token_seconds', empty).quantile(0.5)),
+                'queue_wait_mean': rounded(histograms.get('llm_queue_wait_seconds', empty).mean()),
+                'prompt_tokens': int(histograms['llm_prompt_tokens'].sum) if 'llm_prompt_tokens' in histograms else 0,
+                'completion_tokens': int(histograms['llm_completion_tokens'].sum)
+                if 'llm_completion_tokens' in histograms else 0,
+                'cached_tokens': int(counters.get((group, 'llm_cached_prompt_tokens_total'), 0)),
+            }
+        return summary
+
+
+class CallTracker:
+    """Timestamps and usage of one provider request, filled in as the request progresses."""
+
+    def __init__(self, config: dict, task: str, on_dispatch: Optional[Callable[[], None]] = None):
+        self.task = task
+        self.provider = config['provider']
+        self.model = config['model']
+        self.on_dispatch = on_dispatch
+        self.started = time.monotonic()
+        self.sent = None
+        self.attempt_sent = None
+        self.first_token_at = None
+        self.finished = None
+        self.usage = None
+        self.finish_reason = None
+
+    def use_endpoint(self, config: dict) -> None:
+        """Attribute the call to the endpoint that actually serves it."""
+        self.provider = config['provider']
+        self.model = config['model']
+
+    def sending(self, request_fn):
+        """Wrap a request function so that its first dispatch and every attempt are timestamped."""
+        def send():
+            self.attempt_sent = time.monotonic()
+            if self.sent is None:
+                self.sent = self.attempt_sent
+                if self.on_dispatch is not None:
+                    self.on_dispatch()
+            return request_fn()
+        return send
+
+    def first_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+
+    def complete(self, usage=None, finish_reason: Optional[str] = None) -> None:
+        self.first_token()
+        self.finished = time.monotonic()
+        self.usage = usage or self.usage
+        self.finish_reason = finish_reason or self.finish_reason
+
+    def latency(self) -> Optional[float]:
+        """Seconds from sending the last attempt until the response was complete, without queueing or retries."""
+        if self.attempt_sent is None or self.finished is None:
+            return None
+        return self.finished - self.attempt_sent
+
+    def to_record(self, error: Optional[BaseException] = None) -> dict:
+        now = time.monotonic()
+        sent = self.sent if self.sent is not None else now
+        return {
+            'timestamp': round(time.time(), 3),
+            'provider': self.provider,
+            'model': self.model,
+            'task': self.task,
+            'queue_wait': round(sent - self.started, 4),
+            'time_to_first_token': round(self.first_token_at - sent, 4) if self.first_token_at else None,
+            'duration': round((self.finished or now) - sent, 4) if self.sent is not None else None,
+            'prompt_tokens': getattr(self.usage, 'prompt_tokens', None),
+            'completion_tokens': getattr(self.usage, 'completion_tokens', None),
+            'cached_tokens': cached_prompt_tokens(self.usage) if self.usage is not None else None,
+            'finish_reason': self.finish_reason,
+            'error': type(error).__name__ if error is not None else None,
+        }
+
+
+# Process-wide registry shared by all sessions
+_metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Get the shared metrics registry."""
+    return _metrics
+
+
+@contextmanager
+def track_call(config: dict, task: str, on_dispatch: Optional[Callable[[], None]] = None):
+    """
+    Record one provider request. Yields a CallTracker to timestamp and complete; the
+    record is added on exit, with the error class if the request raised. on_dispatch is
+    called once, when the request is first sent.
+    """
+    call = CallTracker(config, task, on_dispatch)
+    try:
+        yield call
+    except (asyncio.CancelledError, GeneratorExit):
+        # Cancelled hedges and abandoned streams say nothing about the provider
+        raise
+    except BaseException as e:
+        _metrics.record(call.to_record(e))
+        raise
+    _metrics.record(call.to_record())
@@ -0,0 +1,457 @@
+# mock_server.py
+"""
+Local stand-in for an OpenAI-compatible provider, for testing and benchmarking without a network.
+
+Implements /chat/completions (streaming and non-streaming) plus the /files and
+/batches endpoints used by batch.py. A latency profile controls the time to
+first token (log-normal), the output rate in tokens per second, a requests per
+minute limit answered with 429 + Retry-After, and injected server errors.
+Responses are canned markdown shaped like the requested artifact (SDD sections,
+mindmap, summary, design notes) and depend only on the prompt; the artifact is
+chosen from the instructions that follow the shared context, so source code
+mentioning "summary" or "mindmap" does not change it. With a seed, the injected
+latencies and errors are reproducible too.
+
+Usage:
+    python mock_server.py --port 8765 --profile typical
+then select the "Mock" provider, or point the base URL of any provider at
+http://127.0.0.1:8765/v1.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import uuid
+import random
+import hashlib
+import email.parser
+import email.policy
+import logging
+import argparse
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Server configuration (overridable through environment variables)
+MOCK_PORT = int(os.getenv("MOCK_LLM_PORT", "8765"))
+MOCK_PROFILE = os.getenv("MOCK_LLM_PROFILE", "typical")
+MOCK_BATCH_DELAY = float(os.getenv("MOCK_LLM_BATCH_DELAY", "2"))   # Seconds before a batch completes
+CHARS_PER_TOKEN = 4                                                 # Used for usage counts and pacing
+
+# Latency profiles: log-normal time to first token (median seconds, sigma), output tokens
+# per second (0 = unpaced), requests per minute before 429s (0 = unlimited) and the
+# fraction of requests answered with a 5xx error
+LATENCY_PROFILES = {
+    'instant': {'ttft_median': 0.0, 'ttft_sigma': 0.0, 'tokens_per_second': 0, 'rpm': 0, 'error_rate': 0.0},
+    'fast': {'ttft_median': 0.2, 'ttft_sigma': 0.3, 'tokens_per_second': 200, 'rpm': 0, 'error_rate': 0.0},
+    'typical': {'ttft_median': 0.8, 'ttft_sigma': 0.5, 'tokens_per_second': 60, 'rpm': 0, 'error_rate': 0.0},
+    'slow': {'ttft_median': 3.0, 'ttft_sigma': 0.7, 'tokens_per_second': 20, 'rpm': 0, 'error_rate': 0.0},
+    'flaky': {'ttft_median': 0.8, 'ttft_sigma': 1.0, 'tokens_per_second': 60, 'rpm': 0, 'error_rate': 0.1},
+    'throttled': {'ttft_median': 0.8, 'ttft_sigma': 0.5, 'tokens_per_second': 60, 'rpm': 30, 'error_rate': 0.0},
+}
+ERROR_STATUSES = (500, 502, 503)
+
+# Section lists in SDD prompts ("FOCUS ONLY ON THESE SECTIONS:" / "Required sections to cover:")
+SECTION_LIST_PATTERN = re.compile(r"(?:FOCUS ONLY ON THESE SECTIONS|Required sections to cover):\s*\n((?:\s*- .+\n)+)")
+# Task line that starts the instructions after the shared context ("<context>\n\n<task>: <instructions>")
+TASK_LINE_PATTERN = re.compile(r"\n\n(?:Generate|Extract|Condense|Summarize|Review|Update|Adapt) [^\n:]*: ")
+
+
+def _paragraph(seed: str, sentences: int = 3) -> str:
+    """Deterministic filler text derived from seed."""
+    words = ["component", "module", "request", "configuration", "service", "handler", "pipeline",
+             "validation", "cache", "client", "response", "workflow", "interface", "data", "error"]
+    rng = random.Random(hashlib.sha256(seed.encode("utf-8")).digest())
+    return " ".join(
+        f"The {rng.choice(words)} {rng.choice(['handles', 'validates', 'stores', 'forwards', 'builds'])} "
+        f"the {rng.choice(words)} used by the {rng.choice(words)}."
+        for _ in range(sentences)
+    )
+
+
+def _instructions(prompt: str) -> str:
+    """The part of the prompt after the shared context (source code or document), or all of it."""
+    tasks = list(TASK_LINE_PATTERN.finditer(prompt))
+    return prompt[tasks[-1].start():] if tasks else prompt
+
+
+def canned_content(prompt: str) -> str:
+    """Markdown shaped like the artifact the prompt's instructions ask for."""
+    instructions = _instructions(prompt)
+    sections = SECTION_LIST_PATTERN.search(instructions)
+    if sections:
+        headings = [line.strip()[2:].strip() for line in sections.group(1).splitlines() if line.strip()]
+        return "\n\n".join(
+            f"{'#' * min(4, 2 + heading.split(' ')[0].count('.'))} {heading}\n\n{_paragraph(prompt + heading)}"
+            for heading in headings
+        ) + "\n"
+    if instructions.rstrip().endswith("Code facts:"):
+        return "\n\n".join(
+            f"## {heading}\n\n- {_paragraph(prompt + heading, 1)}"
+            for heading in ["Modules", "Classes and Functions", "Data Structures", "Inputs and Outputs",
+                            "Errors and Exceptions", "Configuration", "External Dependencies", "Control Flow"]
+        ) + "\n"
+    if "mindmap" in instructions.lower():
+        return (
+            "# Code Overview\n\n## Architecture\n\n### Components\n\n- Client layer\n- Service layer\n\n"
+            "### Data Flow\n\n- Input parsing\n- Response handling\n\n## Key Functions\n\n### Processing\n\n"
+            "- Validation\n- Transformation\n\n## Configuration\n\n- Environment variables\n- Defaults\n"
+        )
+    if "design notes" in instructions.lower():
+        return f"- `process()`: {_paragraph(prompt, 1)}\n- `load_config()`: {_paragraph(prompt + 'config', 1)}\n"
+    if "summar" in instructions.lower():
+        return _paragraph(prompt, 4) + "\n"
+    return f"# Mock response\n\n{_paragraph(prompt)}\n"
+
+
+def _usage(prompt: str, content: str) -> dict:
+    prompt_tokens = max(1, len(prompt) // CHARS_PER_TOKEN)
+    completion_tokens = max(1, len(content) // CHARS_PER_TOKEN)
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+        'prompt_tokens_details': {'cached_tokens': 0}
+    }
+
+
+def canned_completion(body: dict) -> dict:
+    """Build a deterministic chat completion for a request body."""
+    prompt = body['messages'][-1]['content']
+    content = canned_content(prompt)
+    return {
+        'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        'object': "chat.completion",
+        'created': int(time.time()),
+        'model': body.get('model', "mock"),
+        'choices': [{
+            'index': 0,
+            'message': {'role': "assistant", 'content': content},
+            'finish_reason': "stop"
+        }],
+        'usage': _usage(prompt, content)
+    }
+
+
+class MockState:
+    """Latency profile, rate-limit window, uploaded files and batches held in memory."""
+
+    def __init__(self, profile: Optional[dict] = None, batch_delay: float = MOCK_BATCH_DELAY,
+                 seed: Optional[int] = None):
+        self.lock = threading.Lock()
+        self.profile = dict(profile or LATENCY_PROFILES[MOCK_PROFILE])
+        self.batch_delay = batch_delay
+        self.files = {}
+        self.batches = {}
+        self._rng = random.Random(seed)
+        self._recent = deque()
+        self.counters = {'requests': 0, 'rate_limited': 0, 'errors': 0}
+
+    def admit(self) -> Optional[tuple]:
+        """
+        Decide the fate of one chat request.
+
+        Returns:
+            None to serve it, or (status, retry_after) to reject it with an error
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.counters['requests'] += 1
+            rpm = self.profile['rpm']
+            if rpm:
+                while self._recent and now - self._recent[0] >= 60.0:
+                    self._recent.popleft()
+                if len(self._recent) >= rpm:
+                    self.counters['rate_limited'] += 1
+                    return 429, max(1, math.ceil(60.0 - (now - self._recent[0])))
+                self._recent.append(now)
+            if self._rng.random() < self.profile['error_rate']:
+                self.counters['errors'] += 1
+                return self._rng.choice(ERROR_STATUSES), None
+        return None
+
+    def time_to_first_token(self) -> float:
+        median = self.profile['ttft_median']
+        if median <= 0:
+            return 0.0
+        with self.lock:
+            return median * math.exp(self.profile['ttft_sigma'] * self._rng.gauss(0.0, 1.0))
+
+    def token_delay(self, tokens: int) -> float:
+        tokens_per_second = self.profile['tokens_per_second']
+        return tokens / tokens_per_second if tokens_per_second else 0.0
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file_id = f"file-{uuid.uuid4().hex[:16]}"
+        record = {
+            'id': file_id,
+            'object': "file",
+            'bytes': len(content),
+            'created_at': int(time.time()),
+            'filename': filename,
+            'purpose': purpose,
+            'status': "processed"
+        }
+        with self.lock:
+            self.files[file_id] = (record, content)
+        return record
+
+    def create_batch(self, request: dict) -> dict:
+        batch_id = f"batch_{uuid.uuid4().hex[:16]}"
+        batch = {
+            'id': batch_id,
+            'object': "batch",
+            'endpoint': request['endpoint'],
+            'input_file_id': request['input_file_id'],
+            'completion_window': request.get('completion_window', "24h"),
+            'status': "in_progress",
+            'created_at': int(time.time()),
+            'output_file_id': None,
+            'error_file_id': None,
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+            'metadata': request.get('metadata')
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+        threading.Thread(target=self._run_batch, args=(batch_id,), daemon=True).start()
+        return batch
+
+    def _run_batch(self, batch_id: str) -> None:
+        time.sleep(self.batch_delay)
+        with self.lock:
+            batch = self.batches[batch_id]
+            _, content = self.files[batch['input_file_id']]
+        lines = [json.loads(line) for line in content.decode("utf-8").splitlines() if line.strip()]
+        output = []
+        for line in lines:
+            response = {'status_code': 200, 'request_id': uuid.uuid4().hex, 'body': canned_completion(line['body'])}
+            output.append(json.dumps({'id': f"batch_req_{uuid.uuid4().hex[:12]}", 'custom_id': line['custom_id'],
+                                      'response': response, 'error': None}))
+        output_file = self.add_file(("\n".join(output) + "\n").encode("utf-8"), f"{batch_id}_output.jsonl",
+                                    "batch_output")
+        with self.lock:
+            batch.update(
+                status="completed",
+                output_file_id=output_file['id'],
+                completed_at=int(time.time()),
+                request_counts={'total': len(lines), 'completed': len(lines), 'failed': 0}
+            )
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Routes requests by path suffix, so any base URL prefix (e.g. /v1) works."""
+
+    state: MockState = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str, error_type: str = "invalid_request_error",
+                    headers: Optional[dict] = None) -> None:
+        self._send_json(status, {'error': {'message': message, 'type': error_type}}, headers)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _parts(self, path: str) -> list:
+        parts = path.split("?")[0].strip("/").split("/")
+        return parts[1:] if parts and parts[0] == "v1" else parts
+
+    def _chat_completion(self, body: dict) -> None:
+        rejection = self.state.admit()
+        if rejection is not None:
+            status, retry_after = rejection
+            if status == 429:
+                self._send_error(429, "Rate limit reached for requests", "rate_limit_error",
+                                 {'Retry-After': str(retry_after)})
+            else:
+                self._send_error(status, "Injected server error", "server_error")
+            return
+
+        time.sleep(self.state.time_to_first_token())
+        if body.get('stream'):
+            self._stream_completion(body)
+            return
+        completion = canned_completion(body)
+        time.sleep(self.state.token_delay(completion['usage']['completion_tokens']))
+        self._send_json(200, completion)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream_completion(self, body: dict) -> None:
+        """Send the canned response as server-sent events, paced at the profile's token rate."""
+        prompt = body['messages'][-1]['content']
+        content = canned_content(prompt)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices: list, usage: Optional[dict] = None) -> None:
+            chunk = {
+                'id': completion_id,
+                'object': "chat.completion.chunk",
+                'created': int(time.time()),
+                'model': body.get('model', "mock"),
+                'choices': choices
+            }
+            if usage is not None:
+                chunk['usage'] = usage
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+
+        event([{'index': 0, 'delta': {'role': "assistant", 'content': ""}, 'finish_reason': None}])
+        # Roughly one token per piece: words with their trailing whitespace
+        for piece in re.findall(r"\S+\s*|\s+", content):
+            time.sleep(self.state.token_delay(1))
+            event([{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}])
+        event([{'index': 0, 'delta': {}, 'finish_reason': "stop"}])
+        if (body.get('stream_options') or {}).get('include_usage'):
+            event([], _usage(prompt, content))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def do_POST(self):
+        parts = self._parts(self.path)
+        if parts[-2:] == ["chat", "completions"]:
+            self._chat_completion(json.loads(self._read_body()))
+        elif parts[-1:] == ["files"]:
+            upload = self._parse_upload(self._read_body())
+            if upload is None:
+                self._send_error(400, "Expected a multipart upload with a file field")
+                return
+            content, filename, purpose = upload
+            self._send_json(200, self.state.add_file(content, filename, purpose))
+        elif parts[-1:] == ["batches"]:
+            request = json.loads(self._read_body())
+            if request.get('input_file_id') not in self.state.files:
+                self._send_error(404, f"No such file: {request.get('input_file_id')}")
+                return
+            self._send_json(200, self.state.create_batch(request))
+        else:
+            self._send_error(404, f"Unknown endpoint: {self.path}")
+
+    def do_GET(self):
+        parts = self._parts(self.path)
+        if len(parts) >= 2 and parts[-2] == "batches":
+            with self.state.lock:
+                batch = self.state.batches.get(parts[-1])
+                batch = dict(batch) if batch else None
+            if batch is None:
+                self._send_error(404, f"No such batch: {parts[-1]}")
+            else:
+                self._send_json(200, batch)
+        elif len(parts) >= 3 and parts[-3] == "files" and parts[-1] == "content":
+            record = self.state.files.get(parts[-2])
+            if record is None:
+                self._send_error(404, f"No such file: {parts[-2]}")
+                return
+            content = record[1]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        elif len(parts) >= 2 and parts[-2] == "files":
+            record = self.state.files.get(parts[-1])
+            if record is None:
+                self._send_error(404, f"No such file: {parts[-1]}")
+            else:
+                self._send_json(200, record[0])
+        elif parts[-1:] == ["models"]:
+            self._send_json(200, {'object': "list", 'data': [{'id': "mock-model", 'object': "model"}]})
+        else:
+            self._send_error(404, f"Unknown endpoint: {self.path}")
+
+    def _parse_upload(self, body: bytes) -> Optional[tuple]:
+        """Extract (content, filename, purpose) from a multipart/form-data upload."""
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(header + body)
+        content = filename = None
+        purpose = "batch"
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                content = part.get_payload(decode=True)
+                filename = part.get_filename() or "upload.jsonl"
+            elif name == "purpose":
+                purpose = part.get_payload(decode=True).decode("utf-8")
+        return (content, filename, purpose) if content is not None else None
+
+
+def make_server(port: int = MOCK_PORT, profile: Optional[dict] = None, batch_delay: float = MOCK_BATCH_DELAY,
+                seed: Optional[int] = None) -> ThreadingHTTPServer:
+    """
+    Create a mock server with its own state; port 0 picks a free port.
+
+    Args:
+        port: Port to listen on
+        profile: Latency profile dict (see LATENCY_PROFILES); defaults to MOCK_PROFILE
+        batch_delay: Seconds before a submitted batch completes
+        seed: Seed for injected latencies and errors
+    """
+    handler = type("BoundMockHandler", (MockHandler,), {'state': MockState(profile, batch_delay, seed)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(port: int = MOCK_PORT, profile: Optional[dict] = None, batch_delay: float = MOCK_BATCH_DELAY,
+          seed: Optional[int] = None) -> ThreadingHTTPServer:
+    """Start the mock server in a background thread and return it; call shutdown() to stop."""
+    server = make_server(port, profile, batch_delay, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Mock LLM server listening on http://127.0.0.1:{server.server_address[1]}/v1")
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible mock LLM server.")
+    parser.add_argument("--port", type=int, default=MOCK_PORT)
+    parser.add_argument("--profile", choices=sorted(LATENCY_PROFILES), default=MOCK_PROFILE,
+                        help="Latency profile; the options below override its fields")
+    parser.add_argument("--ttft-median", type=float, help="Median seconds to first token")
+    parser.add_argument("--ttft-sigma", type=float, help="Log-normal spread of the time to first token")
+    parser.add_argument("--tokens-per-second", type=float, help="Output rate (0 = unpaced)")
+    parser.add_argument("--rpm", type=int, help="Requests per minute before answering 429 (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, help="Fraction of requests answered with a 5xx error")
+    parser.add_argument("--seed", type=int, help="Seed for injected latencies and errors")
+    parser.add_argument("--batch-delay", type=float, default=MOCK_BATCH_DELAY,
+                        help="Seconds before a submitted batch completes")
+    args = parser.parse_args()
+
+    profile = dict(LATENCY_PROFILES[args.profile])
+    for field in profile:
+        if getattr(args, field) is not None:
+            profile[field] = getattr(args, field)
+    server = make_server(args.port, profile, args.batch_delay, args.seed)
+    print(f"Mock LLM server listening on http://127.0.0.1:{args.port}/v1 with profile {profile}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
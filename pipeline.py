@@ -0,0 +1,532 @@
+# pipeline.py
+"""
+Asynchronous analysis pipeline.
+
+Every file becomes a small graph of tasks (extract, skeleton, code facts, SDD input, SDD,
+mindmap, summary, export) that declare their inputs; duplicates of another uploaded file
+only get tasks deriving their artifacts from that file's (see dedup.py). All files share
+one task graph on the pooled async client: a task starts as soon as its inputs are ready,
+in priority order, bounded by a global and a per-provider concurrency limit, so a run
+takes roughly as long as its slowest chain instead of the sum of all calls.
+"""
+
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils import (
+    aderive_artifact, aget_SDD, aupdate_SDD, aget_code_facts, aget_mindmap, aprepare_SDD_input, asummarize_text, clean_markdown_wrappers,
+    extract_code_from_file, get_current_api_config, artifact_store_key, load_artifact, save_artifact,
+    track_fallbacks, uses_code_facts
+)
+from llm_clients import aclose_loop_clients
+from dedup import find_duplicates
+from skeleton import SKELETON_FIDELITY, build_skeleton, uses_skeleton
+from symbol_index import build_symbol_index
+from token_budget import get_token_estimator
+from task_graph import TaskGraph
+from export import export_entries
+
+logger = logging.getLogger(__name__)
+
+# Concurrency configuration (overridable through environment variables)
+PIPELINE_MAX_CONCURRENCY = int(os.getenv("PIPELINE_MAX_CONCURRENCY", "8"))
+PIPELINE_PER_PROVIDER_CONCURRENCY = int(os.getenv("PIPELINE_PER_PROVIDER_CONCURRENCY", "4"))
+PIPELINE_SUMMARY_FROM_SOURCE = os.getenv("PIPELINE_SUMMARY_FROM_SOURCE", "0") == "1"
+PIPELINE_CODE_FACTS = os.getenv("PIPELINE_CODE_FACTS", "1") == "1"
+PIPELINE_MAX_FILES_IN_FLIGHT = int(os.getenv("PIPELINE_MAX_FILES_IN_FLIGHT", "32"))
+PIPELINE_CROSS_FILE_CONTEXT = os.getenv("PIPELINE_CROSS_FILE_CONTEXT", "1") == "1"
+PIPELINE_DEDUPLICATE = os.getenv("PIPELINE_DEDUPLICATE", "1") == "1"
+
+# Lower runs first when more tasks are ready than there are workers: the SDD chain is the
+# longest, so it starts first, and finishing a file's summary beats starting another mindmap
+TASK_PRIORITIES = {'extract': 0, 'skeleton': 0, 'facts': 1, 'sdd_input': 1, 'sdd': 1, 'summary': 2, 'mindmap': 3, 'export': 4}
+DERIVED_STAGES = {"SDD": "sdd", "Mindmap": "mindmap", "Summary": "summary"}
+
+
+class ConcurrencyLimits:
+    """
+    Global and per-provider semaphores bounding in-flight LLM calls. Each pooled API key
+    brings its own quota, so a provider with several keys gets per_provider slots per key
+    and the global limit grows by the extra keys' slots.
+    """
+
+    def __init__(self, max_concurrency: int = PIPELINE_MAX_CONCURRENCY,
+                 per_provider: int = PIPELINE_PER_PROVIDER_CONCURRENCY,
+                 endpoint_counts: Optional[Dict[str, int]] = None):
+        self._endpoint_counts = endpoint_counts or {}
+        extra_endpoints = sum(count - 1 for count in self._endpoint_counts.values() if count > 1)
+        self.capacity = max_concurrency + per_provider * extra_endpoints
+        self._global = asyncio.Semaphore(self.capacity)
+        self._per_provider = per_provider
+        self._providers = {}
+
+    @asynccontextmanager
+    async def slot(self, provider: str):
+        """Hold one provider slot and one global slot for the duration of a call."""
+        provider_semaphore = self._providers.get(provider)
+        if provider_semaphore is None:
+            limit = self._per_provider * self._endpoint_counts.get(provider, 1)
+            provider_semaphore = self._providers[provider] = asyncio.Semaphore(limit)
+        # Take the provider slot first so a throttled provider never holds global capacity
+        async with provider_semaphore:
+            async with self._global:
+                yield
+
+
+class _CallCounter:
+    """One file's view of the pipeline limits, counting the LLM calls the file sends through them."""
+
+    def __init__(self, limits: ConcurrencyLimits):
+        self._limits = limits
+        self.calls = 0
+
+    def slot(self, provider: str):
+        self.calls += 1
+        return self._limits.slot(provider)
+
+
+def _endpoint_counts(config: dict) -> Dict[str, int]:
+    """
+    Number of endpoints (API keys) that can serve calls made under each provider slot.
+    Calls take the slot of the configured provider and may then lease any pooled endpoint.
+    """
+    return {config['provider']: 1 + len(config.get('endpoints') or [])}
+
+
+def _add_file_tasks(graph: TaskGraph, index: int, source: dict, options: List[str], template_name: str,
+                    config: dict, limits: ConcurrencyLimits, stream: bool, summary_from_source: bool,
+                    code_facts: bool, skeleton_fidelity: str, on_partial: Optional[Callable],
+                    on_done: Callable) -> dict:
+    """
+    Add the tasks for one file to the graph and return the file_result they fill in.
+    Artifacts found in the result store are reused instead of generated; file_result
+    lists them under 'reused', and the generated ones under 'regenerated'.
+
+    extract -> skeleton -> facts -> sdd_input -> sdd -> summary -> export, with mindmap (and the
+    summary when summary_from_source is set) depending on facts only. The skeleton task compresses
+    large code files locally (see skeleton.py), records the token savings under 'skeleton' and
+    appends the source's cross-file context ('neighbours', see _add_neighbour_context).
+    The facts task condenses large sources into a code-facts document that every artifact reads
+    instead of the source; it passes small sources (or all of them without code_facts) through
+    unchanged. Every task of a file shares the file's group, so one failure stops the rest of that file.
+
+    A source carrying 'previous_sdd' and 'changed_symbols' (see repo_docs.py) gets its
+    previous SDD updated section by section instead of a new one; file_result lists the
+    rewritten headings under 'updated_sections'. The export task records the number of
+    LLM calls the file sent under 'llm_calls'. Artifacts that needed a fallback (the secondary
+    provider or a basic SDD, see track_fallbacks) are listed under 'fallbacks' and not stored,
+    so the next run generates them again.
+    """
+    limits = _CallCounter(limits)
+    file_result = {
+        'filename': source['filename'],
+        'content': source.get('content'),
+        'sdd': None,
+        'mindmap': None,
+        'summary': None,
+        'template_used': template_name,
+        'depends_on': source.get('depends_on', []),
+        'used_by': source.get('used_by', []),
+        'reused': [],
+        'regenerated': [],
+        'fallbacks': []
+    }
+    # Result-store keys and SDD lookup result, shared between this file's tasks
+    keys = {}
+    stored = {}
+
+    def partial_callback(artifact):
+        if not (stream and on_partial):
+            return None
+        return lambda partial: on_partial(index, artifact, partial)
+
+    def add(stage, fn, inputs=()):
+        return graph.add((index, stage), fn, [(index, dependency) for dependency in inputs],
+                         priority=TASK_PRIORITIES[stage], group=index)
+
+    def finish(artifact, value, reused):
+        file_result[artifact.lower()] = value
+        file_result['reused' if reused else 'regenerated'].append(artifact)
+        if reused and partial_callback(artifact):
+            partial_callback(artifact)(value)
+        on_done(source['filename'], f"{artifact} (reused)" if reused else artifact)
+
+    def lookup(artifact, text):
+        keys[artifact] = artifact_store_key(text, artifact, template_name, config)
+        return load_artifact(keys[artifact])
+
+    async def generate(artifact, make, fallbacks=()):
+        """Await make() and store its result unless a fallback served one of its calls (or its input's)."""
+        fallbacks = list(fallbacks)
+        with track_fallbacks() as noted:
+            value = await make()
+        fallbacks += noted
+        if fallbacks:
+            file_result['fallbacks'].append(artifact)
+            logger.warning(f"{source['filename']}: not storing the {artifact}, which needed a fallback "
+                           f"({'; '.join(fallbacks)})")
+        else:
+            save_artifact(keys[artifact], value)
+        return value
+
+    async def extract():
+        if file_result['content'] is None:
+            # Reading and decoding is blocking work; keep it off the event loop
+            file_result['content'] = await asyncio.to_thread(extract_code_from_file, source['file'])
+        return file_result['content']
+
+    async def skeleton(text):
+        compact = text
+        if uses_skeleton(text, skeleton_fidelity):
+            compact = await asyncio.to_thread(build_skeleton, text, source['filename'], skeleton_fidelity)
+        if compact is not text:
+            estimator = get_token_estimator()
+            file_result['skeleton'] = {
+                'fidelity': skeleton_fidelity,
+                'source_tokens': estimator.estimate(config['model'], text),
+                'skeleton_tokens': estimator.estimate(config['model'], compact)
+            }
+            logger.info(f"{source['filename']}: {skeleton_fidelity} skeleton, "
+                        f"{file_result['skeleton']['source_tokens']} -> {file_result['skeleton']['skeleton_tokens']} tokens")
+        if source.get('neighbours'):
+            compact = f"{compact}\n\n{source['neighbours']}"
+        return compact
+
+    async def facts(text):
+        if not (code_facts and uses_code_facts(text)):
+            return text
+        # Stored facts let a template change skip straight to the SDD
+        facts_text = lookup("Facts", text)
+        if facts_text is None:
+            facts_text = await generate("Facts", lambda: aget_code_facts(text, config=config, limits=limits))
+        return facts_text
+
+    async def sdd_input(text):
+        # Look the SDD up here so an unchanged file skips condensing its input as well
+        stored['SDD'] = lookup("SDD", text)
+        if stored['SDD'] is not None:
+            return text
+        try:
+            with track_fallbacks() as stored['input_fallbacks']:
+                return await aprepare_SDD_input(text, template_name, config=config, limits=limits)
+        except Exception as e:
+            # aget_SDD condenses the input again and falls back to a basic SDD if that fails too
+            logger.error(f"Error condensing input for SDD: {str(e)}")
+            return text
+
+    async def sdd(text):
+        sdd_text = stored['SDD']
+        reused = sdd_text is not None
+        if not reused and source.get('previous_sdd'):
+            async def make():
+                updated, file_result['updated_sections'] = await aupdate_SDD(
+                    text, source['previous_sdd'], source.get('changed_symbols', []), template_name,
+                    config=config, on_partial=partial_callback("SDD"), limits=limits
+                )
+                return clean_markdown_wrappers(updated)
+            sdd_text = await generate("SDD", make, stored.get('input_fallbacks', ()))
+        elif not reused:
+            async def make():
+                return clean_markdown_wrappers(await aget_SDD(text, template_name, config=config,
+                                                              on_partial=partial_callback("SDD"), limits=limits))
+            sdd_text = await generate("SDD", make, stored.get('input_fallbacks', ()))
+        finish("SDD", sdd_text, reused)
+        return sdd_text
+
+    async def mindmap(text):
+        mindmap_text = lookup("Mindmap", text)
+        reused = mindmap_text is not None
+        if not reused:
+            mindmap_text = await generate("Mindmap", lambda: aget_mindmap(
+                text, config=config, on_partial=partial_callback("Mindmap"), limits=limits
+            ))
+        finish("Mindmap", mindmap_text, reused)
+
+    async def summary(text, sdd_text=None):
+        # Use SDD for summary if available, otherwise use original content
+        summary_source = sdd_text if sdd_text else text
+        summary_text = lookup("Summary", summary_source)
+        reused = summary_text is not None
+        if not reused:
+            summary_text = await generate("Summary", lambda: asummarize_text(
+                summary_source, config=config, on_partial=partial_callback("Summary"), limits=limits
+            ))
+        finish("Summary", summary_text, reused)
+
+    async def export(*_):
+        file_result['llm_calls'] = limits.calls
+        file_result['exports'] = await asyncio.to_thread(export_entries, file_result)
+
+    artifacts = []
+    add("extract", extract)
+    if options:
+        add("skeleton", skeleton, ["extract"])
+        add("facts", facts, ["skeleton"])
+    if "SDD" in options:
+        add("sdd_input", sdd_input, ["facts"])
+        artifacts.append(add("sdd", sdd, ["sdd_input"]))
+    if "Mindmap" in options:
+        artifacts.append(add("mindmap", mindmap, ["facts"]))
+    if "Summary" in options:
+        chained = "SDD" in options and not summary_from_source
+        artifacts.append(add("summary", summary, ["facts", "sdd"] if chained else ["facts"]))
+    add("export", export, ["extract"] + [stage for _, stage in artifacts])
+    return file_result
+
+
+def _add_derived_tasks(graph: TaskGraph, index: int, source: dict, duplicate, sibling: dict, options: List[str],
+                       config: dict, limits: ConcurrencyLimits, stream: bool, on_partial: Optional[Callable],
+                       on_done: Callable) -> dict:
+    """
+    Add the tasks for a duplicate of an already documented file (see dedup.py) and return
+    the file_result they fill in. An exact duplicate takes the sibling's artifacts as they
+    are, without any call; a near duplicate gets each artifact rewritten from the sibling's
+    and the diff between the two files, one small call per artifact. file_result names the
+    sibling under 'duplicate_of' (exact) or 'near_duplicate_of', with the estimated
+    'similarity' and the 'calls_saved' against documenting the file in full.
+    """
+    limits = _CallCounter(limits)
+    file_result = {
+        'filename': source['filename'],
+        'content': source.get('content'),
+        'sdd': None,
+        'mindmap': None,
+        'summary': None,
+        'template_used': sibling['template_used'],
+        'depends_on': source.get('depends_on', []),
+        'used_by': source.get('used_by', []),
+        'reused': [],
+        'regenerated': [],
+        'duplicate_of' if duplicate.exact else 'near_duplicate_of': sibling['filename'],
+        'similarity': round(duplicate.similarity, 3)
+    }
+
+    def derive(artifact):
+        async def run():
+            value = sibling[artifact.lower()]
+            callback = (lambda partial: on_partial(index, artifact, partial)) if stream and on_partial else None
+            if duplicate.exact:
+                if callback:
+                    callback(value)
+            else:
+                value = await aderive_artifact(artifact, value, duplicate.diff, sibling['filename'],
+                                               source['filename'], config=config, on_partial=callback,
+                                               limits=limits)
+                if artifact == "SDD":
+                    value = clean_markdown_wrappers(value)
+            file_result[artifact.lower()] = value
+            file_result['reused' if duplicate.exact else 'regenerated'].append(artifact)
+            on_done(source['filename'], f"{artifact} ({'copied' if duplicate.exact else 'derived'} from {sibling['filename']})")
+        return run
+
+    async def export(*_):
+        file_result['llm_calls'] = limits.calls
+        file_result['calls_saved'] = max(0, sibling.get('llm_calls', 0) - limits.calls)
+        file_result['exports'] = await asyncio.to_thread(export_entries, file_result)
+
+    stages = [
+        graph.add((index, DERIVED_STAGES[artifact]), derive(artifact),
+                  priority=TASK_PRIORITIES[DERIVED_STAGES[artifact]], group=index)
+        for artifact in options
+    ]
+    graph.add((index, "export"), export, stages, priority=TASK_PRIORITIES["export"], group=index)
+    return file_result
+
+
+async def _read_sources(sources: list) -> list:
+    """
+    Read every source of a multi-file upload up front, for the steps that need all files at
+    once. Sources that cannot be read are left as they are, to fail in their own extract task.
+    """
+    async def read(source):
+        if source.get('content') is not None:
+            return source
+        try:
+            return dict(source, content=await asyncio.to_thread(extract_code_from_file, source['file']))
+        except Exception:
+            return source
+
+    return list(await asyncio.gather(*(read(source) for source in sources)))
+
+
+async def _add_neighbour_context(sources: list) -> list:
+    """
+    Index the read sources of a multi-file upload together (see symbol_index.py) and attach to
+    each one the signatures of the neighbouring definitions it uses ('neighbours') and its place
+    in the dependency graph ('depends_on', 'used_by').
+    """
+    index = await asyncio.to_thread(build_symbol_index, {
+        source['filename']: source['content'] for source in sources if source.get('content') is not None
+    })
+    if index is None:
+        return sources
+    logger.info(f"Symbol index: {index.stats()}")
+    return [
+        source if source.get('content') is None else dict(
+            source,
+            neighbours=index.neighbour_context(source['filename']),
+            depends_on=index.dependencies.get(source['filename'], []),
+            used_by=index.dependents.get(source['filename'], [])
+        )
+        for source in sources
+    ]
+
+
+async def run_pipeline(sources: Iterable[dict], options: List[str], template_name: str,
+                       config: Optional[dict] = None, stream: bool = False,
+                       on_progress: Optional[Callable] = None, on_partial: Optional[Callable] = None,
+                       max_concurrency: int = PIPELINE_MAX_CONCURRENCY,
+                       per_provider_concurrency: int = PIPELINE_PER_PROVIDER_CONCURRENCY,
+                       summary_from_source: bool = PIPELINE_SUMMARY_FROM_SOURCE,
+                       code_facts: bool = PIPELINE_CODE_FACTS,
+                       skeleton_fidelity: str = SKELETON_FIDELITY,
+                       cross_file_context: bool = PIPELINE_CROSS_FILE_CONTEXT,
+                       deduplicate: bool = PIPELINE_DEDUPLICATE,
+                       max_files_in_flight: int = PIPELINE_MAX_FILES_IN_FLIGHT) -> Tuple[list, list]:
+    """
+    Analyze all files concurrently as one task graph.
+
+    Args:
+        sources: {'filename', 'content'} dicts, or {'filename', 'file'} with a file-like
+            object to be extracted by the pipeline. A list, or a lazy iterator (e.g.
+            ingest.iter_project_sources) that is read only as file slots free up
+        options: Artifacts to generate ("SDD", "Mindmap", "Summary")
+        template_name: SDD template to use
+        config: API configuration snapshot (defaults to get_current_api_config())
+        stream: Stream responses and report partial text through on_partial
+        on_progress: Callback (done, total, label) called as artifacts complete
+        on_partial: Callback (file_index, artifact, text) receiving streamed text
+        max_concurrency: Global limit on in-flight LLM calls
+        per_provider_concurrency: Limit on in-flight LLM calls per provider and API key
+        summary_from_source: Summarize the source in parallel with the SDD instead of
+            summarizing the finished SDD (lower latency, no chaining)
+        code_facts: Condense large sources into a code-facts document once and generate
+            every artifact from it instead of resending the source
+        skeleton_fidelity: Compress large code files into a skeleton of this fidelity
+            (skeleton.FIDELITY_LEVELS) before prompting; "full" sends them as they are
+        cross_file_context: Index a multi-file list of sources together and give each file's
+            prompts the signatures of the other files' definitions it uses. Lazy sources are
+            not indexed, since that would mean reading them all before starting
+        deduplicate: Detect exact and near duplicates in a multi-file list of sources (see
+            dedup.py) and derive their artifacts from the first copy instead of generating them;
+            such results carry 'duplicate_of' or 'near_duplicate_of' and 'calls_saved'
+        max_files_in_flight: Files admitted into the task graph at the same time; bounds
+            memory for large projects
+
+    Returns:
+        Tuple of (results in input order, [(filename, error message), ...])
+    """
+    config = config or get_current_api_config()
+    duplicates = {}
+    if (cross_file_context or deduplicate) and isinstance(sources, (list, tuple)) and len(sources) > 1:
+        sources = await _read_sources(list(sources))
+        if deduplicate:
+            duplicates = await asyncio.to_thread(
+                find_duplicates, [source['filename'] for source in sources], [source.get('content') for source in sources]
+            )
+        if cross_file_context:
+            sources = await _add_neighbour_context(sources)
+    limits = ConcurrencyLimits(max_concurrency, per_provider_concurrency, _endpoint_counts(config))
+    selected = [option for option in ["SDD", "Mindmap", "Summary"] if option in options]
+    # Grows as files are admitted when sources is a lazy iterator of unknown length
+    total = len(sources) * len(selected) if isinstance(sources, (list, tuple)) else 0
+    done = 0
+
+    def on_done(filename, artifact):
+        nonlocal done
+        done += 1
+        if on_progress:
+            on_progress(done, total, f"{filename} — {artifact}")
+
+    graph = TaskGraph()
+    admitted = {}
+    outcomes = {}
+    errors = []
+    file_slots = asyncio.Semaphore(max_files_in_flight)
+    retirements = {}
+
+    async def retire(index):
+        """Record a finished file's outcome, drop its intermediate results and free its slot."""
+        await graph.settled((index, "export"))
+        outcomes[index] = graph.group_error(index)
+        graph.release(index)
+        file_slots.release()
+
+    def admit(index, source):
+        admitted[index] = (source['filename'], _add_file_tasks(
+            graph, index, source, selected, template_name, config, limits, stream,
+            summary_from_source, code_facts, skeleton_fidelity, on_partial, on_done
+        ))
+        retirements[index] = asyncio.ensure_future(retire(index))
+
+    async def feed():
+        nonlocal total
+        eager = isinstance(sources, (list, tuple))
+        iterator = iter([(i, source) for i, source in enumerate(sources) if i not in duplicates]
+                        if eager else enumerate(sources))
+        while True:
+            await file_slots.acquire()
+            try:
+                # Lazy sources (archives, directories) do blocking I/O to produce the next file
+                item = next(iterator, None) if eager else await asyncio.to_thread(next, iterator, None)
+            except Exception as e:
+                logger.error(f"Error reading sources: {str(e)}")
+                errors.append(("(sources)", str(e)))
+                item = None
+            if item is None:
+                file_slots.release()
+                break
+            if not eager:
+                total += len(selected)
+            admit(*item)
+
+        # Duplicates follow their sibling once it is done, and only then get their own tasks,
+        # so they never depend on tasks of a file that has already been released
+        for index, duplicate in sorted(duplicates.items()):
+            await asyncio.shield(retirements[duplicate.sibling])
+            await file_slots.acquire()
+            sibling_name, sibling = admitted[duplicate.sibling]
+            if outcomes[duplicate.sibling] is not None:
+                logger.warning(f"{sources[index]['filename']}: {sibling_name} failed, documenting it in full")
+                admit(index, sources[index])
+                continue
+            admitted[index] = (sources[index]['filename'], _add_derived_tasks(
+                graph, index, sources[index], duplicate, sibling, selected, config, limits, stream,
+                on_partial, on_done
+            ))
+            retirements[index] = asyncio.ensure_future(retire(index))
+
+    logger.info(f"Starting pipeline ({len(selected)} artifacts per file, "
+                f"concurrency {max_concurrency}/{per_provider_concurrency} per provider, "
+                f"{max_files_in_flight} files in flight)")
+    try:
+        # One worker per global call slot: the graph decides which ready task gets the next slot
+        await graph.run(workers=limits.capacity, feed=feed())
+        await asyncio.gather(*retirements.values())
+    finally:
+        for retirement in retirements.values():
+            retirement.cancel()
+        await aclose_loop_clients()
+
+    results = []
+    for index in sorted(admitted):
+        filename, file_result = admitted[index]
+        error = outcomes.get(index)
+        if error is not None:
+            logger.error(f"Error processing {filename}: {str(error)}")
+            errors.append((filename, str(error)))
+        else:
+            results.append(file_result)
+    if duplicates:
+        saved = sum(result.get('calls_saved', 0) for result in results)
+        logger.info(f"Deduplication: {len(duplicates)} of {len(sources)} files derived from a sibling, "
+                    f"{saved} LLM calls saved")
+    return results, errors
+
+
+def analyze_files(sources: Iterable[dict], options: List[str], template_name: str, **kwargs) -> Tuple[list, list]:
+    """Synchronous entry point for run_pipeline (used by the Streamlit script thread)."""
+    return asyncio.run(run_pipeline(sources, options, template_name, **kwargs))
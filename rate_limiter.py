@@ -0,0 +1,270 @@
+# rate_limiter.py
+"""
+Per-provider adaptive rate limiting with 429-aware retries.
+
+Each provider gets a token bucket for requests/minute and one for
+tokens/minute. The effective rate is scaled down multiplicatively on a 429
+and recovers additively on success, so throughput settles at the provider's
+real ceiling instead of failing files. As in TCP's AIMD, the rate is cut at
+most once per round trip: 429s for requests sent before the last cut report
+the rate that was already cut, and only extend the Retry-After block.
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+logger = logging.getLogger(__name__)
+
+# Limiter configuration (overridable through environment variables)
+DEFAULT_RPM = int(os.getenv("LLM_DEFAULT_RPM", "60"))
+DEFAULT_TPM = int(os.getenv("LLM_DEFAULT_TPM", "200000"))
+BURST_SECONDS = 10           # Bucket capacity expressed as seconds of sustained rate
+MIN_RATE_SCALE = 0.05        # Never throttle below 5% of the configured rate
+MAX_RATE_SCALE = 2.0         # Allow probing up to 2x the configured rate
+RATE_DECREASE_FACTOR = 0.5   # Multiplicative decrease on 429
+RATE_INCREASE_STEP = 0.02    # Additive increase per successful request
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+class TokenBucket:
+    """
+    Reservation-based token bucket. reserve() deducts immediately and returns
+    how long the caller must wait, so it works for both threads and coroutines.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self._rate = rate_per_minute / 60.0
+        self._capacity = max(1.0, self._rate * BURST_SECONDS)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take amount tokens (possibly going into debt) and return the wait in seconds."""
+        self._refill(now)
+        self._tokens -= amount
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self._rate
+
+    def refund(self, amount: float, now: float) -> None:
+        """Return (or, if negative, charge) tokens after the real cost is known."""
+        self._refill(now)
+        self._tokens = min(self._capacity, self._tokens + amount)
+
+    def set_rate(self, rate_per_minute: float, now: float) -> None:
+        self._refill(now)
+        self._rate = rate_per_minute / 60.0
+        self._capacity = max(1.0, self._rate * BURST_SECONDS)
+        self._tokens = min(self._tokens, self._capacity)
+
+    @property
+    def rate_per_minute(self) -> float:
+        return self._rate * 60.0
+
+
+class ProviderRateLimiter:
+    """Adaptive requests/minute and tokens/minute limiter for one provider."""
+
+    def __init__(self, name: str, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM):
+        self.name = name
+        self._lock = threading.Lock()
+        self._base_rpm = rpm
+        self._base_tpm = tpm
+        self._scale = 1.0
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._blocked_until = 0.0
+        self._decreased_at = None    # When the rate was last cut
+        self._stats = {'requests': 0, 'rate_limited': 0, 'retries': 0, 'wait_seconds': 0.0}
+
+    def _apply_scale(self, now: float) -> None:
+        self._requests.set_rate(self._base_rpm * self._scale, now)
+        self._tokens.set_rate(self._base_tpm * self._scale, now)
+
+    def reserve(self, estimated_tokens: int) -> float:
+        """Reserve capacity for one request and return how long to wait before sending it."""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(
+                self._blocked_until - now,
+                self._requests.reserve(1, now),
+                self._tokens.reserve(max(estimated_tokens, 1), now),
+                0.0
+            )
+            self._stats['requests'] += 1
+            self._stats['wait_seconds'] += delay
+            return delay
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Correct the token bucket once the provider reports real usage."""
+        if actual_tokens is None:
+            return
+        with self._lock:
+            self._tokens.refund(estimated_tokens - actual_tokens, time.monotonic())
+
+    def on_success(self) -> None:
+        with self._lock:
+            if self._scale < MAX_RATE_SCALE:
+                self._scale = min(MAX_RATE_SCALE, self._scale + RATE_INCREASE_STEP)
+                self._apply_scale(time.monotonic())
+
+    def on_rate_limited(self, retry_after: Optional[float], sent_at: Optional[float] = None) -> None:
+        """
+        Record a 429 for a request sent at sent_at (time.monotonic(); None for unknown).
+        The rate is only cut if the request was sent after the previous cut.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._stats['rate_limited'] += 1
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            if sent_at is not None and self._decreased_at is not None and sent_at < self._decreased_at:
+                return
+            self._decreased_at = now
+            self._scale = max(MIN_RATE_SCALE, self._scale * RATE_DECREASE_FACTOR)
+            self._apply_scale(now)
+            logger.warning(f"Rate limited by {self.name}; rate scaled to {self._scale:.2f} "
+                           f"({self._requests.rate_per_minute:.1f} rpm)")
+
+    def on_retry(self) -> None:
+        with self._lock:
+            self._stats['retries'] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._stats,
+                wait_seconds=round(self._stats['wait_seconds'], 2),
+                rate_scale=round(self._scale, 3),
+                rpm=round(self._requests.rate_per_minute, 1),
+                tpm=round(self._tokens.rate_per_minute)
+            )
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, rpm: Optional[int] = None, tpm: Optional[int] = None) -> ProviderRateLimiter:
+    """Get the process-wide limiter for a provider, creating it on first use."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = ProviderRateLimiter(name, rpm or DEFAULT_RPM, tpm or DEFAULT_TPM)
+            _limiters[name] = limiter
+        return limiter
+
+
+def get_rate_limiter_stats() -> dict:
+    """Get statistics for every provider limiter."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read Retry-After / retry-after-ms from an API error response, if present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _backoff_delay(attempt: int, retry_after: Optional[float]) -> float:
+    """Exponential backoff with full jitter, never shorter than Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def _handle_retryable(error: Exception, limiter: ProviderRateLimiter, attempt: int, max_retries: int,
+                      sent_at: float) -> float:
+    """Update the limiter for a failed attempt sent at sent_at and return the backoff delay, or re-raise."""
+    if isinstance(error, RateLimitError) and getattr(error, "code", None) == "insufficient_quota":
+        raise error
+
+    retry_after = _retry_after_seconds(error)
+    if isinstance(error, RateLimitError):
+        limiter.on_rate_limited(retry_after, sent_at)
+    if attempt >= max_retries:
+        raise error
+
+    limiter.on_retry()
+    delay = _backoff_delay(attempt, retry_after)
+    logger.warning(f"{type(error).__name__} from {limiter.name}; retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+    return delay
+
+
+def call_with_rate_limit(request_fn, limiter: ProviderRateLimiter, estimated_tokens: int,
+                         max_retries: int = MAX_RETRIES):
+    """Run a blocking API request under the limiter, retrying retryable errors with backoff."""
+    attempt = 0
+    while True:
+        delay = limiter.reserve(estimated_tokens)
+        if delay > 0:
+            time.sleep(delay)
+        sent_at = time.monotonic()
+        try:
+            result = request_fn()
+            limiter.on_success()
+            return result
+        except RETRYABLE_ERRORS as e:
+            # The next attempt reserves afresh, so give back the tokens this one did not use
+            limiter.record_usage(estimated_tokens, 0)
+            time.sleep(_handle_retryable(e, limiter, attempt, max_retries, sent_at))
+            attempt += 1
+
+
+async def acall_with_rate_limit(request_fn, limiter: ProviderRateLimiter, estimated_tokens: int,
+                                max_retries: int = MAX_RETRIES):
+    """Async variant of call_with_rate_limit; request_fn returns an awaitable."""
+    attempt = 0
+    while True:
+        delay = limiter.reserve(estimated_tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sent_at = time.monotonic()
+        try:
+            result = await request_fn()
+            limiter.on_success()
+            return result
+        except RETRYABLE_ERRORS as e:
+            # The next attempt reserves afresh, so give back the tokens this one did not use
+            limiter.record_usage(estimated_tokens, 0)
+            await asyncio.sleep(_handle_retryable(e, limiter, attempt, max_retries, sent_at))
+            attempt += 1
@@ -0,0 +1,322 @@
+# repo_docs.py
+"""
+Git-aware incremental documentation of a local repository.
+
+Each run writes the generated artifacts of every analyzable file of the working
+tree to an output directory, together with a manifest recording the commit it
+documented and every file's artifacts. The next run diffs the working tree
+against that commit and only analyzes what changed: files added, modified or
+left dirty by the previous run, and files the previous run could not document.
+A file that fails keeps its previous documentation and is marked dirty, so the
+next run tries it again. Everything else is carried over from the manifest
+without reading the file.
+A changed file keeps its previous SDD, and only the sections that mention the
+changed symbols (functions, classes, ...) are rewritten; see utils.aupdate_SDD.
+So a 5-file commit in a 2,000-file repository costs 5 files' worth of calls.
+
+Usage:
+    python repo_docs.py /path/to/repo --output docs     # first run documents every file
+    python repo_docs.py /path/to/repo --output docs     # later runs only what changed since
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+import subprocess
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ingest import is_analyzable
+from export import export_entries
+from pipeline import analyze_files
+from symbol_index import definitions
+
+logger = logging.getLogger(__name__)
+
+# Incremental documentation configuration
+MANIFEST_NAME = ".codedocuai-manifest.json"
+MANIFEST_VERSION = 2             # 2: output names keep the file's extension
+MAX_CHANGED_SYMBOLS = 20        # More changed symbols than this rewrite the whole SDD
+
+HUNK_PATTERN = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@(.*)$")
+
+
+def _git(root: str, *args: str) -> str:
+    result = subprocess.run(["git", "-C", root, "-c", "core.quotePath=false", *args],
+                            capture_output=True, text=True, encoding="utf-8", errors="replace")
+    if result.returncode != 0:
+        raise RuntimeError(f"git {args[0]} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+def _split_z(output: str) -> List[str]:
+    return [item for item in output.split("\0") if item]
+
+
+def _enclosing_definition(lines: List[str], line_number: int, filename: Optional[str]) -> Optional[str]:
+    """The nearest definition at or above a (1-based) line."""
+    for line in reversed(lines[:max(0, line_number)]):
+        names = definitions(line, filename)
+        if names:
+            return names[0]
+    return None
+
+
+def changed_symbols(diff: str, text: str, filename: Optional[str] = None) -> List[str]:
+    """
+    Symbols touched by a unified diff (-U0) of one file: names defined on added or removed
+    lines, the definitions enclosing each hunk in the current text, and git's hunk context.
+    """
+    lines = text.splitlines()
+    symbols = []
+
+    def add(names):
+        symbols.extend(name for name in names if name and name not in symbols)
+
+    for line in diff.splitlines():
+        hunk = HUNK_PATTERN.match(line)
+        if hunk:
+            start, count = int(hunk.group(1)), int(hunk.group(2) or "1")
+            add(definitions(hunk.group(3), filename))
+            add([_enclosing_definition(lines, start + max(0, count - 1), filename)])
+            add([_enclosing_definition(lines, start, filename)])
+        elif line[:1] in "+-" and not line.startswith(("+++", "---")):
+            add(definitions(line[1:], filename))
+    return symbols
+
+
+def _file_diffs(root: str, commit: str, paths: List[str]) -> Dict[str, str]:
+    """Zero-context diff of each path between commit and the working tree."""
+    if not paths:
+        return {}
+    diffs = {}
+    current = None
+    output = _git(root, "diff", "-U0", "--no-renames", "--no-color", "--no-ext-diff", commit, "--", *paths)
+    for line in output.splitlines(keepends=True):
+        if line.startswith("diff --git "):
+            current = None
+        elif line.startswith("+++ b/"):
+            current = line[len("+++ b/"):].rstrip("\n")
+            diffs[current] = ""
+        elif current is not None:
+            diffs[current] += line
+    return diffs
+
+
+def load_manifest(path: str) -> Optional[dict]:
+    """
+    The manifest of a previous run, or None if there is none or it cannot be read. A manifest
+    of another version is returned so its outputs can be removed, but nothing is carried over.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest {path}: {str(e)}")
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        logger.warning(f"Manifest {path} was written by another version; documenting everything")
+    return manifest
+
+
+def _write_file(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _output_names(entry: dict) -> List[str]:
+    """Files written for a manifest entry; version 1 entries do not list theirs and dropped the extension."""
+    if 'outputs' in entry:
+        return entry['outputs']
+    base_name = os.path.splitext(entry['filename'])[0]
+    return [f"{base_name}_SDD.md", f"{base_name}_mindmap.md", f"{base_name}_mindmap.html", f"{base_name}_summary.md"]
+
+
+def _remove_outputs(output: str, entry: dict) -> None:
+    for name in _output_names(entry):
+        try:
+            os.remove(os.path.join(output, name))
+        except FileNotFoundError:
+            pass
+
+
+def plan_changes(root: str, manifest: Optional[dict], options: List[str], template_name: str,
+                 exclude: Optional[str] = None) -> Tuple[List[str], List[str], Dict[str, dict], Optional[str]]:
+    """
+    Work out what a run has to do.
+
+    Args:
+        exclude: Directory (relative to root) whose files are never documented, e.g. the output
+
+    Returns:
+        Tuple of (paths to analyze, documented paths that no longer exist, entries to carry over,
+        commit the changes were computed against or None when everything is analyzed)
+    """
+    candidates = _split_z(_git(root, "ls-files", "-z", "--cached", "--others", "--exclude-standard"))
+    current = []
+    for path in candidates:
+        if exclude and path.startswith(exclude.rstrip("/") + "/"):
+            continue
+        full_path = os.path.join(root, path)
+        # Deleted but not yet staged files are still listed by the index
+        if os.path.isfile(full_path) and is_analyzable(path, os.path.getsize(full_path)):
+            current.append(path)
+    current_paths = set(current)
+
+    previous = (manifest or {}).get('files', {})
+    usable = (
+        manifest is not None
+        and manifest.get('version') == MANIFEST_VERSION
+        and manifest.get('template') == template_name
+        and set(options) <= set(manifest.get('options', []))
+    )
+    if usable:
+        try:
+            _git(root, "cat-file", "-e", f"{manifest['commit']}^{{commit}}")
+        except RuntimeError:
+            logger.warning(f"Commit {manifest['commit']} of the previous run is gone; documenting everything")
+            usable = False
+    if not usable:
+        return current, [path for path in previous if path not in current_paths], {}, None
+
+    # Tracked changes since the documented commit (committed or not), plus files that were
+    # dirty when it was documented, since their documented content may not be committed
+    changed = set(_split_z(_git(root, "diff", "--name-only", "--no-renames", "-z", manifest['commit'])))
+    changed.update(manifest.get('dirty', []))
+    to_analyze = [path for path in current if path in changed or path not in previous]
+    removed = [path for path in previous if path not in current_paths]
+    carried = {path: entry for path, entry in previous.items() if path in current_paths and path not in changed}
+    return to_analyze, removed, carried, manifest['commit']
+
+
+def _sources(root: str, paths: List[str], previous: Dict[str, dict], diffs: Dict[str, str]) -> Iterator[dict]:
+    """Read the files to analyze one at a time, attaching the previous SDD and changed symbols."""
+    for path in paths:
+        with open(os.path.join(root, path), "rb") as f:
+            data = f.read()
+        buffer = io.BytesIO(data)
+        buffer.name = path
+        source = {'filename': path, 'file': buffer}
+        entry = previous.get(path)
+        if entry and entry.get('sdd') and path in diffs:
+            symbols = changed_symbols(diffs[path], data.decode("utf-8", errors="replace"), path)
+            if 0 < len(symbols) <= MAX_CHANGED_SYMBOLS:
+                source['previous_sdd'] = entry['sdd']
+                source['changed_symbols'] = symbols
+        yield source
+
+
+def document_repository(repo: str, output: str, options: List[str], template_name: str = 'standard',
+                        manifest_path: Optional[str] = None, full: bool = False, **kwargs) -> dict:
+    """
+    Document a git working tree incrementally against the manifest of the previous run.
+
+    Args:
+        repo: Any path inside the working tree
+        output: Directory receiving the artifacts, mirroring the repository layout
+        options: Artifacts to generate ("SDD", "Mindmap", "Summary")
+        template_name: SDD template to use; a different template than last time redoes everything
+        manifest_path: Manifest to read and write (defaults to MANIFEST_NAME in output)
+        full: Ignore the previous manifest and document every file
+        **kwargs: Passed on to pipeline.run_pipeline
+
+    Returns:
+        Run report: commit, analyzed, updated (files whose SDD was updated section by
+        section), removed and reused file lists, and (filename, error message) errors
+    """
+    root = _git(repo, "rev-parse", "--show-toplevel").strip()
+    commit = _git(root, "rev-parse", "HEAD").strip()
+    manifest_path = manifest_path or os.path.join(output, MANIFEST_NAME)
+    manifest = None if full else load_manifest(manifest_path)
+
+    output_relative = os.path.relpath(os.path.abspath(output), root).replace(os.sep, "/")
+    to_analyze, removed, carried, base = plan_changes(
+        root, manifest, options, template_name,
+        exclude=None if output_relative.startswith("..") else output_relative
+    )
+    previous = (manifest or {}).get('files', {})
+    # Without a usable base commit every file gets a fresh SDD
+    diffs = _file_diffs(root, base, [path for path in to_analyze if path in previous]) if base else {}
+    logger.info(f"Documenting {len(to_analyze)} files, reusing {len(carried)}, removing {len(removed)}")
+
+    results, errors = analyze_files(_sources(root, to_analyze, previous, diffs), options, template_name, **kwargs)
+
+    files = dict(carried)
+    for path in removed:
+        _remove_outputs(output, previous[path])
+    analyzed = {result['filename'] for result in results}
+    # A file that failed keeps its previous documentation until the next run retries it
+    failed = [path for path in to_analyze if path not in analyzed]
+    files.update((path, previous[path]) for path in failed if path in previous)
+    for path in to_analyze:
+        if path in analyzed and path in previous:
+            _remove_outputs(output, previous[path])
+    for result in results:
+        entry = {
+            'filename': result['filename'],
+            'sdd': result['sdd'],
+            'mindmap': result['mindmap'],
+            'summary': result['summary']
+        }
+        exports = result.get('exports') or export_entries(entry)
+        entry['outputs'] = sorted(exports)
+        files[result['filename']] = entry
+        for name, content in exports.items():
+            _write_file(os.path.join(output, name), content)
+
+    dirty = set(_split_z(_git(root, "diff", "--name-only", "--no-renames", "-z", "HEAD")))
+    dirty.update(_split_z(_git(root, "ls-files", "-z", "--others", "--exclude-standard")))
+    # Retry failed files and artifacts that needed a fallback (see pipeline), even if unchanged
+    dirty.update(failed)
+    dirty.update(result['filename'] for result in results if result.get('fallbacks'))
+    _write_file(manifest_path, json.dumps({
+        'version': MANIFEST_VERSION,
+        'commit': commit,
+        'template': template_name,
+        'options': list(options),
+        'dirty': sorted(path for path in dirty if path in files),
+        'files': dict(sorted(files.items()))
+    }, indent=2))
+
+    return {
+        'commit': commit,
+        'analyzed': [result['filename'] for result in results],
+        'updated': [result['filename'] for result in results if result.get('updated_sections')],
+        'removed': removed,
+        'reused': sorted(carried),
+        'errors': errors
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Document a local git repository, regenerating only what changed.")
+    parser.add_argument("repo", nargs="?", default=".", help="Path inside the git working tree")
+    parser.add_argument("--output", default="docs", help="Directory receiving the documentation")
+    parser.add_argument("--options", nargs="+", default=["SDD", "Mindmap", "Summary"],
+                        choices=["SDD", "Mindmap", "Summary"], help="Artifacts to generate")
+    parser.add_argument("--template", default="standard", help="SDD template")
+    parser.add_argument("--manifest", help=f"Manifest of the previous run (default: <output>/{MANIFEST_NAME})")
+    parser.add_argument("--full", action="store_true", help="Ignore the previous run and document every file")
+    args = parser.parse_args(argv)
+
+    report = document_repository(args.repo, args.output, args.options, args.template,
+                                 manifest_path=args.manifest, full=args.full)
+    for filename, message in report['errors']:
+        print(f"Error processing {filename}: {message}", file=sys.stderr)
+    print(f"{report['commit'][:12]}: analyzed {len(report['analyzed'])} files "
+          f"({len(report['updated'])} SDDs updated by section), reused {len(report['reused'])}, "
+          f"removed {len(report['removed'])}")
+    return 1 if report['errors'] else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# retrieval.py
+"""
+In-process BM25 retrieval over code chunks.
+
+When a source is too large for one prompt, every SDD section group would
+otherwise see the same condensed view of it. Instead the source is cut into
+chunks at structural boundaries and indexed once with BM25 over
+identifier-split tokens (get_user_id and getUserId both yield get, user, id).
+Each section group queries the index with its headings plus keywords typical
+of those sections (exceptions, security, configuration, ...) and receives
+the best-scoring chunks that fit its budget, in source order. Building the
+index is a single regex pass and a few dictionary updates per token, so a few
+MB of code index in well under a second.
+"""
+
+import os
+import re
+import math
+import logging
+from collections import Counter
+from typing import List, Optional
+
+from token_budget import chunk_text, structural_boundary
+
+logger = logging.getLogger(__name__)
+
+# Retrieval configuration (overridable through environment variables)
+RETRIEVAL_CHUNK_CHARS = int(os.getenv("LLM_RETRIEVAL_CHUNK_CHARS", "1500"))  # Size of the indexed chunks
+RETRIEVAL_TOP_K = int(os.getenv("LLM_RETRIEVAL_TOP_K", "24"))                # Most chunks given to one query
+BM25_K1 = 1.5
+BM25_B = 0.75
+CHUNK_SEPARATOR = "\n...\n"
+
+WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9]*")
+CAMEL_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+STOPWORDS = {
+    "the", "and", "of", "to", "in", "is", "it", "if", "else", "for", "or", "not", "an", "on", "be", "as",
+    "self", "this", "return", "def", "var", "let", "const", "int", "void", "str", "none", "null",
+    "true", "false", "new", "with", "that", "are"
+}
+
+# Words code uses for what each kind of section describes, keyed by a word of the section heading
+SECTION_KEYWORDS = {
+    "overview": "main app init readme module usage",
+    "purpose": "main app usage description",
+    "references": "import include require from url http docs",
+    "feature": "main run process handle feature option",
+    "automation": "schedule cron job task worker run batch",
+    "technologies": "import include require from library framework client sdk",
+    "workflow": "main run process pipeline step start then next call",
+    "restriction": "limit max min timeout size validate check assert",
+    "diagram": "main run process pipeline call flow",
+    "input": "input output read write open file load save parse print args stdin stdout",
+    "output": "input output read write open file load save parse print args stdin stdout",
+    "configuration": "config settings env environ getenv option default yaml json ini",
+    "design": "class def function interface struct module",
+    "module": "class def function module import",
+    "detail": "class def function method",
+    "data": "class struct dict list schema model field table record type",
+    "structure": "class struct dict list schema model field type",
+    "exception": "exception error raise throw try except catch finally fail retry",
+    "error": "exception error raise throw try except catch finally fail retry",
+    "business": "validate check invalid status rule",
+    "security": "auth password token secret key credential encrypt hash permission login",
+    "credentials": "auth password token secret key credential login user",
+    "transmission": "http https request response send receive socket ssl tls url post get api",
+    "api": "api route endpoint request response http get post handler",
+    "database": "db database sql query table insert select update cursor connection",
+    "service": "service client server api request",
+    "deployment": "docker deploy port host env config",
+    "testing": "test assert mock fixture",
+    "performance": "cache async thread pool concurrency batch timeout",
+    "interface": "interface api endpoint route handler ui",
+}
+
+
+_split_cache = {}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase tokens of text, with identifiers split at underscores and camelCase humps."""
+    tokens = []
+    for word in WORD_PATTERN.findall(text):
+        parts = _split_cache.get(word)
+        if parts is None:
+            pieces = CAMEL_PATTERN.findall(word) if not word.islower() else [word]
+            parts = [piece.lower() for piece in pieces if len(piece) > 1 and piece.lower() not in STOPWORDS]
+            if len(_split_cache) < 200000:
+                _split_cache[word] = parts
+        tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over a list of documents."""
+
+    def __init__(self, documents: List[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.lengths = []
+        self.postings = {}    # term -> [(document index, term frequency)]
+        for i, document in enumerate(documents):
+            counts = Counter(tokenize(document))
+            self.lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self.postings.setdefault(term, []).append((i, frequency))
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def search(self, query: str, top_k: Optional[int] = None) -> List[tuple]:
+        """(document index, score) pairs for documents matching the query, best first."""
+        count = len(self.lengths)
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, frequency in postings:
+                norm = 1 - self.b + self.b * self.lengths[i] / (self.average_length or 1)
+                scores[i] = scores.get(i, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:top_k] if top_k else ranked
+
+
+def section_query(headings: List[str], description: str = "") -> str:
+    """Query text for a group of section headings: the headings plus their section keywords."""
+    words = [word.lower() for heading in headings for word in WORD_PATTERN.findall(heading)]
+    keywords = [SECTION_KEYWORDS[word] for word in dict.fromkeys(words) if word in SECTION_KEYWORDS]
+    return " ".join(headings + keywords + ([description] if description else []))
+
+
+class ChunkRetriever:
+    """A source cut into chunks and indexed once, to be queried per section group."""
+
+    def __init__(self, text: str, chunk_chars: int = RETRIEVAL_CHUNK_CHARS):
+        self.chunks = chunk_text(text, chunk_chars, structural_boundary(text))
+        self.index = BM25Index(self.chunks)
+
+    def select(self, query: str, budget_chars: int, top_k: int = RETRIEVAL_TOP_K) -> str:
+        """
+        The chunks most relevant to query that fit in budget_chars, in source order and joined
+        with CHUNK_SEPARATOR. The first chunk (imports, module docstring) is always included when
+        it fits; unmatched chunks, spread evenly over the source, fill any budget left over.
+        An empty source selects nothing.
+        """
+        if not self.chunks:
+            return ""
+        ranked = [i for i, _ in self.index.search(query, top_k)]
+        matched = set(ranked)
+        stride = max(1, len(self.chunks) // max(1, top_k))
+        spread = [i for i in range(0, len(self.chunks), stride) if i not in matched]
+        chosen = []
+        used = 0
+        for i in [0] + ranked + spread:
+            if i in chosen or len(chosen) >= top_k:
+                continue
+            size = len(self.chunks[i]) + len(CHUNK_SEPARATOR)
+            if used + size > budget_chars:
+                continue
+            chosen.append(i)
+            used += size
+        logger.debug(f"Retrieved {len(chosen)} of {len(self.chunks)} chunks ({len(matched)} matched) for: {query[:60]}")
+        return CHUNK_SEPARATOR.join(self.chunks[i].strip("\n") for i in sorted(chosen))
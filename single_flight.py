@@ -0,0 +1,140 @@
+# single_flight.py
+"""
+Process-wide single-flight deduplication of identical in-flight LLM requests.
+
+While a request for a given key (the response-cache key) is in flight, later
+callers from any session, thread or event loop wait for the same future
+instead of sending a duplicate request. Only the leader's request errors are
+shared: a leader that is cancelled or interrupted abandons the flight, and
+its followers join again so one of them sends the request instead.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Abandoned(Exception):
+    """Set on a flight whose leader stopped without a result; its followers join again."""
+
+
+class SingleFlight:
+    """Registry of in-flight requests keyed by request hash, with coalescing counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._leaders = 0
+        self._coalesced = 0
+        self._abandoned = 0
+
+    def join(self, key: str) -> Tuple[Future, bool]:
+        """
+        Join the flight for key.
+
+        Returns:
+            (future, leader) - the leader must send the request and call resolve();
+            everyone else waits on the future
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._coalesced += 1
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+            self._leaders += 1
+            return future, True
+
+    def resolve(self, key: str, future: Future, result=None, error: BaseException = None) -> None:
+        """Publish the leader's result (or error) to every waiting caller and end the flight."""
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def abandon(self, key: str, future: Future) -> None:
+        """End the flight without a result (the leader was cancelled); waiting callers join again."""
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            self._abandoned += 1
+        if not future.done():
+            future.set_exception(_Abandoned())
+
+    def do(self, key: str, request_fn):
+        """Run a blocking request once per key at a time; concurrent callers share its result."""
+        while True:
+            future, leader = self.join(key)
+            if leader:
+                break
+            logger.info("Coalesced duplicate in-flight LLM request")
+            try:
+                return future.result()
+            except _Abandoned:
+                continue
+        try:
+            result = request_fn()
+        except Exception as e:
+            self.resolve(key, future, error=e)
+            raise
+        except BaseException:
+            self.abandon(key, future)
+            raise
+        self.resolve(key, future, result)
+        return result
+
+    async def ado(self, key: str, request_fn):
+        """Async variant of do; request_fn returns an awaitable. Works across event loops."""
+        while True:
+            future, leader = self.join(key)
+            if leader:
+                break
+            logger.info("Coalesced duplicate in-flight LLM request")
+            try:
+                return await wait_for_flight(future)
+            except _Abandoned:
+                continue
+        try:
+            result = await request_fn()
+        except Exception as e:
+            self.resolve(key, future, error=e)
+            raise
+        except BaseException:
+            # Cancellation (e.g. of a failed file or released session) belongs to this caller only
+            self.abandon(key, future)
+            raise
+        self.resolve(key, future, result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'in_flight': len(self._in_flight),
+                'leaders': self._leaders,
+                'coalesced': self._coalesced,
+                'abandoned': self._abandoned,
+            }
+
+
+async def wait_for_flight(future: Future):
+    """Await another caller's flight without letting our own cancellation cancel it."""
+    return await asyncio.shield(asyncio.wrap_future(future))
+
+
+# Process-wide registry shared by all sessions
+_single_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Get the shared single-flight registry."""
+    return _single_flight
@@ -0,0 +1,325 @@
+# skeleton.py
+"""
+Local compression of source code into a skeleton before prompting.
+
+Design documents and mindmaps need a file's structure, not its function bodies,
+comment blocks or long literals. A skeleton keeps imports, class hierarchies,
+signatures, docstrings and the calls each function makes, and elides the rest.
+Python is parsed with the ast module; JavaScript, Java and C/C++ with a
+brace-aware scanner that skips strings, comments and regex literals, and keeps
+the source when braces do not balance. Fidelity levels, most to least detailed:
+
+    full        the source, unchanged
+    detailed    full docstrings, module and class attributes, calls and raised exceptions
+    signatures  first docstring lines, attributes, calls and raised exceptions
+    outline     imports, classes and signatures only
+
+Other file types, and sources a skeleton would not shrink, are returned unchanged.
+"""
+
+import os
+import re
+import ast
+import logging
+import builtins
+
+logger = logging.getLogger(__name__)
+
+# Skeleton configuration (overridable through environment variables)
+FIDELITY_LEVELS = ("full", "detailed", "signatures", "outline")
+SKELETON_FIDELITY = os.getenv("LLM_SKELETON_FIDELITY", "detailed")      # Default fidelity level
+SKELETON_MIN_CHARS = int(os.getenv("LLM_SKELETON_MIN_CHARS", "6000"))   # Smaller sources are sent whole
+MAX_LITERAL_CHARS = 80           # Longer string literals and values are shortened
+MAX_DOC_LINES = 12               # Docstring lines kept at "detailed" fidelity
+MAX_CALLS = 12                   # Calls listed per function
+MAX_STATEMENT_CHARS = 160        # Longer imports, assignments and signatures are shortened
+
+PYTHON_TYPES = ('.py',)
+BRACED_TYPES = ('.js', '.java', '.c', '.cpp', '.h')
+
+# Comments, doc comments, string and regex literals of brace languages, in one pass
+BRACED_TOKEN_PATTERN = re.compile(
+    r"(?P<doc>/\*\*(?!/).*?\*/|///[^\n]*)"
+    r"|(?P<comment>/\*.*?\*/|//[^\n]*)"
+    r"|(?P<string>\"(?:\\.|[^\"\\\n])*\"?|'(?:\\.|[^'\\\n])*'?|`(?:\\.|[^`\\])*`?)"
+    # A / where an operand is expected starts a regex literal, never a division
+    r"|(?:(?<=[(,=:\[!&|?{};])|(?<=\breturn))(?P<regex>[ \t]*/(?![/*])(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[A-Za-z]*)",
+    re.DOTALL
+)
+CONTAINER_PATTERN = re.compile(r"(?:\b(?:class|struct|interface|enum|namespace|union)\b[^=(]*|\bextern\s*\"C\"\s*)$")
+CALL_PATTERN = re.compile(r"(?<![\w$.>:])((?:new\s+)?[A-Za-z_$][\w$]*(?:(?:\.|->|::)[A-Za-z_$][\w$]*)*)\s*\(")
+NOT_CALLS = {"if", "for", "while", "switch", "return", "catch", "sizeof", "typeof", "function", "synchronized",
+             "elif", "defined", "throw"}
+PYTHON_BUILTINS = set(dir(builtins))
+INDENTED_DEFINITION_PATTERN = re.compile(r"^\s*(?:@|(?:async\s+)?def\s|class\s|import\s|from\s+\S+\s+import\s)")
+
+
+def uses_skeleton(text: str, fidelity: str = SKELETON_FIDELITY) -> bool:
+    """Whether text is large enough to be sent as a skeleton at this fidelity."""
+    return fidelity != "full" and len(text) >= SKELETON_MIN_CHARS
+
+
+def _shorten(text: str, limit: int = MAX_LITERAL_CHARS) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _doc_lines(doc: str, fidelity: str) -> list:
+    lines = [line.rstrip() for line in doc.strip().splitlines()]
+    if fidelity == "detailed":
+        return lines[:MAX_DOC_LINES] + (["..."] if len(lines) > MAX_DOC_LINES else [])
+    return lines[:1]
+
+
+def _list_line(label: str, names: list) -> str:
+    shown = names[:MAX_CALLS]
+    return f"{label}: {', '.join(shown)}" + (", ..." if len(names) > MAX_CALLS else "")
+
+
+# Python
+
+def _python_calls(nodes: list) -> tuple:
+    """Names called and exceptions raised anywhere in the given statements."""
+    calls, raises = [], []
+    for node in (child for statement in nodes for child in ast.walk(statement)):
+        if isinstance(node, ast.Call) and isinstance(node.func, (ast.Name, ast.Attribute)):
+            name = ast.unparse(node.func)
+            # Builtins (len, str, ...) and calls on computed values say little about the design
+            if name in PYTHON_BUILTINS or not re.fullmatch(r"[\w.]+", name):
+                continue
+            name = _shorten(name, 40)
+            if name not in calls:
+                calls.append(name)
+        elif isinstance(node, ast.Raise) and node.exc is not None:
+            exc = node.exc.func if isinstance(node.exc, ast.Call) else node.exc
+            name = _shorten(ast.unparse(exc), 40)
+            if name not in raises:
+                raises.append(name)
+    return calls, raises
+
+
+def _flatten(statement: ast.stmt) -> list:
+    """Statements nested in a module-level if/try/with/for block."""
+    nested = []
+    for field in ("body", "orelse", "finalbody"):
+        nested.extend(getattr(statement, field, []))
+    for handler in getattr(statement, "handlers", []):
+        nested.extend(handler.body)
+    return nested
+
+
+def _emit_python(statements: list, depth: int, fidelity: str, out: list, loose: list) -> None:
+    """Append skeleton lines for statements; calls of other statements are collected in loose."""
+    indent = "    " * depth
+    for node in statements:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            out.append(indent + _shorten(ast.unparse(node), MAX_STATEMENT_CHARS))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            for decorator in node.decorator_list:
+                out.append(f"{indent}@{_shorten(ast.unparse(decorator))}")
+            if isinstance(node, ast.ClassDef):
+                bases = [ast.unparse(base) for base in node.bases] + [ast.unparse(k) for k in node.keywords]
+                out.append(f"{indent}class {node.name}" + (f"({', '.join(bases)})" if bases else "") + ":")
+            else:
+                prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+                returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+                out.append(f"{indent}{prefix} {node.name}({_shorten(ast.unparse(node.args), MAX_STATEMENT_CHARS)}){returns}:")
+            inner = indent + "    "
+            body = node.body
+            doc = ast.get_docstring(node)
+            if doc is not None:
+                body = body[1:]
+                if fidelity != "outline":
+                    lines = _doc_lines(doc, fidelity)
+                    out.append(f'{inner}"""{lines[0]}' if len(lines) > 1 else f'{inner}"""{lines[0]}"""')
+                    if len(lines) > 1:
+                        out.extend(inner + line if line else "" for line in lines[1:])
+                        out.append(f'{inner}"""')
+            length = len(out)
+            if isinstance(node, ast.ClassDef):
+                _emit_python(body, depth + 1, fidelity, out, loose)
+            else:
+                if fidelity == "detailed":
+                    nested = [child for child in body if isinstance(
+                        child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))]
+                    _emit_python(nested, depth + 1, fidelity, out, [])
+                if fidelity != "outline":
+                    calls, raises = _python_calls(body)
+                    if calls:
+                        out.append(f"{inner}# {_list_line('calls', calls)}")
+                    if raises:
+                        out.append(f"{inner}# {_list_line('raises', raises)}")
+            if len(out) == length or not isinstance(node, ast.ClassDef):
+                out.append(f"{inner}...")
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            if fidelity != "outline":
+                out.append(indent + _shorten(ast.unparse(node), MAX_STATEMENT_CHARS))
+        elif isinstance(node, (ast.If, ast.Try, ast.With, ast.For, ast.While)) and depth == 0:
+            # Guarded imports and definitions (try: import x / if TYPE_CHECKING:) still belong to the module
+            _emit_python(_flatten(node), depth, fidelity, out, loose)
+        else:
+            loose.append(node)
+
+
+def _python_skeleton(text: str, fidelity: str) -> str:
+    tree = ast.parse(text)
+    out, loose = [], []
+    doc = ast.get_docstring(tree)
+    body = tree.body
+    if doc is not None:
+        body = body[1:]
+        if fidelity != "outline":
+            out.append('"""' + "\n".join(_doc_lines(doc, fidelity)) + '"""')
+    _emit_python(body, 0, fidelity, out, loose)
+    if loose and fidelity != "outline":
+        calls, _ = _python_calls(loose)
+        if calls:
+            out.append(f"# module-level {_list_line('calls', calls)}")
+    return "\n".join(out)
+
+
+def _indented_skeleton(text: str) -> str:
+    """Definitions and imports only, for Python the ast module cannot parse (e.g. Python 2)."""
+    return "\n".join(line.rstrip() for line in text.splitlines() if INDENTED_DEFINITION_PATTERN.match(line))
+
+
+# Brace languages
+
+def _doc_comment(comment: str, fidelity: str) -> str:
+    lines = [re.sub(r"^\s*(?:/\*\*|///|\*/|\*)\s?", "", line).rstrip() for line in comment.splitlines()]
+    lines = [re.sub(r"\s*\*/$", "", line) for line in lines]
+    lines = [line for line in lines if line.strip()]
+    if not lines:
+        return ""
+    lines = _doc_lines("\n".join(lines), fidelity)
+    if len(lines) == 1:
+        return f"/** {lines[0].strip()} */"
+    return "/**\n" + "\n".join(f" * {line}" for line in lines) + "\n */"
+
+
+def _braced_calls(body: str) -> list:
+    calls = []
+    for match in CALL_PATTERN.finditer(body):
+        name = re.sub(r"\s+", " ", match.group(1))
+        if name not in NOT_CALLS and name not in calls:
+            calls.append(name)
+    return calls
+
+
+def _braced_skeleton(text: str, fidelity: str) -> str:
+    """
+    Keep everything outside function bodies (declarations, class and namespace members,
+    imports and includes); collapse each body to { ... } with the calls it makes.
+    Raises ValueError when the braces do not balance, e.g. behind a construct the scanner misreads.
+    """
+    out = []
+    header = []          # Output since the last ; { or }, which decides what a { opens
+    containers = 0       # Open class/struct/namespace blocks whose members are kept
+    body = None          # Code of the body being collapsed, with its brace depth
+    depth = 0
+    data = False
+
+    def open_block():
+        nonlocal body, depth, data, containers
+        head = "".join(header).strip()
+        if CONTAINER_PATTERN.search(head):
+            containers += 1
+            out.append("{")
+        else:
+            # Function bodies, control blocks and initializers are collapsed
+            body, depth, data = [], 1, head.endswith(("=", "[]", "return"))
+        header.clear()
+
+    def close_body():
+        nonlocal body
+        calls = [] if data or fidelity == "outline" else _braced_calls("".join(body))
+        out.append(f"{{ /* {_list_line('calls', calls)} */ }}" if calls else "{ ... }")
+        body = None
+
+    position = 0
+    tokens = list(BRACED_TOKEN_PATTERN.finditer(text)) + [None]
+    for token in tokens:
+        code = text[position:token.start() if token else len(text)]
+        for char in code:
+            if body is not None:
+                if char == "{":
+                    depth += 1
+                elif char == "}":
+                    depth -= 1
+                    if depth == 0:
+                        close_body()
+                        continue
+                body.append(char)
+            elif char == "{":
+                open_block()
+            elif char == "}":
+                if not containers:
+                    raise ValueError("unbalanced braces")
+                containers -= 1
+                out.append(char)
+                header.clear()
+            else:
+                out.append(char)
+                if char == ";":
+                    header.clear()
+                else:
+                    header.append(char)
+        if token is None:
+            break
+        position = token.end()
+        if body is not None:
+            # Keep the code around a skipped literal apart, so `return /x/.test(s)` is not read as return.test()
+            body.append(" ")
+            continue
+        if token.group("regex") is not None:
+            out.append(token.group("regex"))
+            header.append(token.group("regex"))
+        elif token.group("string") is not None:
+            literal = token.group("string")
+            if len(literal) > MAX_LITERAL_CHARS:
+                literal = literal[:MAX_LITERAL_CHARS - 2] + "…" + literal[0]
+            out.append(literal)
+            header.append(literal)
+        elif token.group("doc") is not None and fidelity != "outline":
+            out.append(_doc_comment(token.group("doc"), fidelity))
+    if body is not None or containers:
+        raise ValueError("unbalanced braces")
+
+    lines = [line.rstrip() for line in "".join(out).splitlines()]
+    return "\n".join(line for line in lines if line.strip())
+
+
+def build_skeleton(text: str, filename: str, fidelity: str = SKELETON_FIDELITY) -> str:
+    """
+    Compress a source file into a skeleton of its structure.
+
+    Args:
+        text: Source code
+        filename: Name of the file, whose extension selects the parser
+        fidelity: One of FIDELITY_LEVELS
+
+    Returns:
+        The skeleton, prefixed with a note that bodies are elided; or text unchanged for
+        "full" fidelity, unsupported file types, and skeletons that would not be smaller
+    """
+    if fidelity not in FIDELITY_LEVELS:
+        raise ValueError(f"Unknown skeleton fidelity: {fidelity}. Use one of: {', '.join(FIDELITY_LEVELS)}")
+    ext = os.path.splitext(filename.lower())[1]
+    if fidelity == "full" or ext not in PYTHON_TYPES + BRACED_TYPES:
+        return text
+    if ext in PYTHON_TYPES:
+        try:
+            skeleton = _python_skeleton(text, fidelity)
+        except (SyntaxError, ValueError, RecursionError) as e:
+            logger.info(f"Cannot parse {filename} ({str(e)}); keeping definitions and imports only")
+            skeleton = _indented_skeleton(text)
+        note = f"# Code skeleton of {filename}: function bodies are omitted; '# calls:' lists the calls they make"
+    else:
+        try:
+            skeleton = _braced_skeleton(text, fidelity)
+        except ValueError as e:
+            logger.info(f"Cannot scan {filename} ({str(e)}); keeping the source")
+            return text
+        note = f"// Code skeleton of {filename}: function bodies are omitted; /* calls: */ lists the calls they make"
+    skeleton = f"{note}\n{skeleton}\n"
+    return skeleton if len(skeleton) < len(text) else text
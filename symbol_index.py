@@ -0,0 +1,223 @@
+# symbol_index.py
+"""
+Cross-file symbol index and module dependency graph for multi-file uploads.
+
+Files uploaded together usually belong to one project, but each one is
+documented on its own. The index records, for every file, the symbols it
+defines (with their signature lines), the modules it imports and the symbols
+of other files it references, and derives a module dependency graph from
+resolved imports and references. It is built in one pass over each file plus
+one dictionary lookup per distinct identifier, so it stays linear in the size
+of the upload. Per-file prompts then get a short block with the signatures of
+the neighbouring definitions the file actually uses, instead of whole files.
+"""
+
+import os
+import re
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Index configuration (overridable through environment variables)
+NEIGHBOUR_CONTEXT_CHARS = int(os.getenv("LLM_NEIGHBOUR_CONTEXT_CHARS", "2000"))  # Budget of the per-file context block
+MIN_SYMBOL_LENGTH = 3            # Shorter names (i, id, fn) match too much to be useful
+MAX_DEFINING_FILES = 3           # Names defined in more files (run, main, ...) are too ambiguous to link
+MAX_SIGNATURE_CHARS = 160
+
+# Definition lines across the supported languages: Python, JavaScript, Java, C/C++
+DEFINITION_PATTERNS = [
+    re.compile(r"^\s*(?:(?:export|default|public|private|protected|static|final|abstract|async|inline|typedef)\s+)*"
+               r"(?:def|class|function\*?|interface|struct|enum)\s+([A-Za-z_]\w*)"),
+    re.compile(r"^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_]\w*)\s*=\s*(?:async\s+)?"
+               r"(?:function\b|\([^)]*\)\s*=>|\w+\s*=>)"),
+]
+# C-style "type name(" lines, unless the first word makes them a statement; not used for Python
+C_DEFINITION_PATTERN = re.compile(
+    r"^\s*(?!(?:return|throw|case|delete|else|if|new|await|yield)\b)(?:[\w<>\[\],*&:~]+\s+)+\**([A-Za-z_]\w*)\s*\([^;]*$"
+)
+MAX_MEMBER_INDENT = 4            # Deeper definitions are local to a function and not indexed
+NOT_DEFINITIONS = {"if", "for", "while", "switch", "return", "catch", "else", "new", "sizeof", "elif", "with"}
+
+# Imported module paths: Python, JavaScript (ES modules and require), C/C++ includes, Java
+IMPORT_PATTERNS = [
+    re.compile(r"^\s*import\s+([\w.]+(?:\s*,\s*[\w.]+)*)\s*$", re.MULTILINE),
+    re.compile(r"^\s*from\s+(\.*[\w.]*)\s+import\b", re.MULTILINE),
+    re.compile(r"(?:\bfrom\s*|\brequire\s*\(\s*|^\s*import\s*)['\"]([^'\"]+)['\"]", re.MULTILINE),
+    re.compile(r"^\s*#\s*include\s*\"([^\"]+)\"", re.MULTILINE),
+    re.compile(r"^\s*import\s+(?:static\s+)?([\w.]+)\s*;", re.MULTILINE),
+]
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_$][\w$]*")
+
+
+def definitions(line: str, filename: Optional[str] = None) -> List[str]:
+    """Names defined on one line of code; filename, when given, selects the language's patterns."""
+    names = []
+    python = filename is not None and filename.lower().endswith(".py")
+    for pattern in DEFINITION_PATTERNS if python else DEFINITION_PATTERNS + [C_DEFINITION_PATTERN]:
+        for name in pattern.findall(line):
+            if name not in NOT_DEFINITIONS and name not in names:
+                names.append(name)
+    return names
+
+
+def _module_keys(filename: str) -> List[str]:
+    """Names an import of this file may use: dotted path, slash path and bare stem."""
+    path = os.path.splitext(filename.replace("\\", "/"))[0].lstrip("./")
+    stem = path.rsplit("/", 1)[-1]
+    keys = [path, path.replace("/", "."), stem, os.path.basename(filename)]
+    if stem in ("__init__", "index"):
+        # A package is imported by its directory name
+        keys.append(path.rsplit("/", 2)[-2] if "/" in path else stem)
+    return keys
+
+
+def _import_keys(module: str) -> List[str]:
+    """Lookup keys for one imported module path, most specific first."""
+    module = module.strip()
+    if "/" in module or module.startswith("."):
+        path = module.lstrip("./")
+        stem = os.path.splitext(path.rsplit("/", 1)[-1])[0]
+        return [p for p in (os.path.splitext(path)[0], path, stem) if p]
+    parts = module.split(".")
+    # a.b.c may name module a/b/c, or symbol c of module a/b (Java imports name classes)
+    return [module, ".".join(parts[:-1]), parts[-1], parts[-2] if len(parts) > 1 else ""]
+
+
+class Definition:
+    """A symbol defined in one file."""
+
+    def __init__(self, name: str, filename: str, line: int, signature: str):
+        self.name = name
+        self.filename = filename
+        self.line = line
+        self.signature = signature
+
+
+class SymbolIndex:
+    """
+    Definitions, imports, references and dependencies of a set of files.
+    Build it with SymbolIndex.build({filename: text}).
+    """
+
+    def __init__(self):
+        self.files = []
+        self.definitions = {}    # name -> [Definition]
+        self.imports = {}        # filename -> [imported module paths]
+        self.references = {}     # filename -> {name: [Definition in other files]}
+        self.dependencies = {}   # filename -> [filenames it imports or references]
+        self.dependents = {}     # filename -> [filenames that depend on it]
+
+    @classmethod
+    def build(cls, sources: Dict[str, str]) -> "SymbolIndex":
+        index = cls()
+        identifiers = {}
+        modules = {}
+        for filename, text in sources.items():
+            index.files.append(filename)
+            for key in _module_keys(filename):
+                modules.setdefault(key, []).append(filename)
+            python = filename.lower().endswith(".py")
+            for number, line in enumerate(text.splitlines(), 1):
+                # Module-level definitions (and class members in brace languages) can be used elsewhere
+                indent = len(line) - len(line.lstrip())
+                if indent > (0 if python else MAX_MEMBER_INDENT):
+                    continue
+                for name in definitions(line, filename):
+                    signature = " ".join(line.split()).rstrip("{").rstrip()
+                    if len(signature) > MAX_SIGNATURE_CHARS:
+                        signature = signature[:MAX_SIGNATURE_CHARS - 1] + "…"
+                    index.definitions.setdefault(name, []).append(Definition(name, filename, number, signature))
+            index.imports[filename] = [
+                module.strip() for pattern in IMPORT_PATTERNS
+                for match in pattern.findall(text) for module in match.split(",")
+            ]
+            identifiers[filename] = set(IDENTIFIER_PATTERN.findall(text))
+
+        # Names defined in too many files are too ambiguous to link a reference to one of them
+        linkable = {
+            name: {d.filename for d in defined} for name, defined in index.definitions.items()
+            if len(name) >= MIN_SYMBOL_LENGTH and not name.startswith("__")
+            and len({d.filename for d in defined}) <= MAX_DEFINING_FILES
+        }
+        for filename in index.files:
+            dependencies = []
+            for module in index.imports[filename]:
+                for key in _import_keys(module):
+                    targets = [target for target in modules.get(key, []) if target != filename]
+                    if len(targets) == 1:
+                        dependencies.append(targets[0])
+                        break
+            references = {}
+            for name in identifiers[filename]:
+                defining = linkable.get(name)
+                # A name the file defines itself refers to its own definition
+                if not defining or filename in defining:
+                    continue
+                references[name] = index.definitions[name]
+                dependencies.extend(defining)
+            index.references[filename] = references
+            index.dependencies[filename] = sorted(set(dependencies))
+        for filename in index.files:
+            index.dependents.setdefault(filename, [])
+            for target in index.dependencies[filename]:
+                index.dependents.setdefault(target, []).append(filename)
+        logger.info(f"Indexed {len(index.definitions)} symbols in {len(index.files)} files")
+        return index
+
+    def dependency_graph(self) -> Dict[str, List[str]]:
+        """Module dependency graph: each file with the files it depends on."""
+        return dict(self.dependencies)
+
+    def neighbour_context(self, filename: str, max_chars: int = NEIGHBOUR_CONTEXT_CHARS) -> str:
+        """
+        Signatures of the definitions in other files that filename uses, grouped by file,
+        imported files first, within max_chars. Empty if it uses none.
+        """
+        references = self.references.get(filename, {})
+        dependencies = self.dependencies.get(filename, [])
+        dependents = self.dependents.get(filename, [])
+        if not (references or dependents):
+            return ""
+        imported = {
+            target for module in self.imports.get(filename, []) for target in dependencies
+            if any(key in _module_keys(target) for key in _import_keys(module))
+        }
+        by_file = {}
+        for name in sorted(references):
+            for definition in references[name]:
+                by_file.setdefault(definition.filename, []).append(definition)
+
+        lines = ["Related code in other uploaded files (context only; document the code above, not these files):"]
+        if dependencies:
+            lines.append(f"Depends on: {', '.join(dependencies)}")
+        if dependents:
+            lines.append(f"Used by: {', '.join(dependents)}")
+        size = sum(len(line) + 1 for line in lines)
+        for neighbour in sorted(by_file, key=lambda f: (f not in imported, -len(by_file[f]), f)):
+            header = f"{neighbour}:"
+            entries = [f"  {d.signature}" for d in sorted(by_file[neighbour], key=lambda d: d.line)]
+            if size + len(header) + len(entries[0]) + 2 > max_chars:
+                break
+            lines.append(header)
+            size += len(header) + 1
+            for entry in entries:
+                if size + len(entry) + 1 > max_chars:
+                    break
+                lines.append(entry)
+                size += len(entry) + 1
+        return "\n".join(lines)
+
+    def stats(self) -> dict:
+        return {
+            'files': len(self.files),
+            'symbols': len(self.definitions),
+            'dependencies': sum(len(targets) for targets in self.dependencies.values())
+        }
+
+
+def build_symbol_index(sources: Dict[str, str]) -> Optional[SymbolIndex]:
+    """Index a multi-file upload; None for a single file, which has no neighbours."""
+    if len(sources) < 2:
+        return None
+    return SymbolIndex.build(sources)
@@ -0,0 +1,235 @@
+# task_graph.py
+"""
+Dependency-aware task graph executed by a shared pool of async workers.
+
+Tasks declare the tasks whose results they consume and start as soon as all
+of those have finished. Ready tasks are picked in priority order (lowest
+first, then insertion order) by a fixed number of workers, so an independent
+task never waits behind an unrelated chain. A failed task fails everything
+that depends on it and cancels the unfinished tasks of its group (e.g. the
+other artifacts of the same file).
+
+Tasks can also be added while the graph runs, by a feed coroutine passed to
+run(); the run ends once the feed has returned and every task has settled.
+"""
+
+import asyncio
+import logging
+import itertools
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+_UNSET = object()
+
+
+class _Task:
+    """One node of the graph: an async function of its inputs' results."""
+
+    def __init__(self, name: Hashable, fn: Callable[..., Awaitable], inputs: Sequence[Hashable],
+                 priority: int, group: Optional[Hashable], seq: int):
+        self.name = name
+        self.fn = fn
+        self.inputs = list(inputs)
+        self.priority = priority
+        self.group = group
+        self.seq = seq
+        self.waiting = 0
+        self.dependents = []
+
+
+class TaskGraph:
+    """
+    Collect tasks with add(), then await run().
+
+    Each task function is called with the results of its inputs as positional
+    arguments, in the order the inputs were declared.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._seq = itertools.count()
+        self._ready = None          # Priority queue of ready tasks while running
+        self._running = {}
+        self._failed_groups = set()
+        self._unsettled = 0
+        self._feeding = False
+        self._idle = None           # Set once nothing is left to run and the feed has returned
+        self._settled_events = {}
+        self._groups = {}
+        self.results = {}
+        self.errors = {}
+
+    def add(self, name: Hashable, fn: Callable[..., Awaitable], inputs: Sequence[Hashable] = (),
+            priority: int = 0, group: Optional[Hashable] = None) -> Hashable:
+        """Add a task; its inputs must already be in the graph. Returns the task name."""
+        if name in self._tasks:
+            raise ValueError(f"Duplicate task {name!r}")
+        missing = [dependency for dependency in inputs if dependency not in self._tasks]
+        if missing:
+            raise ValueError(f"Task {name!r} depends on unknown tasks {missing!r}")
+        task = _Task(name, fn, inputs, priority, group, next(self._seq))
+        self._tasks[name] = task
+        self._groups.setdefault(group, []).append(name)
+        self._unsettled += 1
+        for dependency in task.inputs:
+            self._tasks[dependency].dependents.append(task)
+        task.waiting = sum(1 for dependency in task.inputs if dependency not in self.results)
+
+        failed = [dependency for dependency in task.inputs if dependency in self.errors]
+        if failed:
+            self._fail(task, self.errors[failed[0]])
+        elif task.waiting == 0 and self._ready is not None:
+            self._push(task)
+        return name
+
+    def __contains__(self, name: Hashable) -> bool:
+        return name in self._tasks
+
+    async def settled(self, name: Hashable) -> None:
+        """Wait until a task has finished or failed."""
+        if name in self.results or name in self.errors:
+            return
+        event = self._settled_events.setdefault(name, asyncio.Event())
+        await event.wait()
+
+    def _push(self, task: _Task) -> None:
+        self._ready.put_nowait((task.priority, task.seq, task.name))
+
+    def _check_idle(self) -> None:
+        if self._idle is not None and self._unsettled == 0 and not self._feeding:
+            self._idle.set()
+
+    def _settle(self, task: _Task) -> None:
+        self._unsettled -= 1
+        event = self._settled_events.pop(task.name, None)
+        if event is not None:
+            event.set()
+        self._check_idle()
+
+    def _fail(self, task: _Task, error: BaseException) -> None:
+        """Fail a task and, transitively, every task that depends on it."""
+        group = task.group
+        stack = [(task, error)]
+        while stack:
+            task, error = stack.pop()
+            if task.name in self.errors:
+                continue
+            self.errors[task.name] = error
+            self._settle(task)
+            stack.extend((dependent, error) for dependent in task.dependents)
+        if group is not None and group not in self._failed_groups:
+            self._failed_groups.add(group)
+            for name, job in list(self._running.items()):
+                if self._tasks[name].group == group:
+                    job.cancel()
+
+    def _succeed(self, task: _Task, result) -> None:
+        self.results[task.name] = result
+        self._settle(task)
+        for dependent in task.dependents:
+            dependent.waiting -= 1
+            if dependent.waiting == 0 and dependent.name not in self.errors:
+                self._push(dependent)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, name = await self._ready.get()
+            task = self._tasks.get(name)
+            if task is None or name in self.errors:
+                continue
+            if task.group in self._failed_groups:
+                self._fail(task, asyncio.CancelledError(f"{name!r} cancelled after a failure in its group"))
+                continue
+            job = asyncio.ensure_future(task.fn(*[self.results[dependency] for dependency in task.inputs]))
+            self._running[name] = job
+            try:
+                # wait() rather than awaiting the job, so cancelling the job never cancels the worker
+                await asyncio.wait([job])
+            finally:
+                self._running.pop(name, None)
+                if not job.done():
+                    job.cancel()
+            if name not in self._tasks:
+                # Its group was released while it ran; nothing depends on it any more
+                self._settle(task)
+            elif job.cancelled():
+                self._fail(task, asyncio.CancelledError(f"{name!r} cancelled after a failure in its group"))
+            elif job.exception() is not None:
+                logger.debug(f"Task {name!r} failed: {job.exception()!r}")
+                self._fail(task, job.exception())
+            else:
+                self._succeed(task, job.result())
+
+    async def run(self, workers: int, feed: Optional[Awaitable] = None) -> Dict[Hashable, BaseException]:
+        """
+        Run every task on `workers` concurrent workers until all have finished or failed.
+
+        Args:
+            workers: Number of tasks running at the same time
+            feed: Optional coroutine that adds tasks while the graph runs; the run lasts
+                until it returns, and its exception (if any) is raised once the tasks it
+                added have settled
+
+        Returns:
+            self.errors: the exception of every task that failed, was skipped because an
+            input failed, or was cancelled because another task of its group failed.
+            Results are stored in self.results by task name.
+        """
+        self._ready = asyncio.PriorityQueue()
+        self._idle = asyncio.Event()
+        for task in self._tasks.values():
+            if task.waiting == 0 and task.name not in self.errors:
+                self._push(task)
+
+        feeder = None
+        if feed is not None:
+            self._feeding = True
+            feeder = asyncio.ensure_future(feed)
+
+            def feed_done(_):
+                self._feeding = False
+                self._check_idle()
+            feeder.add_done_callback(feed_done)
+        self._check_idle()
+
+        pool = [asyncio.ensure_future(self._worker()) for _ in range(max(1, workers))]
+        try:
+            await self._idle.wait()
+            if feeder is not None:
+                feeder.result()
+        finally:
+            jobs = list(self._running.values()) + pool + ([feeder] if feeder is not None else [])
+            for job in jobs:
+                job.cancel()
+            await asyncio.gather(*jobs, return_exceptions=True)
+            self._ready = None
+        return self.errors
+
+    def group_error(self, group: Hashable) -> Optional[BaseException]:
+        """The root-cause error of a group: its first failure that was not a cancellation."""
+        errors = [self.errors[name] for name in self._groups.get(group, []) if name in self.errors]
+        for error in errors:
+            if not isinstance(error, asyncio.CancelledError):
+                return error
+        return errors[0] if errors else None
+
+    def release(self, group: Hashable) -> None:
+        """
+        Forget a group's tasks and results so long runs keep memory flat. Later tasks must
+        not depend on them; group_error() is no longer available for the group. Tasks of
+        the group that have not settled yet (those a failure left queued or running) are
+        dropped: queued ones settle now, running ones are cancelled and settle when they end.
+        """
+        for name in self._groups.pop(group, []):
+            task = self._tasks.pop(name)
+            settled = self.results.pop(name, _UNSET) is not _UNSET or self.errors.pop(name, None) is not None
+            if not settled:
+                job = self._running.get(name)
+                if job is not None:
+                    job.cancel()
+                else:
+                    self._settle(task)
+            for dependency in task.inputs:
+                if dependency in self._tasks:
+                    self._tasks[dependency].dependents.remove(task)
@@ -0,0 +1,86 @@
+import pytest
+
+import batch
+import mock_server
+from batch import BatchJob, ProviderBatchBackend, run_batch_job
+from llm_cache import ResponseCache
+
+OPTIONS = ["Mindmap"]
+SOURCES = [
+    {'filename': "app.py", 'content': "def alpha():\n    return 1\n"},
+    {'filename': "util.py", 'content': "def beta():\n    return 2\n"},
+]
+
+
+class Restart(Exception):
+    """Raised to stop a run as if the process had died."""
+
+
+class RecordingBackend(ProviderBatchBackend):
+    """Provider backend that records submissions and can die while polling."""
+
+    def __init__(self, config, die_while_polling=False):
+        super().__init__(config, poll_seconds=0.05)
+        self.die_while_polling = die_while_polling
+        self.submitted = []
+        self.polled = []
+
+    def submit(self, input_path):
+        record = super().submit(input_path)
+        self.submitted.append(record['id'])
+        return record
+
+    def wait(self, batch_record):
+        self.polled.append(batch_record['id'])
+        if self.die_while_polling:
+            raise Restart()
+        return super().wait(batch_record)
+
+
+@pytest.fixture
+def config():
+    server = mock_server.serve(port=0, batch_delay=0.2, seed=1)
+    yield {'provider': "Mock", 'base_url': f"http://127.0.0.1:{server.server_address[1]}/v1",
+           'model': "mock-model", 'api_key': "mock-key"}
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def response_cache(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(batch, "get_response_cache", lambda: cache)
+    return cache
+
+
+def test_restarted_job_resumes_polling_without_resubmitting(tmp_path, config):
+    job = BatchJob.open(SOURCES, OPTIONS, "standard", config, root=str(tmp_path))
+    first = RecordingBackend(config, die_while_polling=True)
+    with pytest.raises(Restart):
+        run_batch_job(job, first, config)
+    assert len(first.submitted) == 1
+
+    # A new process finds the batch in flight in the state file
+    resumed_job = BatchJob.open(SOURCES, OPTIONS, "standard", config, root=str(tmp_path))
+    assert resumed_job.path == job.path
+    assert resumed_job.state['batch']['id'] == first.submitted[0]
+    second = RecordingBackend(config)
+    results, errors = run_batch_job(resumed_job, second, config)
+
+    assert errors == []
+    assert second.submitted == [] and second.polled == first.submitted
+    assert [result['filename'] for result in results] == ["app.py", "util.py"]
+    for result, source in zip(results, SOURCES):
+        assert result['mindmap'] and result['content'] == source['content']
+        assert result['sdd'] is None and result['template_used'] == "standard"
+    assert resumed_job.state['batch'] is None
+
+
+def test_finished_job_replays_from_stored_responses(tmp_path, config):
+    job = BatchJob.open(SOURCES, OPTIONS, "standard", config, root=str(tmp_path))
+    first_results, _ = run_batch_job(job, RecordingBackend(config), config)
+
+    rerun = RecordingBackend(config)
+    results, errors = run_batch_job(BatchJob.open(SOURCES, OPTIONS, "standard", config, root=str(tmp_path)),
+                                    rerun, config)
+    assert errors == [] and results == first_results
+    assert rerun.submitted == [] and rerun.polled == []
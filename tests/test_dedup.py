@@ -0,0 +1,60 @@
+from dedup import find_duplicates, similarity, sketch
+
+
+def _module(functions=40, changed=None):
+    lines = ["import os", ""]
+    for i in range(functions):
+        body = f"value * {i} + 7" if i != changed else "value - 1"
+        lines += [f"def helper_{i}(value):", f"    result = {body}", "    return result", ""]
+    return "\n".join(lines)
+
+
+def test_layout_outside_strings_is_an_exact_duplicate():
+    duplicates = find_duplicates(["a.js", "b.js"], ['x = f(1,2);\nlog("a  b");', 'x=f( 1, 2 );  log("a  b");'])
+    assert list(duplicates) == [1]
+    assert duplicates[1].sibling == 0 and duplicates[1].exact
+
+
+def test_whitespace_inside_string_literals_is_not_an_exact_duplicate():
+    texts = ['print("a  b")', 'print("a b")', "print('a  b')", "print('a b')", "x = `a  b`", "x = `a b`"]
+    assert find_duplicates([f"f{i}.js" for i in range(len(texts))], texts) == {}
+
+
+def test_python_indentation_is_part_of_the_fingerprint():
+    nested = "if ready:\n    start()\n    stop()\n"
+    dedented = "if ready:\n    start()\nstop()\n"
+    assert find_duplicates(["a.py", "b.py"], [nested, dedented]) == {}
+    # Outside Python, the same change is only layout
+    assert list(find_duplicates(["a.rb", "b.rb"], [nested, dedented])) == [1]
+
+
+def test_python_docstring_whitespace_is_compared_verbatim():
+    first = 'def f():\n    """Return  one."""\n    return 1\n'
+    second = 'def f():\n    """Return one."""\n    return 1\n'
+    assert find_duplicates(["a.py", "b.py"], [first, second]) == {}
+
+
+def test_small_change_in_a_large_file_is_a_near_duplicate_with_a_diff():
+    original, edited = _module(), _module(changed=20)
+    duplicates = find_duplicates(["a.py", "b.py"], [original, edited])
+    assert list(duplicates) == [1]
+    duplicate = duplicates[1]
+    assert not duplicate.exact and duplicate.sibling == 0
+    assert 0.8 <= duplicate.similarity < 1.0
+    assert "-    result = value * 20 + 7" in duplicate.diff
+    assert "+    result = value - 1" in duplicate.diff
+
+
+def test_unrelated_and_unreadable_files_are_not_duplicates():
+    other = "\n".join(f"class Model{i}:\n    field_{i} = Column(String({i}))\n" for i in range(60))
+    assert find_duplicates(["a.py", "b.py", "c.py", "d.py"], [_module(), other, None, "   "]) == {}
+
+
+def test_sketch_similarity_estimates_jaccard():
+    tokens = [f"t{i}" for i in range(400)]
+    full = sketch(tokens)
+    assert len(full) == 128 and full == sorted(full)
+    assert similarity(full, sketch(list(tokens))) == 1.0
+    assert similarity(full, sketch([f"u{i}" for i in range(400)])) == 0.0
+    assert 0.3 < similarity(full, sketch(tokens[:200] + [f"u{i}" for i in range(200)])) < 0.7
+    assert similarity(full, []) == 0.0
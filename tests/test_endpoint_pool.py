@@ -0,0 +1,95 @@
+import time
+import random
+import threading
+from contextlib import ExitStack
+
+import pytest
+
+from endpoint_pool import EndpointPool, endpoint_label
+
+
+def _endpoint(key, **options):
+    return {'provider': "openai", 'base_url': "https://api.example.com/v1", 'model': "gpt", 'api_key': key, **options}
+
+
+def _config(primary, *extra):
+    return {**primary, 'endpoints': list(extra)}
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.delenv("LLM_ENDPOINT_POOL", raising=False)
+    random.seed(7)
+    return EndpointPool()
+
+
+def test_capped_endpoint_is_never_leased_above_its_cap(pool):
+    config = _config(_endpoint("key-a", max_concurrency=2), _endpoint("key-b"))
+    label_a = endpoint_label(config)
+    with ExitStack() as stack:
+        keys = [stack.enter_context(pool.lease(config))['api_key'] for _ in range(30)]
+        assert pool.stats()[label_a]['in_flight'] <= 2
+    assert keys.count("key-a") <= 2 and keys.count("key-b") >= 28
+    assert pool.stats()[label_a]['in_flight'] == 0
+
+
+def test_lease_waits_while_every_endpoint_is_at_capacity(pool):
+    config = _config(_endpoint("key-a", max_concurrency=1), _endpoint("key-b", max_concurrency=1))
+    leased = []
+    with ExitStack() as stack:
+        stack.enter_context(pool.lease(config))
+        stack.enter_context(pool.lease(config))
+
+        def third():
+            with pool.lease(config) as endpoint:
+                leased.append(endpoint['api_key'])
+
+        thread = threading.Thread(target=third)
+        thread.start()
+        thread.join(0.2)
+        assert leased == []
+    thread.join(5)
+    assert len(leased) == 1
+
+
+def test_errors_shift_the_share_to_the_healthy_endpoint(pool):
+    config = _config(_endpoint("key-a"), _endpoint("key-b"))
+    chosen = []
+    for _ in range(200):
+        try:
+            with pool.lease(config) as endpoint:
+                chosen.append(endpoint['api_key'])
+                if endpoint['api_key'] == "key-b":
+                    raise ConnectionError("provider error")
+        except ConnectionError:
+            pass
+    assert chosen[100:].count("key-b") < 10
+    assert pool.stats()[endpoint_label(_endpoint("key-b"))]['error_rate'] > 0.5
+
+
+def test_slow_samples_shift_the_share_to_the_fast_endpoint(pool):
+    config = _config(_endpoint("key-a"), _endpoint("key-b"))
+    chosen = []
+    for _ in range(100):
+        with pool.lease(config) as endpoint:
+            chosen.append(endpoint['api_key'])
+            if endpoint['api_key'] == "key-b":
+                time.sleep(0.02)
+    assert "key-b" in chosen
+    assert chosen[50:].count("key-b") < 5
+
+
+def test_remove_endpoint_drops_only_the_matching_key(pool):
+    pool.add_endpoint(_endpoint("key-a"))
+    pool.add_endpoint(_endpoint("key-b", weight=2))
+    assert endpoint_label(_endpoint("key-a")) != endpoint_label(_endpoint("key-b"))
+
+    for key in ("key-a", "key-b"):
+        with pool.lease(_endpoint(key)):
+            pass
+    assert endpoint_label(_endpoint("key-a")) in pool.stats()
+
+    pool.remove_endpoint(endpoint_label(_endpoint("key-a")))
+    assert [endpoint['api_key'] for endpoint in pool.extra_endpoints()] == ["key-b"]
+    assert endpoint_label(_endpoint("key-a")) not in pool.stats()
+    assert endpoint_label(_endpoint("key-b")) in pool.stats()
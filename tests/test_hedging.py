@@ -0,0 +1,209 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import Future
+
+import httpx
+import pytest
+from openai import RateLimitError
+
+import rate_limiter
+from hedging import LatencyTracker, acall_hedged, call_hedged, get_latency_tracker
+from metrics import CallTracker
+from rate_limiter import ProviderRateLimiter, call_with_rate_limit
+
+
+def _counters(provider):
+    return get_latency_tracker().stats().get(provider, {'hedges': 0, 'hedge_wins': 0, 'failovers': 0})
+
+
+def test_primary_answering_before_threshold_sends_no_hedge():
+    calls = []
+
+    def secondary():
+        calls.append(1)
+        return "secondary"
+
+    assert call_hedged(lambda: "primary", secondary, "fast-primary", delay=1.0) == ("primary", False)
+    assert calls == []
+    assert _counters("fast-primary")['hedges'] == 0
+
+
+def test_slow_primary_is_hedged_and_the_first_response_wins():
+    release = threading.Event()
+
+    def primary():
+        release.wait(5)
+        return "primary"
+
+    try:
+        result = call_hedged(primary, lambda: "secondary", "slow-primary", delay=0.05)
+    finally:
+        release.set()
+    assert result == ("secondary", True)
+    assert _counters("slow-primary")['hedges'] == 1
+    assert _counters("slow-primary")['hedge_wins'] == 1
+
+
+def test_hard_failure_fails_over_to_secondary():
+    def primary():
+        raise ConnectionError("primary down")
+
+    for delay in (None, 1.0):
+        assert call_hedged(primary, lambda: "secondary", "failing-primary", delay) == ("secondary", True)
+    assert _counters("failing-primary")['failovers'] == 2
+    assert _counters("failing-primary")['hedges'] == 0
+
+
+@pytest.mark.parametrize("delay", [None, 1.0, 0.01])
+def test_primary_error_is_raised_when_both_fail(delay):
+    def primary():
+        threading.Event().wait(0.05)
+        raise ConnectionError("primary down")
+
+    def secondary():
+        raise TimeoutError("secondary down")
+
+    with pytest.raises(ConnectionError, match="primary down"):
+        call_hedged(primary, secondary, "both-failing", delay)
+
+
+def test_async_loser_is_cancelled():
+    cancelled = []
+
+    async def primary():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append("primary")
+            raise
+        return "primary"
+
+    async def secondary():
+        return "secondary"
+
+    result = asyncio.run(acall_hedged(primary, secondary, "async-slow-primary", delay=0.05))
+    assert result == ("secondary", True)
+    assert cancelled == ["primary"]
+    assert _counters("async-slow-primary")['hedge_wins'] == 1
+
+
+def test_async_primary_before_threshold_sends_no_hedge():
+    calls = []
+
+    async def primary():
+        return "primary"
+
+    async def secondary():
+        calls.append(1)
+        return "secondary"
+
+    assert asyncio.run(acall_hedged(primary, secondary, "async-fast-primary", delay=1.0)) == ("primary", False)
+    assert calls == []
+
+
+@pytest.mark.parametrize("delay", [None, 0.01])
+def test_async_primary_error_is_raised_when_both_fail(delay):
+    async def primary():
+        await asyncio.sleep(0.05)
+        raise ConnectionError("primary down")
+
+    async def secondary():
+        raise TimeoutError("secondary down")
+
+    with pytest.raises(ConnectionError, match="primary down"):
+        asyncio.run(acall_hedged(primary, secondary, "async-both-failing", delay))
+
+
+def test_latency_percentiles_use_the_recent_window():
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentile("p", 50) is None
+    for seconds in range(1, 201):
+        tracker.record("p", float(seconds))
+    # Only the last 100 samples (101..200) are kept
+    assert tracker.percentile("p", 50) == 150.0
+    assert tracker.percentile("p", 95) == 195.0
+    assert tracker.percentile("p", 99) == 199.0
+    assert tracker.percentile("p", 50, min_samples=101) is None
+
+    tracker.record_hedge("p", won=True)
+    tracker.record_hedge("p", won=False)
+    tracker.record_failover("p")
+    assert tracker.stats()["p"] == {'samples': 100, 'p50': 150.0, 'p95': 195.0, 'p99': 199.0,
+                                    'hedges': 2, 'hedge_wins': 1, 'failovers': 1}
+
+
+def test_queued_primary_is_not_hedged():
+    calls = []
+    dispatched = Future()
+
+    def primary():
+        # Waiting for a slot and endpoint well past the threshold, then answering quickly
+        time.sleep(0.2)
+        dispatched.set_result(None)
+        return "primary"
+
+    def secondary():
+        calls.append(1)
+        return "secondary"
+
+    assert call_hedged(primary, secondary, "queued-primary", 0.05, dispatched) == ("primary", False)
+    assert calls == []
+    assert _counters("queued-primary")['hedges'] == 0
+
+
+def test_async_queued_primary_is_not_hedged():
+    calls = []
+
+    async def run():
+        dispatched = asyncio.get_running_loop().create_future()
+
+        async def primary():
+            await asyncio.sleep(0.2)
+            dispatched.set_result(None)
+            return "primary"
+
+        async def secondary():
+            calls.append(1)
+            return "secondary"
+
+        return await acall_hedged(primary, secondary, "async-queued-primary", 0.05, dispatched)
+
+    assert asyncio.run(run()) == ("primary", False)
+    assert calls == []
+
+
+def test_dispatched_primary_is_still_hedged_after_the_threshold():
+    release = threading.Event()
+    dispatched = Future()
+
+    def primary():
+        dispatched.set_result(None)
+        release.wait(5)
+        return "primary"
+
+    try:
+        result = call_hedged(primary, lambda: "secondary", "dispatched-slow-primary", 0.05, dispatched)
+    finally:
+        release.set()
+    assert result == ("secondary", True)
+
+
+def test_latency_sample_excludes_rate_limit_retries(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "BACKOFF_BASE_SECONDS", 0.001)
+    limiter = ProviderRateLimiter("latency-test", rpm=6000, tpm=1000000)
+    call = CallTracker({'provider': "p", 'model': "m"}, "task")
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        if len(attempts) == 1:
+            httpx_request = httpx.Request("POST", "http://provider.test/v1/chat/completions")
+            response = httpx.Response(429, request=httpx_request, headers={'retry-after-ms': "200"})
+            raise RateLimitError("rate limited", response=response, body=None)
+        return "response"
+
+    assert call_with_rate_limit(call.sending(request), limiter, 10) == "response"
+    call.complete()
+    assert call.to_record()['duration'] >= 0.2
+    assert call.latency() < 0.1
@@ -0,0 +1,113 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+import ingest
+from ingest import is_analyzable, iter_project_sources
+
+PROJECT = {
+    "app/main.py": b"def main():\n    return 1\n",
+    "app/env/settings.py": b"DEBUG = False\n",
+    "README.md": b"# Project\n",
+    ".git/config.py": b"x = 1\n",
+    "node_modules/lib/index.js": b"module.exports = 1\n",
+    "lib/python3.12/site-packages/pkg/__init__.py": b"x = 1\n",
+    "image.png": b"\x89PNG",
+    "empty.py": b"",
+}
+VIRTUALENV = {
+    ".env-local/pyvenv.cfg": b"home = /usr/bin\n",
+    "env/pyvenv.cfg": b"home = /usr/bin\n",
+    "env/bin/tool.py": b"x = 1\n",
+}
+EXPECTED = ["README.md", "app/env/settings.py", "app/main.py"]
+
+
+def _names(sources):
+    return sorted(source['filename'] for source in sources)
+
+
+def _zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    buffer.name = "project.zip"
+    return buffer
+
+
+def _tar(files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.name = "project.tar.gz"
+    return buffer
+
+
+def _directory(root, files):
+    for name, data in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return root
+
+
+@pytest.mark.parametrize("build", [_zip, _tar])
+def test_archive_members_are_filtered(build):
+    sources = list(iter_project_sources(build(PROJECT)))
+    assert _names(sources) == EXPECTED
+    main = next(source for source in sources if source['filename'] == "app/main.py")
+    assert main['file'].read() == PROJECT["app/main.py"]
+    assert main['file'].name == "app/main.py"
+
+
+def test_directory_files_are_filtered(tmp_path):
+    assert _names(iter_project_sources(str(_directory(tmp_path, PROJECT)))) == EXPECTED
+
+
+def test_virtualenvs_are_recognised_by_pyvenv_cfg(tmp_path):
+    files = {**PROJECT, **VIRTUALENV}
+    assert _names(iter_project_sources(str(_directory(tmp_path, files)))) == EXPECTED
+    assert _names(iter_project_sources(_zip(files))) == EXPECTED
+
+
+def test_oversized_files_are_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_MAX_FILE_BYTES", 10)
+    files = {"small.py": b"x = 1\n", "large.py": b"x = 1\n" * 10}
+    assert _names(iter_project_sources(_zip(files))) == ["small.py"]
+    assert _names(iter_project_sources(_tar(files))) == ["small.py"]
+    assert _names(iter_project_sources(str(_directory(tmp_path, files)))) == ["small.py"]
+
+
+def test_zip_member_larger_than_its_directory_entry_is_skipped(monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_MAX_FILE_BYTES", 10)
+    archive = _zip({"liar.py": b"x = 1\n" * 10})
+    monkeypatch.setattr(ingest, "is_analyzable", lambda path, size: True)
+    assert list(iter_project_sources(archive)) == []
+
+
+def test_sources_are_produced_lazily_up_to_max_files(tmp_path):
+    files = {f"m{i}.py": b"x = 1\n" for i in range(5)}
+    sources = iter_project_sources(_tar(files), max_files=3)
+    assert next(sources)['filename'] == "m0.py"
+    assert len(list(sources)) == 2
+
+
+def test_unsupported_project_source_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported project source"):
+        iter_project_sources(str(tmp_path / "project.rar"))
+
+
+def test_is_analyzable_checks_directories_extension_and_size():
+    assert is_analyzable("src/./app.py", 10)
+    assert is_analyzable("src\\app.py", 10)
+    assert not is_analyzable("src/__pycache__/app.py", 10)
+    assert not is_analyzable("src/.hidden/app.py", 10)
+    assert not is_analyzable("src/app.exe", 10)
+    assert not is_analyzable("src/app.py", 0)
+    assert not is_analyzable("", 10)
@@ -0,0 +1,120 @@
+import os
+import asyncio
+import threading
+import contextvars
+
+import pytest
+
+import llm_cache
+from llm_cache import ResponseCache, is_cache_bypassed, make_cache_key, set_cache_bypass
+
+
+class FakeTime:
+    """Stands in for the time module so access order and expiry are deterministic."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(llm_cache, "time", fake)
+    return fake
+
+
+def _cache(tmp_path, **kwargs):
+    return ResponseCache(str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def _value():
+    # Random hex barely compresses, so every entry has about the same stored size
+    return os.urandom(500).hex()
+
+
+def test_size_cap_evicts_least_recently_used_first(tmp_path, clock):
+    cache = _cache(tmp_path, max_bytes=10 ** 9)
+    for i in range(10):
+        cache.put(f"k{i}", _value())
+        clock.advance(1)
+    entry_size = cache.stats()['size_bytes'] // 10
+
+    cache.get("k0")
+    clock.advance(1)
+    cache.max_bytes = entry_size * 5 + entry_size // 2
+    cache.put("k10", _value())
+
+    kept = [f"k{i}" for i in range(11) if cache.get(f"k{i}") is not None]
+    assert kept == ["k0", "k7", "k8", "k9", "k10"]
+    assert cache.stats()['evictions'] == 6
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = _cache(tmp_path, ttl_seconds=60)
+    cache.put("old", "response")
+    clock.advance(30)
+    cache.put("new", "response")
+    assert cache.get("old") == "response"
+
+    clock.advance(31)
+    assert cache.get("old") is None
+    assert cache.get("new") == "response"
+    clock.advance(30)
+    cache.put("newest", "response")
+    assert cache.stats()['entries'] == 1
+
+
+def test_stats_count_hits_misses_and_stores(tmp_path, clock):
+    cache = _cache(tmp_path)
+    assert cache.get("missing") is None
+    cache.put("k", "response")
+    cache.put("k", "response")
+    assert cache.get("k") == "response"
+    assert cache.get("k") == "response"
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['stores'], stats['entries']) == (2, 1, 2, 1)
+    assert stats['hit_rate'] == pytest.approx(0.667)
+    cache.clear()
+    assert cache.stats()['entries'] == 0
+
+
+def test_cache_bypass_is_isolated_per_context():
+    assert not is_cache_bypassed()
+    context = contextvars.copy_context()
+    context.run(set_cache_bypass, True)
+    assert context.run(is_cache_bypassed)
+    assert not is_cache_bypassed()
+
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(is_cache_bypassed()))
+    context.run(thread.start)
+    thread.join(5)
+    # Threads start with an empty context unless it is copied in
+    assert seen == [False]
+
+    async def session(bypass):
+        set_cache_bypass(bypass)
+        await asyncio.sleep(0)
+        return is_cache_bypassed()
+
+    async def sessions():
+        return await asyncio.gather(session(True), session(False))
+
+    assert asyncio.run(sessions()) == [True, False]
+    assert not is_cache_bypassed()
+
+
+def test_response_keys_cover_every_request_parameter():
+    key = make_cache_key("gpt", "https://api.example.com/v1/", 0.5, "prompt")
+    assert key == make_cache_key("gpt", "https://api.example.com/v1", 0.5, "prompt")
+    assert key != make_cache_key("gpt-mini", "https://api.example.com/v1", 0.5, "prompt")
+    assert key != make_cache_key("gpt", "https://api.example.com/v1", 0.3, "prompt")
+    assert key != make_cache_key("gpt", "https://api.example.com/v1", 0.5, "prompt 2")
+
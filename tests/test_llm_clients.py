@@ -0,0 +1,63 @@
+import asyncio
+
+from llm_clients import ClientRegistry
+
+ENDPOINT = ("Mock", "http://127.0.0.1:9/v1", "key")
+
+
+def test_lease_reuses_one_client_per_endpoint():
+    registry = ClientRegistry()
+    with registry.lease(*ENDPOINT) as first:
+        with registry.lease(*ENDPOINT) as second:
+            assert first is second
+            assert registry.stats()['in_use'] == 2
+    stats = registry.stats()
+    assert (stats['clients'], stats['misses'], stats['hits'], stats['in_use']) == (1, 1, 1, 0)
+
+
+def test_configure_closes_a_leased_client_only_once_it_is_returned():
+    registry = ClientRegistry()
+    with registry.lease(*ENDPOINT) as client:
+        registry.configure(max_connections=4)
+        assert not client.is_closed()
+        assert registry.stats()['retired_clients'] == 1
+        with registry.lease(*ENDPOINT) as replacement:
+            assert replacement is not client
+    assert client.is_closed()
+    assert not replacement.is_closed()
+    assert registry.stats()['retired_clients'] == 0
+
+
+def test_idle_clients_close_immediately():
+    registry = ClientRegistry()
+    with registry.lease(*ENDPOINT) as client:
+        pass
+    registry.close_all()
+    assert client.is_closed()
+
+
+def test_async_clients_of_a_loop_close_once_returned():
+    registry = ClientRegistry()
+
+    async def main():
+        async with registry.async_lease(*ENDPOINT) as client:
+            await registry.aclose_loop_clients()
+            assert not client.is_closed()
+        return client
+
+    assert asyncio.run(main()).is_closed()
+
+
+def test_async_clients_are_not_reused_by_a_later_loop():
+    registry = ClientRegistry()
+
+    async def main():
+        async with registry.async_lease(*ENDPOINT) as client:
+            # The finished loop's client is dropped, only this loop's is pooled
+            assert registry.stats()['async_clients'] == 1
+            return client
+
+    first = asyncio.run(main())
+    second = asyncio.run(main())
+    assert second is not first
+    assert (registry.stats()['misses'], registry.stats()['hits']) == (2, 0)
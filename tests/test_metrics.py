@@ -0,0 +1,176 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import metrics
+from metrics import CallTracker, Histogram, MetricsRegistry, track_call
+
+CONFIG = {'provider': "openai", 'model': "gpt"}
+
+
+class FakeTime:
+    """Stands in for the time module so call timings are exact."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(metrics, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    fresh = MetricsRegistry()
+    monkeypatch.setattr(metrics, "_metrics", fresh)
+    return fresh
+
+
+def _record(**fields):
+    record = {'provider': "openai", 'model': "gpt", 'task': "SDD", 'queue_wait': 0.0, 'time_to_first_token': None,
+              'duration': 1.0, 'prompt_tokens': None, 'completion_tokens': None, 'cached_tokens': None,
+              'finish_reason': "stop", 'error': None}
+    record.update(fields)
+    return record
+
+
+def test_quantile_interpolates_inside_the_bucket():
+    histogram = Histogram((1.0, 2.0, 4.0))
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+    # Rank 2 of 4 falls halfway through the two observations in (1, 2]
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(0.25) == pytest.approx(1.0)
+    assert histogram.quantile(1.0) == pytest.approx(4.0)
+    assert histogram.mean() == pytest.approx(1.625)
+
+
+def test_bucket_bounds_are_inclusive():
+    histogram = Histogram((1.0, 2.0))
+    histogram.observe(1.0)
+    histogram.observe(2.0)
+    assert histogram.counts == [1, 1, 0]
+
+
+def test_quantile_past_the_last_bucket_reports_its_bound():
+    histogram = Histogram((1.0, 2.0))
+    histogram.observe(0.5)
+    for _ in range(3):
+        histogram.observe(50.0)
+    assert histogram.counts == [1, 0, 3]
+    assert histogram.quantile(0.99) == 2.0
+    assert histogram.quantile(0.25) == pytest.approx(1.0)
+
+
+def test_empty_histogram_has_no_quantile():
+    assert Histogram((1.0,)).quantile(0.5) is None
+    assert Histogram((1.0,)).mean() is None
+
+
+def test_prometheus_text_has_cumulative_buckets_and_escaped_labels(registry):
+    registry.record(_record(task='say "hi"\\\nnow', duration=0.3))
+    registry.record(_record(task='say "hi"\\\nnow', duration=500.0))
+    text = registry.prometheus_text()
+
+    labels = 'provider="openai",model="gpt",task="say \\"hi\\"\\\\\\nnow"'
+    assert f"llm_requests_total{{{labels}}} 2" in text
+    assert f'llm_request_duration_seconds_bucket{{{labels},le="0.25"}} 0' in text
+    assert f'llm_request_duration_seconds_bucket{{{labels},le="0.5"}} 1' in text
+    assert f'llm_request_duration_seconds_bucket{{{labels},le="160.0"}} 1' in text
+    assert f'llm_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"llm_request_duration_seconds_sum{{{labels}}} 500.3" in text
+    assert f"llm_request_duration_seconds_count{{{labels}}} 2" in text
+    assert "# TYPE llm_request_duration_seconds histogram" in text
+    # Every sample line is a single line
+    assert all(line.startswith(("#", "llm_")) for line in text.splitlines())
+
+
+def test_call_tracker_separates_queue_wait_ttft_and_duration(clock):
+    call = CallTracker(CONFIG, "SDD")
+    clock.advance(2.0)
+    send = call.sending(lambda: "response")
+    assert send() == "response"
+    clock.advance(0.5)
+    call.first_token()
+    clock.advance(3.0)
+    call.first_token()
+    call.complete(SimpleNamespace(prompt_tokens=1200, completion_tokens=300, total_tokens=1500), "stop")
+
+    record = call.to_record()
+    assert record['queue_wait'] == pytest.approx(2.0)
+    assert record['time_to_first_token'] == pytest.approx(0.5)
+    assert record['duration'] == pytest.approx(3.5)
+    assert (record['prompt_tokens'], record['completion_tokens'], record['finish_reason']) == (1200, 300, "stop")
+
+
+def test_retries_count_toward_duration_but_not_latency(clock):
+    call = CallTracker(CONFIG, "SDD")
+    send = call.sending(lambda: None)
+    send()
+    clock.advance(4.0)
+    send()
+    clock.advance(1.0)
+    call.complete()
+    assert call.to_record()['duration'] == pytest.approx(5.0)
+    assert call.to_record()['time_to_first_token'] == pytest.approx(5.0)
+    assert call.latency() == pytest.approx(1.0)
+
+
+def test_dispatch_callback_runs_once():
+    dispatches = []
+    call = CallTracker(CONFIG, "SDD", on_dispatch=lambda: dispatches.append(1))
+    send = call.sending(lambda: None)
+    assert dispatches == []
+    send()
+    send()
+    assert dispatches == [1]
+
+
+def test_track_call_counts_errors_by_class(registry):
+    with track_call(CONFIG, "SDD") as call:
+        call.sending(lambda: None)()
+        call.complete(finish_reason="length")
+    for error in (TimeoutError("slow"), TimeoutError("slower"), ValueError("bad")):
+        with pytest.raises(type(error)):
+            with track_call(CONFIG, "SDD") as call:
+                raise error
+    text = registry.prometheus_text()
+    labels = 'provider="openai",model="gpt",task="SDD"'
+    assert f"llm_requests_total{{{labels}}} 4" in text
+    assert f'llm_errors_total{{{labels},error="TimeoutError"}} 2' in text
+    assert f'llm_errors_total{{{labels},error="ValueError"}} 1' in text
+    assert f'llm_finish_reasons_total{{{labels},finish_reason="length"}} 1' in text
+    # A call that failed before dispatch has a queue wait but no duration
+    records = [json.loads(line) for line in registry.json_lines().splitlines()]
+    assert records[-1]['duration'] is None and records[-1]['error'] == "ValueError"
+    assert registry.summary()["openai"]['errors'] == 3
+
+
+def test_cancelled_calls_are_not_recorded(registry):
+    with pytest.raises(asyncio.CancelledError):
+        with track_call(CONFIG, "SDD"):
+            raise asyncio.CancelledError()
+    assert registry.json_lines() == ""
+
+
+def test_summary_groups_by_label(registry):
+    registry.record(_record(task="SDD", duration=1.0, prompt_tokens=1000, cached_tokens=400))
+    registry.record(_record(task="Summary", duration=3.0, prompt_tokens=500))
+    by_task = registry.summary('task')
+    assert by_task["SDD"]['prompt_tokens'] == 1000 and by_task["SDD"]['cached_tokens'] == 400
+    assert by_task["Summary"]['requests'] == 1
+    assert registry.summary()["openai"]['requests'] == 2
@@ -0,0 +1,37 @@
+from mock_server import canned_content
+from utils import (
+    CODE_FACTS_TASK, MINDMAP_TASK, SDD_TASK, SUMMARY_INSTRUCTIONS, SUMMARY_TASK, _build_code_facts_prompt, _build_mindmap_prompt,
+    _build_sdd_prompt, _build_source_context, _prepare_llm_request
+)
+
+CONFIG = {'provider': "Mock", 'base_url': "http://127.0.0.1:8765/v1", 'model': "mock-model", 'api_key': "mock-key"}
+# Source whose text alone would look like a request for a mindmap, a summary or design notes
+SOURCE = '''
+def build_mindmap(summary):
+    """Render the summary as a mindmap with design notes."""
+    return summary
+'''
+
+
+def _full_prompt(prompt, task, context):
+    return _prepare_llm_request(prompt, task, 0.5, CONFIG, context)[1]
+
+
+def test_artifact_follows_the_instructions_not_the_source():
+    context = _build_source_context(SOURCE)
+    sdd = canned_content(_full_prompt(_build_sdd_prompt("standard"), SDD_TASK, context))
+    assert sdd.startswith("### 1. Overview")
+
+    facts = canned_content(_full_prompt(_build_code_facts_prompt(), CODE_FACTS_TASK, context))
+    assert facts.startswith("## Modules")
+
+    summary = canned_content(_full_prompt(SUMMARY_INSTRUCTIONS, SUMMARY_TASK, SOURCE))
+    assert not summary.startswith("#")
+
+
+def test_mindmap_and_fallback():
+    context = _build_source_context("def add(a, b):\n    return a + b\n")
+    assert canned_content(_full_prompt(_build_mindmap_prompt(), MINDMAP_TASK, context)).startswith("# Code Overview")
+    # A prompt without the shared-context layout is read whole
+    assert canned_content("Write a mindmap of this module").startswith("# Code Overview")
+    assert canned_content("Hello").startswith("# Mock response")
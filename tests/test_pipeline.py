@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+import utils
+import llm_cache
+from llm_cache import ResponseCache
+from pipeline import ConcurrencyLimits, analyze_files
+from utils import MINDMAP_TASK
+
+CONFIG = {'provider': "Mock", 'base_url': "http://127.0.0.1:8765/v1", 'model': "mock-model", 'api_key': "mock-key"}
+OPTIONS = ["SDD", "Mindmap", "Summary"]
+
+
+class FakeLLM:
+    """
+    Stands in for utils._acall_llm: holds the pipeline's provider slot like a real call,
+    recording peak concurrency, and sleeps longer for sources marked SLOW.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, prompt, task_description, temperature=0.5, config=None, on_partial=None,
+                       limits=None, context=None):
+        async with limits.slot(config['provider']):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            try:
+                await asyncio.sleep(0.1 if "SLOW" in (context or "") else 0.02)
+                if task_description == MINDMAP_TASK and "BROKEN" in (context or ""):
+                    raise ValueError("provider error")
+                return f"# {task_description}\n\n{len(context or '')}"
+            finally:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def llm(tmp_path, monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(utils, "_acall_llm", fake)
+    monkeypatch.setattr(llm_cache, "_result_store", ResponseCache(str(tmp_path / "results.sqlite3")))
+    return fake
+
+
+def _sources(*markers):
+    return [{'filename': f"f{i}.py", 'content': f"def f{i}():\n    return '{marker}'\n"}
+            for i, marker in enumerate(markers)]
+
+
+def _analyze(sources, **kwargs):
+    return analyze_files(sources, OPTIONS, "standard", config=CONFIG, cross_file_context=False,
+                         deduplicate=False, **kwargs)
+
+
+def test_per_provider_cap_holds(llm):
+    results, errors = _analyze(_sources(*"abcdef"), max_concurrency=8, per_provider_concurrency=2)
+    assert errors == [] and len(results) == 6
+    assert llm.peak == 2
+
+
+def test_results_keep_input_order(llm):
+    results, errors = _analyze(_sources("SLOW", "a", "SLOW", "b", "c"))
+    assert errors == []
+    assert [result['filename'] for result in results] == ["f0.py", "f1.py", "f2.py", "f3.py", "f4.py"]
+
+
+def test_one_file_failing_does_not_cancel_the_others(llm):
+    results, errors = _analyze(_sources("a", "BROKEN", "b"))
+    assert [filename for filename, _ in errors] == ["f1.py"]
+    assert "provider error" in errors[0][1]
+    assert [result['filename'] for result in results] == ["f0.py", "f2.py"]
+    assert all(result['sdd'] and result['mindmap'] and result['summary'] for result in results)
+
+
+def test_global_and_per_provider_caps_hold_together():
+    in_flight = {}
+    peaks = {'global': 0}
+
+    async def call(limits, provider):
+        async with limits.slot(provider):
+            in_flight[provider] = in_flight.get(provider, 0) + 1
+            peaks[provider] = max(peaks.get(provider, 0), in_flight[provider])
+            peaks['global'] = max(peaks['global'], sum(in_flight.values()))
+            await asyncio.sleep(0.01)
+            in_flight[provider] -= 1
+
+    async def run():
+        limits = ConcurrencyLimits(max_concurrency=3, per_provider=2)
+        await asyncio.gather(*(call(limits, provider) for provider in "aaaabbbbcccc"))
+
+    asyncio.run(run())
+    assert peaks.pop('global') == 3
+    assert max(peaks.values()) == 2
+
+
+def test_pooled_keys_add_provider_and_global_slots():
+    limits = ConcurrencyLimits(max_concurrency=8, per_provider=4, endpoint_counts={'openai': 3})
+    assert limits.capacity == 16
@@ -0,0 +1,112 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+from openai import APITimeoutError, RateLimitError
+
+import rate_limiter
+from rate_limiter import (
+    MIN_RATE_SCALE, RATE_DECREASE_FACTOR, RATE_INCREASE_STEP, ProviderRateLimiter, TokenBucket,
+    acall_with_rate_limit, call_with_rate_limit
+)
+
+
+def _rate_limit_error(headers=None, code=None):
+    request = httpx.Request("POST", "http://provider.test/v1/chat/completions")
+    response = httpx.Response(429, request=request, headers=headers or {})
+    body = {'code': code} if code else None
+    return RateLimitError("rate limited", response=response, body=body)
+
+
+def test_token_bucket_waits_once_the_burst_is_spent():
+    bucket = TokenBucket(60)   # One token per second, ten seconds of burst
+    now = time.monotonic()
+    assert bucket.reserve(10, now) == 0.0
+    assert bucket.reserve(1, now) == pytest.approx(1.0)
+    assert bucket.reserve(1, now + 2.0) == pytest.approx(0.0)
+
+
+def test_burst_of_429s_cuts_the_rate_once():
+    limiter = ProviderRateLimiter("test", rpm=600, tpm=100000)
+    sent_at = time.monotonic()
+    for _ in range(8):
+        limiter.on_rate_limited(None, sent_at)
+
+    stats = limiter.stats()
+    assert stats['rate_limited'] == 8
+    assert stats['rate_scale'] == pytest.approx(RATE_DECREASE_FACTOR)
+
+
+def test_429_for_a_request_sent_after_the_cut_cuts_again():
+    limiter = ProviderRateLimiter("test", rpm=600, tpm=100000)
+    limiter.on_rate_limited(None, time.monotonic())
+    limiter.on_rate_limited(None, time.monotonic())
+
+    assert limiter.stats()['rate_scale'] == pytest.approx(RATE_DECREASE_FACTOR ** 2)
+
+
+def test_rate_never_drops_below_the_minimum_and_recovers_additively():
+    limiter = ProviderRateLimiter("test", rpm=600, tpm=100000)
+    for _ in range(20):
+        limiter.on_rate_limited(None)
+    assert limiter.stats()['rate_scale'] == pytest.approx(MIN_RATE_SCALE)
+
+    limiter.on_success()
+    assert limiter.stats()['rate_scale'] == pytest.approx(MIN_RATE_SCALE + RATE_INCREASE_STEP)
+
+
+def test_retry_after_blocks_new_reservations():
+    limiter = ProviderRateLimiter("test", rpm=600, tpm=100000)
+    limiter.on_rate_limited(2.0, time.monotonic())
+    assert limiter.reserve(1) == pytest.approx(2.0, abs=0.1)
+
+
+def test_retryable_errors_are_retried(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "BACKOFF_BASE_SECONDS", 0.001)
+    limiter = ProviderRateLimiter("test", rpm=6000, tpm=1000000)
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _rate_limit_error({'retry-after-ms': "1"})
+        return "response"
+
+    assert call_with_rate_limit(request, limiter, 10) == "response"
+    assert limiter.stats()['retries'] == 2
+
+
+def test_exhausted_quota_is_not_retried():
+    limiter = ProviderRateLimiter("test", rpm=6000, tpm=1000000)
+
+    def request():
+        raise _rate_limit_error(code="insufficient_quota")
+
+    with pytest.raises(RateLimitError):
+        call_with_rate_limit(request, limiter, 10)
+    assert limiter.stats()['retries'] == 0
+
+
+def test_failed_attempts_give_back_their_token_reservation(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "BACKOFF_BASE_SECONDS", 0.001)
+    # Ten tokens per second and a 100 token burst: each attempt reserves the whole burst
+    limiter = ProviderRateLimiter("test", rpm=6000, tpm=600)
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise APITimeoutError(httpx.Request("POST", "http://provider.test/v1/chat/completions"))
+        return "response"
+
+    assert call_with_rate_limit(request, limiter, 100) == "response"
+    assert limiter.stats()['wait_seconds'] < 1.0
+
+    async def arequest():
+        return request()
+
+    attempts.clear()
+    limiter.record_usage(100, 0)
+    assert asyncio.run(acall_with_rate_limit(arequest, limiter, 100)) == "response"
+    assert limiter.stats()['wait_seconds'] < 1.0
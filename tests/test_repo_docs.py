@@ -0,0 +1,263 @@
+import json
+import asyncio
+import subprocess
+
+import pytest
+
+import utils
+import repo_docs
+from repo_docs import MANIFEST_NAME, MANIFEST_VERSION, changed_symbols, document_repository, load_manifest
+from utils import _merge_sdd_sections, affected_sdd_sections, aupdate_SDD
+
+OPTIONS = ["SDD", "Summary"]
+
+PREVIOUS_SDD = """# Design
+
+## 1. Overview
+`alpha` returns 1.
+
+## 2.1 beta
+`beta` returns 2.
+
+## 2.2 gamma
+`gamma` returns 2.
+"""
+
+
+def _git(root, *args):
+    subprocess.run(["git", "-C", str(root), *args], check=True, capture_output=True)
+
+
+def _write(root, path, content):
+    full_path = root / path
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    full_path.write_text(content)
+
+
+def _commit(root, message="change"):
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", message)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    for name in ("AUTHOR", "COMMITTER"):
+        monkeypatch.setenv(f"GIT_{name}_NAME", "Test")
+        monkeypatch.setenv(f"GIT_{name}_EMAIL", "test@example.com")
+    root = tmp_path / "repo"
+    root.mkdir()
+    _git(root, "init", "-q")
+    _write(root, "app.py", "def alpha():\n    return 1\n")
+    _write(root, "lib/util.py", "def beta():\n    return 2\n\n\ndef gamma():\n    return 2\n")
+    _write(root, "notes.bin", "not code")
+    _commit(root, "initial")
+    return root
+
+
+class StubPipeline:
+    """Stands in for pipeline.analyze_files, recording the sources of each run."""
+
+    def __init__(self):
+        self.runs = []
+        self.failing = set()
+
+    def __call__(self, sources, options, template_name, **kwargs):
+        sources = list(sources)
+        self.runs.append({source['filename']: source for source in sources})
+        results, errors = [], []
+        for source in sources:
+            if source['filename'] in self.failing:
+                errors.append((source['filename'], "provider error"))
+                continue
+            content = source['file'].read().decode()
+            results.append({
+                'filename': source['filename'],
+                'sdd': f"# SDD of {source['filename']}\n\n{content}",
+                'mindmap': None,
+                'summary': f"Summary of {source['filename']}",
+                'updated_sections': ["1. Overview"] if source.get('previous_sdd') else None
+            })
+        return results, errors
+
+    @property
+    def last(self):
+        return self.runs[-1]
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    stub = StubPipeline()
+    monkeypatch.setattr(repo_docs, "analyze_files", stub)
+    return stub
+
+
+def _document(repo, output, **kwargs):
+    return document_repository(str(repo), str(output), OPTIONS, **kwargs)
+
+
+def _manifest(output):
+    return load_manifest(str(output / MANIFEST_NAME))
+
+
+def test_first_run_documents_every_file_and_second_run_nothing(repo, tmp_path, pipeline):
+    output = tmp_path / "docs"
+    report = _document(repo, output)
+    assert sorted(report['analyzed']) == ["app.py", "lib/util.py"]
+    assert (output / "lib" / "util.py_SDD.md").exists()
+    manifest = _manifest(output)
+    assert manifest['version'] == MANIFEST_VERSION and manifest['dirty'] == []
+
+    report = _document(repo, output)
+    assert report['analyzed'] == [] and report['reused'] == ["app.py", "lib/util.py"]
+    assert pipeline.last == {}
+
+
+def test_modified_file_gets_previous_sdd_and_changed_symbols(repo, tmp_path, pipeline):
+    output = tmp_path / "docs"
+    _document(repo, output)
+    _write(repo, "lib/util.py", "def beta():\n    return 2\n\n\ndef gamma():\n    return 3\n")
+    _commit(repo)
+
+    report = _document(repo, output)
+    assert report['analyzed'] == ["lib/util.py"] and report['reused'] == ["app.py"]
+    assert report['updated'] == ["lib/util.py"]
+    source = pipeline.last["lib/util.py"]
+    assert source['previous_sdd'].startswith("# SDD of lib/util.py")
+    assert source['changed_symbols'] == ["gamma"]
+    assert "return 3" in (output / "lib" / "util.py_SDD.md").read_text()
+
+
+def test_added_file_is_documented_from_scratch(repo, tmp_path, pipeline):
+    output = tmp_path / "docs"
+    _document(repo, output)
+    _write(repo, "new.py", "def delta():\n    return 4\n")
+
+    report = _document(repo, output)
+    assert report['analyzed'] == ["new.py"]
+    assert 'previous_sdd' not in pipeline.last["new.py"]
+    # Untracked, so its documented content is not in the recorded commit yet
+    assert _manifest(output)['dirty'] == ["new.py"]
+
+
+def test_deleted_file_loses_its_outputs_and_entry(repo, tmp_path, pipeline):
+    output = tmp_path / "docs"
+    _document(repo, output)
+    _git(repo, "rm", "-q", "app.py")
+    _commit(repo)
+
+    report = _document(repo, output)
+    assert report['removed'] == ["app.py"] and report['analyzed'] == []
+    assert not (output / "app.py_SDD.md").exists()
+    assert list(_manifest(output)['files']) == ["lib/util.py"]
+
+
+def test_dirty_file_is_redocumented_until_committed(repo, tmp_path, pipeline):
+    output = tmp_path / "docs"
+    _document(repo, output)
+    _write(repo, "app.py", "def alpha():\n    return 10\n")
+
+    report = _document(repo, output)
+    assert report['analyzed'] == ["app.py"]
+    assert _manifest(output)['dirty'] == ["app.py"]
+
+    # Committing the same content: the file was dirty when documented, so it is redone once more
+    _commit(repo)
+    assert _document(repo, output)['analyzed'] == ["app.py"]
+    assert _manifest(output)['dirty'] == []
+    assert _document(repo, output)['analyzed'] == []
+
+
+@pytest.mark.parametrize("change", [
+    {'version': MANIFEST_VERSION - 1},
+    {'template': "other"},
+    {'options': ["SDD"]},
+])
+def test_unusable_manifest_documents_everything(repo, tmp_path, pipeline, change):
+    output = tmp_path / "docs"
+    _document(repo, output)
+    manifest_path = output / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text())
+    manifest.update(change)
+    manifest_path.write_text(json.dumps(manifest))
+
+    report = _document(repo, output)
+    assert sorted(report['analyzed']) == ["app.py", "lib/util.py"] and report['reused'] == []
+    assert not any('previous_sdd' in source for source in pipeline.last.values())
+
+
+def test_failed_file_keeps_its_entry_and_is_retried(repo, tmp_path, pipeline):
+    output = tmp_path / "docs"
+    _document(repo, output)
+    previous_entry = _manifest(output)['files']["app.py"]
+    _write(repo, "app.py", "def alpha():\n    return 10\n")
+    _commit(repo)
+
+    pipeline.failing.add("app.py")
+    report = _document(repo, output)
+    assert report['errors'] == [("app.py", "provider error")]
+    manifest = _manifest(output)
+    assert manifest['files']["app.py"] == previous_entry
+    assert manifest['dirty'] == ["app.py"]
+    assert (output / "app.py_SDD.md").exists()
+
+    pipeline.failing.clear()
+    assert _document(repo, output)['analyzed'] == ["app.py"]
+    assert _manifest(output)['dirty'] == []
+
+
+def test_changed_symbols_from_zero_context_hunks():
+    text = "def alpha():\n    return 1\n\n\nclass Beta:\n    def run(self):\n        return 3\n"
+    diff = (
+        "@@ -1,0 +1,2 @@\n"
+        "+def alpha():\n"
+        "+    return 1\n"
+        "@@ -6 +7 @@ class Beta:\n"
+        "-        return 2\n"
+        "+        return 3\n"
+        "@@ -9,2 +9,0 @@\n"
+        "-def removed():\n"
+        "-    pass\n"
+    )
+    assert changed_symbols(diff, text, "app.py") == ["alpha", "Beta", "run", "removed"]
+
+
+def test_affected_sections_match_whole_symbol_names():
+    assert affected_sdd_sections(PREVIOUS_SDD, ["gamma"]) == ["2.2 gamma"]
+    assert affected_sdd_sections(PREVIOUS_SDD, ["gam"]) == []
+    assert affected_sdd_sections(PREVIOUS_SDD, []) == []
+
+
+def test_merge_replaces_every_requested_section():
+    updated = "## 1. Overview\n`alpha` returns 10.\n\n## **2.2 gamma**\n`gamma` returns 3.\n"
+    merged = _merge_sdd_sections(PREVIOUS_SDD, updated, ["1. Overview", "2.2 gamma"])
+    assert "`alpha` returns 10." in merged and "`gamma` returns 3." in merged
+    assert "`beta` returns 2." in merged
+    assert "returns 1." not in merged and "`gamma` returns 2." not in merged
+
+
+@pytest.mark.parametrize("updated", [
+    "## 1. Overview\n`alpha` returns 10.\n",
+    "",
+    "The sections are already accurate.",
+])
+def test_merge_rejects_partial_and_empty_updates(updated):
+    with pytest.raises(ValueError):
+        _merge_sdd_sections(PREVIOUS_SDD, updated, ["1. Overview", "2.2 gamma"])
+
+
+def test_partial_update_regenerates_the_whole_sdd(monkeypatch):
+    async def fit(text, *args, **kwargs):
+        return text
+
+    async def call_llm(*args, **kwargs):
+        return "## 1. Overview\n`alpha` returns 10.\n"
+
+    async def get_sdd(*args, **kwargs):
+        return "# Regenerated"
+
+    monkeypatch.setattr(utils, "SDD_UPDATE_MAX_FRACTION", 1.0)
+    monkeypatch.setattr(utils, "_afit_text_to_budget", fit)
+    monkeypatch.setattr(utils, "_acall_llm", call_llm)
+    monkeypatch.setattr(utils, "aget_SDD", get_sdd)
+    sdd, headings = asyncio.run(aupdate_SDD("code", PREVIOUS_SDD, ["alpha", "gamma"]))
+    assert (sdd, headings) == ("# Regenerated", None)
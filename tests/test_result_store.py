@@ -0,0 +1,100 @@
+import pytest
+
+import utils
+import llm_cache
+from llm_cache import ResponseCache, make_artifact_key
+from pipeline import analyze_files
+from utils import SDD_TASK, artifact_store_key
+
+CONFIG = {'provider': "Mock", 'base_url': "http://127.0.0.1:8765/v1", 'model': "mock-model", 'api_key': "mock-key"}
+OPTIONS = ["SDD", "Mindmap", "Summary"]
+
+
+class FakeLLM:
+    """Stands in for utils._acall_llm, counting calls by task and failing the tasks in failing."""
+
+    def __init__(self):
+        self.tasks = []
+        self.failing = set()
+
+    async def __call__(self, prompt, task_description, temperature=0.5, config=None, on_partial=None,
+                       limits=None, context=None):
+        self.tasks.append(task_description)
+        if task_description in self.failing:
+            raise ValueError("provider error")
+        return f"# {task_description}\n\n{hash((prompt, context)) & 0xffff}"
+
+
+@pytest.fixture
+def llm(tmp_path, monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(utils, "_acall_llm", fake)
+    monkeypatch.setattr(llm_cache, "_result_store", ResponseCache(str(tmp_path / "results.sqlite3")))
+    return fake
+
+
+def _run(*sources):
+    results, errors = analyze_files([{'filename': name, 'content': content} for name, content in sources],
+                                    OPTIONS, "standard", config=CONFIG, cross_file_context=False, deduplicate=False)
+    assert errors == []
+    return {result['filename']: result for result in results}
+
+
+def test_unchanged_files_are_served_without_any_call(llm):
+    first = _run(("a.py", "def alpha():\n    return 1\n"), ("b.py", "def beta():\n    return 2\n"))
+    assert all(sorted(result['regenerated']) == sorted(OPTIONS) for result in first.values())
+    calls = len(llm.tasks)
+    assert calls >= 6
+
+    second = _run(("a.py", "def alpha():\n    return 1\n"), ("b.py", "def beta():\n    return 2\n"))
+    assert len(llm.tasks) == calls
+    for name, result in second.items():
+        assert sorted(result['reused']) == sorted(OPTIONS) and result['regenerated'] == []
+        assert (result['sdd'], result['mindmap'], result['summary']) == (
+            first[name]['sdd'], first[name]['mindmap'], first[name]['summary'])
+
+
+def test_changed_file_is_regenerated(llm):
+    _run(("a.py", "def alpha():\n    return 1\n"), ("b.py", "def beta():\n    return 2\n"))
+    llm.tasks.clear()
+
+    results = _run(("a.py", "def alpha():\n    return 1\n"), ("b.py", "def beta():\n    return 3\n"))
+    assert sorted(results["a.py"]['reused']) == sorted(OPTIONS)
+    assert sorted(results["b.py"]['regenerated']) == sorted(OPTIONS)
+    assert llm.tasks.count(SDD_TASK) == 1
+
+
+def test_fallback_result_is_not_stored(llm):
+    llm.failing.add(SDD_TASK)
+    first = _run(("a.py", "def alpha():\n    return 1\n"))["a.py"]
+    assert first['fallbacks'] == ["SDD"]
+    assert first['sdd']
+
+    llm.failing.clear()
+    llm.tasks.clear()
+    second = _run(("a.py", "def alpha():\n    return 1\n"))["a.py"]
+    assert second['fallbacks'] == []
+    assert "SDD" in second['regenerated'] and "Mindmap" in second['reused']
+    assert llm.tasks.count(SDD_TASK) == 1
+    # Stored this time
+    llm.tasks.clear()
+    assert sorted(_run(("a.py", "def alpha():\n    return 1\n"))["a.py"]['reused']) == sorted(OPTIONS)
+    assert llm.tasks == []
+
+
+def test_artifact_keys_change_with_template_model_and_prompt_version(monkeypatch):
+    key = artifact_store_key("code", "SDD", "standard", CONFIG)
+    assert key == artifact_store_key("code", "SDD", "standard", dict(CONFIG))
+    assert key != artifact_store_key("code 2", "SDD", "standard", CONFIG)
+    assert key != artifact_store_key("code", "SDD", "microservices", CONFIG)
+    assert key != artifact_store_key("code", "SDD", "standard", {**CONFIG, 'model': "gpt-mini"})
+    # Only the SDD depends on the template
+    mindmap_key = artifact_store_key("code", "Mindmap", "standard", CONFIG)
+    assert mindmap_key == artifact_store_key("code", "Mindmap", "microservices", CONFIG)
+    assert mindmap_key != key
+
+    monkeypatch.setattr(utils, "ARTIFACT_PIPELINE_VERSION", "test")
+    assert key != artifact_store_key("code", "SDD", "standard", CONFIG)
+    assert mindmap_key != artifact_store_key("code", "Mindmap", "standard", CONFIG)
+    assert (make_artifact_key("code", "SDD", "standard", "gpt", "", "v1")
+            != make_artifact_key("code", "SDD", "standard", "gpt", "", "v2"))
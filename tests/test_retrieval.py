@@ -0,0 +1,46 @@
+from retrieval import CHUNK_SEPARATOR, BM25Index, ChunkRetriever, section_query, tokenize
+
+
+def _source(functions):
+    return "import os\nimport json\n\n\n" + "\n\n".join(
+        f"def {name}(value):\n    " + "\n    ".join(f"step_{i} = {body}" for i in range(8)) + "\n    return value"
+        for name, body in functions
+    ) + "\n"
+
+
+def test_tokenize_splits_identifiers_and_drops_stopwords():
+    assert tokenize("get_user_id getUserId HTTPServer self.x2") == ["get", "user", "id", "get", "user", "id",
+                                                                   "http", "server", "x2"]
+
+
+def test_bm25_ranks_documents_with_rare_matching_terms_first():
+    index = BM25Index(["parse the config file", "open a socket", "parse config parse config"])
+    ranked = [i for i, _ in index.search("config")]
+    assert ranked == [2, 0]
+    assert index.search("database") == []
+
+
+def test_section_query_adds_section_keywords():
+    query = section_query(["Exception Handling"])
+    assert query.startswith("Exception Handling")
+    assert "raise" in query and "retry" in query
+
+
+def test_select_returns_matching_chunks_in_source_order_within_budget():
+    source = _source([("load_config", "os.environ.get('X')")] + [(f"helper_{i}", "value + 1") for i in range(10)]
+                     + [("raise_error", "ValueError('bad')")])
+    retriever = ChunkRetriever(source, chunk_chars=300)
+    assert len(retriever.chunks) > 4
+
+    selected = retriever.select("configuration environ", 700, top_k=2)
+    assert len(selected) <= 700
+    assert selected.startswith("import os")       # The first chunk is always kept
+    assert "load_config" in selected
+    assert "raise_error" not in selected
+
+    parts = selected.split(CHUNK_SEPARATOR)
+    assert parts == sorted(parts, key=source.index)
+
+
+def test_select_on_an_empty_source_selects_nothing():
+    assert ChunkRetriever("").select("error", 1000) == ""
@@ -0,0 +1,104 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _follow(flight, key, request_fn, results):
+    """Join key from a thread once the leader is in flight; returns the thread."""
+    thread = threading.Thread(target=lambda: results.append(flight.do(key, request_fn)))
+    thread.start()
+    return thread
+
+
+def test_concurrent_callers_share_one_request():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def request():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "response"
+
+    results = []
+    leader = _follow(flight, "k", request, results)
+    started.wait(5)
+    followers = [_follow(flight, "k", request, results) for _ in range(3)]
+    _wait_for(lambda: flight.stats()['coalesced'] == 3)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert results == ["response"] * 4
+    assert len(calls) == 1
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_request_errors_reach_followers():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def request():
+        started.set()
+        release.wait(5)
+        raise ValueError("provider error")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("k", request)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    _wait_for(lambda: flight.stats()['coalesced'] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == ["provider error"] * 2
+
+
+def test_cancelled_leader_hands_the_flight_to_a_follower():
+    flight = SingleFlight()
+
+    async def main():
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        async def fast():
+            return "follower's response"
+
+        leader = asyncio.ensure_future(flight.ado("k", slow))
+        await started.wait()
+        follower = asyncio.ensure_future(flight.ado("k", fast))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.wait_for(follower, 5)
+
+    assert asyncio.run(main()) == "follower's response"
+    stats = flight.stats()
+    assert stats['abandoned'] == 1
+    assert stats['leaders'] == 2
+    assert stats['in_flight'] == 0
@@ -0,0 +1,80 @@
+import pytest
+
+from skeleton import SKELETON_MIN_CHARS, build_skeleton, uses_skeleton
+
+BODY = "".join(f"        total += compute_{i}(item)\n" for i in range(30))
+PYTHON_SOURCE = '''"""Module doc."""
+import os
+
+
+class Store(Base):
+    """Keeps records.
+
+    In detail.
+    """
+    LIMIT = 10
+
+    def save(self, item):
+        if not item:
+            raise ValueError("empty")
+''' + BODY + '''        return total
+'''
+JS_FUNCTIONS = "".join(
+    f"function handler{i}(event) {{\n  const value = event.detail / {i + 1};\n  return dispatch{i}(value);\n}}\n"
+    for i in range(20)
+)
+
+
+def test_python_bodies_collapse_to_their_calls():
+    skeleton = build_skeleton(PYTHON_SOURCE, "store.py", "detailed")
+    assert skeleton.startswith("# Code skeleton of store.py")
+    assert "class Store(Base):" in skeleton
+    assert "    def save(self, item):" in skeleton
+    assert "compute_0" in skeleton and "# raises: ValueError" in skeleton
+    assert "total +=" not in skeleton
+
+
+def test_fidelity_controls_docstrings_and_calls():
+    detailed = build_skeleton(PYTHON_SOURCE, "store.py", "detailed")
+    signatures = build_skeleton(PYTHON_SOURCE, "store.py", "signatures")
+    outline = build_skeleton(PYTHON_SOURCE, "store.py", "outline")
+    assert "In detail." in detailed and "In detail." not in signatures
+    assert '"""Keeps records."""' in signatures
+    assert "compute_0" not in outline and "def save(self, item):" in outline
+
+
+def test_unparsable_python_keeps_definitions():
+    source = "import os\n\ndef broken(:\n" + "    pass\n" * 200
+    skeleton = build_skeleton(source, "broken.py", "detailed")
+    assert "def broken(:" in skeleton and "import os" in skeleton
+
+
+def test_full_fidelity_and_unknown_types_are_unchanged():
+    assert build_skeleton(PYTHON_SOURCE, "store.py", "full") is PYTHON_SOURCE
+    assert build_skeleton(PYTHON_SOURCE, "store.rb", "detailed") is PYTHON_SOURCE
+    with pytest.raises(ValueError):
+        build_skeleton(PYTHON_SOURCE, "store.py", "tiny")
+
+
+def test_uses_skeleton_only_for_large_sources():
+    assert not uses_skeleton("x" * (SKELETON_MIN_CHARS - 1))
+    assert uses_skeleton("x" * SKELETON_MIN_CHARS)
+    assert not uses_skeleton("x" * SKELETON_MIN_CHARS, "full")
+
+
+def test_braced_bodies_collapse_and_divisions_are_kept_apart():
+    skeleton = build_skeleton(JS_FUNCTIONS, "handlers.js", "detailed")
+    assert "function handler0(event) { /* calls: dispatch0 */ }" in skeleton
+    assert "function handler19(event) { /* calls: dispatch19 */ }" in skeleton
+
+
+def test_braces_in_regex_literals_do_not_open_bodies():
+    source = 'const OPEN = /[{]/g;\nconst CLOSE = /}/;\n' + JS_FUNCTIONS
+    skeleton = build_skeleton(source, "handlers.js", "detailed")
+    assert "const OPEN = /[{]/g;" in skeleton
+    assert "function handler19(event) { /* calls: dispatch19 */ }" in skeleton
+
+
+def test_unbalanced_braces_keep_the_source():
+    source = "function f() {\n#if X\n  if (a) {\n#endif\n}\n" + JS_FUNCTIONS
+    assert build_skeleton(source, "handlers.js", "detailed") is source
@@ -0,0 +1,75 @@
+import pytest
+
+from utils import StreamingResponseCleaner, clean_llm_response, clean_markdown_wrappers
+
+UNWRAPPED = [
+    "Here's the SDD for your code:\n\n# Title\n\nBody text\n",
+    "# Title\nBelow is the summary of the module:\nBody text\n",
+    "# Title\n\n```python\nx = 1\n```\n\nAfter the block\n",
+    "I'll generate the mindmap:\n   \n- root\n  - child\n",
+]
+WRAPPED = [
+    "```markdown\n# Title\n\nBody text\n```\n",
+    "Here's the summary:\n```markdown\n# Title\nBody text\n```\n",
+    "```markdown\n\n# Title\n\nBody text\n\n```\n",
+]
+
+
+def _stream(chunks):
+    """Feed chunks and return (texts released after each chunk, cleaner)."""
+    cleaner = StreamingResponseCleaner()
+    return [cleaner.feed(chunk) for chunk in chunks], cleaner
+
+
+@pytest.mark.parametrize("response", UNWRAPPED + WRAPPED)
+def test_released_text_only_grows_towards_the_final_text(response):
+    released, cleaner = _stream(list(response))
+    final = cleaner.finish()
+    assert final == clean_llm_response(response)
+    for text in released:
+        assert final.startswith(text)
+    assert released[-1] == final
+
+
+@pytest.mark.parametrize("response", UNWRAPPED + WRAPPED)
+def test_every_two_chunk_split_releases_the_final_text(response):
+    for split in range(1, len(response)):
+        released, cleaner = _stream([response[:split], response[split:]])
+        final = cleaner.finish()
+        assert final.startswith(released[0]), split
+        assert released[1] == final, split
+
+
+def test_intro_spread_over_two_chunks_is_never_shown():
+    released, cleaner = _stream(["Here's the comprehensive ", "SDD:\n# Ti", "tle\n"])
+    assert released == ["", "", "# Title"]
+    assert cleaner.finish() == "# Title"
+
+
+def test_wrapper_fences_split_mid_fence_are_never_shown():
+    released, cleaner = _stream(["``", "`mark", "down\n# Title\nText\n``", "`", "\n"])
+    assert released == ["", "", "# Title\nText", "# Title\nText", "# Title\nText"]
+    assert cleaner.finish() == "# Title\nText"
+
+
+def test_bare_fence_is_released_once_content_follows_it():
+    released, cleaner = _stream(["```markdown\n# Title\n```\n", "More\n"])
+    assert released == ["# Title", "# Title\n```\nMore"]
+    assert cleaner.finish() == "```markdown\n# Title\n```\nMore"
+
+
+def test_unterminated_last_line_is_released_by_finish():
+    released, cleaner = _stream(["# Title\nBody", " text"])
+    assert released == ["# Title", "# Title"]
+    assert cleaner.finish() == "# Title\nBody text"
+    assert cleaner.text == "# Title\nBody text"
+
+
+def test_wrapper_around_code_blocks_differs_only_by_its_opening_line():
+    response = "```markdown\n# Title\n```mermaid\ngraph TD\n```\nText\n```\n"
+    released, cleaner = _stream(list(response))
+    final = cleaner.finish()
+    assert final.startswith("```markdown\n")
+    for text in released:
+        assert clean_markdown_wrappers(final).startswith(text)
+    assert released[-1] == clean_markdown_wrappers(final)
@@ -0,0 +1,112 @@
+from symbol_index import MAX_DEFINING_FILES, SymbolIndex, build_symbol_index, definitions
+
+
+def test_definitions_by_language():
+    assert definitions("def load_config(path):", "a.py") == ["load_config"]
+    assert definitions("class Parser(Base):", "a.py") == ["Parser"]
+    assert definitions("export default async function fetchUser(id) {", "a.js") == ["fetchUser"]
+    assert definitions("export const parse = (text) => text.trim();", "a.js") == ["parse"]
+    assert definitions("public static final class Cache {", "A.java") == ["Cache"]
+    assert definitions("static int count_lines(const char *text) {", "a.c") == ["count_lines"]
+    assert definitions("std::vector<int> *make_list(int n)", "a.cpp") == ["make_list"]
+
+
+def test_statements_are_not_definitions():
+    assert definitions("    return compute(x);", "a.c") == []
+    assert definitions("if (ready(x)) {", "a.c") == []
+    assert definitions("const total = items.length;", "a.js") == []
+    # C-style calls are never Python definitions
+    assert definitions("result = int compute(x)", "a.py") == []
+
+
+def test_dotted_imports_resolve_to_the_module():
+    index = SymbolIndex.build({
+        "main.py": "import app.models\n\nprint(app.models)\n",
+        "app/models.py": "x = 1\n",
+        "other/models.py": "y = 2\n",
+    })
+    assert index.dependencies["main.py"] == ["app/models.py"]
+    assert index.dependents["app/models.py"] == ["main.py"]
+
+
+def test_relative_imports_resolve_to_the_sibling():
+    index = SymbolIndex.build({
+        "app/views.py": "from .helpers import render_page\n",
+        "app/helpers.py": "def render_page(name):\n    return name\n",
+    })
+    assert index.dependencies["app/views.py"] == ["app/helpers.py"]
+    assert [d.filename for d in index.references["app/views.py"]["render_page"]] == ["app/helpers.py"]
+
+
+def test_packages_resolve_to_init_and_index_files():
+    index = SymbolIndex.build({
+        "main.py": "import storage\n",
+        "storage/__init__.py": "x = 1\n",
+        "app.js": "const lib = require('./lib');\n",
+        "lib/index.js": "module.exports = {};\n",
+    })
+    assert index.dependencies["main.py"] == ["storage/__init__.py"]
+    assert index.dependencies["app.js"] == ["lib/index.js"]
+
+
+def test_ambiguous_imports_are_not_linked():
+    index = SymbolIndex.build({
+        "main.py": "import models\n",
+        "a/models.py": "x = 1\n",
+        "b/models.py": "y = 2\n",
+    })
+    assert index.dependencies["main.py"] == []
+
+
+def test_names_defined_in_too_many_files_are_not_linked():
+    sources = {f"worker{i}.py": "def process_item(item):\n    return item\n" for i in range(MAX_DEFINING_FILES + 1)}
+    sources["jobs.py"] = "def schedule_job(job):\n    return job\n"
+    sources["main.py"] = "process_item(1)\nschedule_job(2)\n"
+    index = SymbolIndex.build(sources)
+    assert set(index.references["main.py"]) == {"schedule_job"}
+    assert index.dependencies["main.py"] == ["jobs.py"]
+
+    del sources["worker0.py"]
+    index = SymbolIndex.build(sources)
+    assert set(index.references["main.py"]) == {"process_item", "schedule_job"}
+    assert len(index.dependencies["main.py"]) == MAX_DEFINING_FILES + 1
+
+
+def test_own_and_nested_definitions_are_not_references():
+    index = SymbolIndex.build({
+        "a.py": "def parse_text(text):\n    def inner_helper():\n        pass\n    return text\n",
+        "b.py": "def parse_text(text):\n    return inner_helper(text)\n",
+    })
+    assert index.references["b.py"] == {}
+    assert "inner_helper" not in index.definitions
+
+
+def test_neighbour_context_lists_imported_files_first_within_budget():
+    sources = {
+        "main.py": "from core import run_core\n" + "".join(f"util_{i}()\n" for i in range(20)) + "run_core()\n",
+        "core.py": "def run_core():\n    pass\n",
+        "utils.py": "".join(f"def util_{i}(argument_{i}, option_{i}=None):\n    pass\n" for i in range(20)),
+    }
+    index = SymbolIndex.build(sources)
+    context = index.neighbour_context("main.py", max_chars=400)
+    assert len(context) <= 400
+    lines = context.splitlines()
+    assert lines[1] == "Depends on: core.py, utils.py"
+    assert lines.index("core.py:") < lines.index("utils.py:")
+    assert "  def run_core():" in lines
+    assert "  def util_19(argument_19, option_19=None):" not in lines
+
+    full = index.neighbour_context("main.py", max_chars=100000)
+    assert "  def util_19(argument_19, option_19=None):" in full.splitlines()
+
+
+def test_neighbour_context_is_empty_without_neighbours():
+    index = SymbolIndex.build({"a.py": "def alpha_one():\n    pass\n", "b.py": "def beta_one():\n    pass\n"})
+    assert index.neighbour_context("a.py") == ""
+    assert index.dependency_graph() == {"a.py": [], "b.py": []}
+
+
+def test_single_file_is_not_indexed():
+    assert build_symbol_index({"a.py": "x = 1\n"}) is None
+    assert build_symbol_index({"a.py": "x = 1\n", "b.py": "y = 2\n"}).stats() == {
+        'files': 2, 'symbols': 0, 'dependencies': 0}
@@ -0,0 +1,191 @@
+import asyncio
+
+from task_graph import TaskGraph
+
+
+def _run(graph, workers=2, **kwargs):
+    return asyncio.run(asyncio.wait_for(graph.run(workers=workers, **kwargs), timeout=5))
+
+
+def test_tasks_receive_their_inputs_in_declared_order():
+    graph = TaskGraph()
+
+    async def const(value):
+        return value
+
+    async def combine(*inputs):
+        return "".join(inputs)
+
+    graph.add("a", lambda: const("a"))
+    graph.add("b", lambda: const("b"))
+    graph.add("ba", combine, ["b", "a"])
+    graph.add("bab", combine, ["ba", "b"])
+    assert _run(graph) == {}
+    assert graph.results == {"a": "a", "b": "b", "ba": "ba", "bab": "bab"}
+
+
+def test_ready_tasks_start_in_priority_then_insertion_order():
+    graph = TaskGraph()
+    started = []
+
+    def record(name):
+        async def fn(*_):
+            started.append(name)
+        return fn
+
+    graph.add("root", record("root"), priority=5)
+    graph.add("low", record("low"), priority=2)
+    graph.add("first", record("first"), priority=1)
+    graph.add("second", record("second"), priority=1)
+    graph.add("child", record("child"), ["root"], priority=0)
+    _run(graph, workers=1)
+    assert started == ["first", "second", "low", "root", "child"]
+
+
+def test_independent_tasks_do_not_wait_behind_a_slow_chain():
+    graph = TaskGraph()
+    finished = []
+
+    async def slow():
+        await asyncio.sleep(0.2)
+        finished.append("slow")
+
+    async def quick(*_):
+        finished.append("quick")
+
+    graph.add("slow", slow)
+    graph.add("after_slow", quick, ["slow"])
+    graph.add("quick", quick)
+    _run(graph, workers=2)
+    assert finished == ["quick", "slow", "quick"]
+
+
+def test_failure_fails_dependents_and_cancels_its_group():
+    graph = TaskGraph()
+    cancelled = []
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def hang():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append("hang")
+            raise
+
+    async def value(*_):
+        return 1
+
+    graph.add("fail", fail, group="file")
+    graph.add("hang", hang, group="file")
+    graph.add("dependent", value, ["fail"], group="other")
+    graph.add("queued", value, group="file", priority=9)
+    graph.add("unrelated", value, group="other")
+    errors = _run(graph, workers=2)
+
+    assert isinstance(errors["fail"], ValueError)
+    assert errors["dependent"] is errors["fail"]
+    assert isinstance(errors["hang"], asyncio.CancelledError) and cancelled == ["hang"]
+    assert isinstance(errors["queued"], asyncio.CancelledError)
+    assert graph.results == {"unrelated": 1}
+    assert graph.group_error("file") is errors["fail"]
+    assert graph.group_error("other") is errors["fail"]
+    assert graph.group_error("missing") is None
+
+
+def test_add_rejects_duplicate_and_unknown_tasks():
+    graph = TaskGraph()
+
+    async def value(*_):
+        return 1
+
+    graph.add("a", value)
+    for name, inputs in (("a", ()), ("b", ["missing"])):
+        try:
+            graph.add(name, value, inputs)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"{name!r} was accepted")
+    assert "a" in graph and "b" not in graph
+
+
+def test_tasks_added_after_a_failed_input_fail_immediately():
+    graph = TaskGraph()
+
+    async def fail():
+        raise KeyError("gone")
+
+    async def value(*_):
+        return 1
+
+    graph.add("fail", fail)
+    _run(graph)
+    graph.add("late", value, ["fail"])
+    assert graph.errors["late"] is graph.errors["fail"]
+
+
+def test_feed_adds_tasks_while_the_graph_runs():
+    graph = TaskGraph()
+
+    async def value(*inputs):
+        return sum(inputs) + 1
+
+    async def feed():
+        graph.add("a", value)
+        await graph.settled("a")
+        graph.add("b", value, ["a"])
+
+    assert _run(graph, feed=feed()) == {}
+    assert graph.results == {"a": 1, "b": 2}
+
+
+def test_feed_errors_are_raised_after_its_tasks_settle():
+    graph = TaskGraph()
+
+    async def value():
+        return 1
+
+    async def feed():
+        graph.add("a", value)
+        raise RuntimeError("feed broke")
+
+    try:
+        _run(graph, feed=feed())
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("the feed error was swallowed")
+    assert graph.results == {"a": 1}
+
+
+def test_release_of_a_failed_group_with_running_tasks_does_not_end_the_run_early():
+    graph = TaskGraph()
+
+    async def fail():
+        raise ValueError("boom")
+
+    async def slow():
+        await asyncio.sleep(0.05)
+
+    async def value(*inputs):
+        return len(inputs)
+
+    graph.add("a", slow, group=1)
+    graph.add("b", fail, group=1)
+    graph.add("c", value, ["a", "b"], group=1)
+
+    async def feed():
+        await graph.settled("c")
+        assert isinstance(graph.group_error(1), ValueError)
+        graph.release(1)
+        # Let the cancelled task of group 1 end before feeding more work
+        await asyncio.sleep(0.1)
+        graph.add("d", slow, group=2)
+        graph.add("e", value, ["d"], group=2)
+
+    assert _run(graph, feed=feed()) == {}
+    assert graph.results == {"d": None, "e": 1}
+    assert "a" not in graph and graph.group_error(1) is None
@@ -0,0 +1,78 @@
+import pytest
+
+from token_budget import (CODE_DEFINITION_PATTERN, MARKDOWN_HEADING_PATTERN, SAFETY_MARGIN, TokenEstimator,
+                          chunk_text, structural_boundary)
+
+
+def _functions(count, body_lines=6):
+    return "".join(
+        f"def f{i}(x):\n" + "".join(f"    y{j} = x + {j}\n" for j in range(body_lines)) + "    return x\n\n"
+        for i in range(count)
+    )
+
+
+def test_short_and_empty_text_stay_whole():
+    assert chunk_text("one line\n", 100) == ["one line\n"]
+    assert chunk_text("", 100) == []
+    with pytest.raises(ValueError):
+        chunk_text("text", 0)
+
+
+def test_chunks_respect_the_budget_and_rejoin_to_the_text():
+    text = _functions(20)
+    chunks = chunk_text(text, 400)
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+    assert all(len(chunk) <= 400 for chunk in chunks)
+
+
+def test_chunks_start_at_definitions_where_they_fit():
+    chunks = chunk_text(_functions(20), 400)
+    assert all(chunk.startswith("def ") for chunk in chunks)
+
+
+def test_chunks_fall_back_to_blank_lines_then_any_line():
+    paragraphs = "".join(f"sentence {i} " * 5 + "\n" + f"more {i}\n\n" for i in range(30))
+    chunks = chunk_text(paragraphs, 300)
+    assert "".join(chunks) == paragraphs
+    assert all(chunk.startswith("\nsentence") for chunk in chunks[1:])
+
+    lines = "".join(f"line {i}\n" for i in range(100))
+    chunks = chunk_text(lines, 50)
+    assert "".join(chunks) == lines and all(len(chunk) <= 50 for chunk in chunks)
+
+
+def test_overlong_lines_are_split_at_whitespace():
+    line = " ".join(f"word{i}" for i in range(200))
+    chunks = chunk_text(line, 100)
+    assert "".join(chunks) == line
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert all(chunk.startswith(" ") for chunk in chunks[1:])
+
+
+def test_estimator_calibrates_towards_observed_usage():
+    estimator = TokenEstimator(default_ratio=4.0)
+    text = "x" * 1000
+    assert estimator.estimate("m", text) == 250
+    assert estimator.chars_for_tokens("m", 100) == int(100 * SAFETY_MARGIN * 4.0)
+
+    estimator.calibrate("m", "short", 100)          # Too short to calibrate from
+    estimator.calibrate("m", text, None)
+    assert estimator.stats() == {}
+
+    estimator.calibrate("m", text, 500)
+    assert estimator.chars_per_token("m") == 2.0
+    estimator.calibrate("m", text, 250)
+    assert 2.0 < estimator.chars_per_token("m") < 4.0
+    assert estimator.stats()["m"]["samples"] == 2
+    assert estimator.chars_per_token("other") == 4.0
+
+
+def test_structural_boundary_tells_markdown_from_code():
+    markdown = "# Title\n\ntext\n\n## Usage\n\nmore text\n"
+    script = "# helpers\n\ndef a():\n    pass\n\ndef b():\n    pass\n"
+    assert structural_boundary(markdown) is MARKDOWN_HEADING_PATTERN
+    assert structural_boundary(script) is CODE_DEFINITION_PATTERN
+
+    chunks = chunk_text(markdown * 20, 100, structural_boundary(markdown))
+    assert all(chunk.startswith("#") for chunk in chunks)
@@ -0,0 +1,212 @@
+# token_budget.py
+"""
+Token estimation and context-window-sized chunking.
+
+Token counts are estimated from character counts using a chars-per-token
+ratio that is calibrated per model from the prompt_tokens the provider
+reports in response.usage, and prompt usage is totalled per provider split
+into tokens served from the provider's prefix cache and uncached tokens.
+The chunker packs a whole input into pieces that
+fit a character budget, cutting at structural boundaries (blank lines,
+top-level definitions, markdown headings) where possible.
+"""
+
+import os
+import re
+import math
+import logging
+import threading
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Estimator configuration (overridable through environment variables)
+DEFAULT_CHARS_PER_TOKEN = float(os.getenv("LLM_DEFAULT_CHARS_PER_TOKEN", "3.5"))
+MIN_CHARS_PER_TOKEN = 1.0        # CJK-heavy text can approach one character per token
+MAX_CHARS_PER_TOKEN = 8.0
+CALIBRATION_WEIGHT = 0.3         # Weight of each new observation in the moving average
+MIN_CALIBRATION_CHARS = 200      # Ignore tiny prompts; fixed per-message overhead skews them
+SAFETY_MARGIN = 0.9              # Only fill this fraction of a token budget
+
+# Lines where a chunk is preferably cut: markdown headings and top-level code definitions
+MARKDOWN_HEADING_PATTERN = re.compile(r"^#{1,6}\s")
+CODE_DEFINITION_PATTERN = re.compile(
+    r"^(?:(?:async\s+)?def\s|class\s|function\s|(?:export\s+)?(?:default\s+)?"
+    r"(?:public|private|protected|static|func|fn|interface|struct|enum)\b)"
+)
+BOUNDARY_PATTERN = re.compile(f"{MARKDOWN_HEADING_PATTERN.pattern}|{CODE_DEFINITION_PATTERN.pattern}")
+
+
+class TokenEstimator:
+    """Per-model chars-per-token ratios, refined from observed prompt token usage."""
+
+    def __init__(self, default_ratio: float = DEFAULT_CHARS_PER_TOKEN):
+        self._lock = threading.Lock()
+        self._default_ratio = default_ratio
+        self._ratios = {}
+        self._samples = {}
+
+    def chars_per_token(self, model: str) -> float:
+        with self._lock:
+            return self._ratios.get(model, self._default_ratio)
+
+    def estimate(self, model: str, text: str) -> int:
+        """Estimate the number of tokens text costs for model."""
+        return math.ceil(len(text) / self.chars_per_token(model))
+
+    def chars_for_tokens(self, model: str, tokens: int) -> int:
+        """Number of characters that fit in a token budget, with a safety margin."""
+        return max(0, int(tokens * SAFETY_MARGIN * self.chars_per_token(model)))
+
+    def calibrate(self, model: str, text: str, prompt_tokens: Optional[int]) -> None:
+        """Update the model's ratio from the prompt_tokens reported for text."""
+        if not prompt_tokens or len(text) < MIN_CALIBRATION_CHARS:
+            return
+        observed = min(MAX_CHARS_PER_TOKEN, max(MIN_CHARS_PER_TOKEN, len(text) / prompt_tokens))
+        with self._lock:
+            current = self._ratios.get(model)
+            if current is None:
+                self._ratios[model] = observed
+            else:
+                self._ratios[model] = current + CALIBRATION_WEIGHT * (observed - current)
+            self._samples[model] = self._samples.get(model, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                model: {'chars_per_token': round(ratio, 3), 'samples': self._samples.get(model, 0)}
+                for model, ratio in self._ratios.items()
+            }
+
+
+def cached_prompt_tokens(usage) -> int:
+    """
+    Prompt tokens the provider served from its prefix cache. OpenAI-style APIs report them
+    in usage.prompt_tokens_details.cached_tokens, DeepSeek in usage.prompt_cache_hit_tokens.
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details else None
+    if cached is None:
+        cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    return cached or 0
+
+
+class PromptUsageTracker:
+    """Per-provider prompt token totals, split into prefix-cached and uncached tokens."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._providers = {}
+
+    def record(self, provider: str, prompt_tokens: int, cached_tokens: int) -> None:
+        with self._lock:
+            totals = self._providers.setdefault(provider, {'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0})
+            totals['calls'] += 1
+            totals['prompt_tokens'] += prompt_tokens
+            totals['cached_tokens'] += cached_tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                provider: dict(
+                    totals,
+                    uncached_tokens=totals['prompt_tokens'] - totals['cached_tokens'],
+                    cache_rate=round(totals['cached_tokens'] / totals['prompt_tokens'], 3)
+                    if totals['prompt_tokens'] else 0.0
+                )
+                for provider, totals in self._providers.items()
+            }
+
+
+# Process-wide estimator and usage totals shared by all sessions
+_estimator = TokenEstimator()
+_usage_tracker = PromptUsageTracker()
+
+
+def get_token_estimator() -> TokenEstimator:
+    """Get the shared token estimator."""
+    return _estimator
+
+
+def get_usage_tracker() -> PromptUsageTracker:
+    """Get the shared prompt usage totals."""
+    return _usage_tracker
+
+
+def structural_boundary(text: str) -> re.Pattern:
+    """
+    Pick the boundary pattern for text: markdown headings for documents, top-level
+    definitions for code. Column-0 comments in scripts also look like headings, so
+    text counts as markdown only when its headings outnumber its definitions.
+    """
+    lines = text.splitlines()
+    headings = sum(1 for line in lines if MARKDOWN_HEADING_PATTERN.match(line))
+    definitions = sum(1 for line in lines if CODE_DEFINITION_PATTERN.match(line))
+    return MARKDOWN_HEADING_PATTERN if headings > definitions else CODE_DEFINITION_PATTERN
+
+
+def _split_long_line(line: str, max_chars: int) -> List[str]:
+    """Hard-split a single line that is longer than the budget, preferring whitespace."""
+    pieces = []
+    while len(line) > max_chars:
+        cut = line.rfind(" ", max_chars // 2, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(line[:cut])
+        line = line[cut:]
+    pieces.append(line)
+    return pieces
+
+
+def chunk_text(text: str, max_chars: int, boundary: re.Pattern = BOUNDARY_PATTERN) -> List[str]:
+    """
+    Pack text into consecutive chunks of at most max_chars characters.
+
+    Chunks end at a line boundary. When a chunk overflows it is cut before the last
+    boundary-pattern line (or, failing that, the last blank line) in its second half,
+    so functions, classes and sections stay together where they fit. Joining the chunks reproduces text.
+
+    Args:
+        text: Text to split
+        max_chars: Maximum characters per chunk
+        boundary: Regex matched against lines that are good places to start a chunk
+
+    Returns:
+        List of chunks covering the whole input
+    """
+    if max_chars <= 0:
+        raise ValueError("Chunk budget must be positive")
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    lines = []
+    for line in text.splitlines(keepends=True):
+        lines.extend(_split_long_line(line, max_chars) if len(line) > max_chars else [line])
+
+    chunks = []
+    current = []
+    current_len = 0
+    # Indexes into current of the last boundary-pattern line and the last blank line
+    last_boundary = last_blank = 0
+    for line in lines:
+        while current and current_len + len(line) > max_chars:
+            # Prefer a boundary line, then a blank line, unless the chunk would end up under half the budget
+            cut = len(current)
+            for candidate in (last_boundary, last_blank):
+                if candidate > 0 and sum(len(l) for l in current[:candidate]) >= max_chars // 2:
+                    cut = candidate
+                    break
+            chunks.append("".join(current[:cut]))
+            current = current[cut:]
+            current_len = sum(len(l) for l in current)
+            last_boundary = last_blank = 0
+        if current:
+            if boundary.match(line):
+                last_boundary = len(current)
+            elif not line.strip():
+                last_blank = len(current)
+        current.append(line)
+        current_len += len(line)
+    if current:
+        chunks.append("".join(current))
+    return chunks
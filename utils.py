@@ -2,12 +2,31 @@ import os
 import tempfile
 import docx2txt
 import fitz  # PyMuPDF
-from openai import OpenAI
 from gtts import gTTS
 from typing import Union, Optional
+import time
 import logging
+import asyncio
+import hashlib
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, asynccontextmanager
 import streamlit as st
 from sdd_templates import SDD_TEMPLATES, get_template_sections, generate_sdd_outline
+from llm_clients import lease_client, async_lease_client, get_pool_stats
+from llm_cache import (
+    get_response_cache, get_result_store, make_cache_key, make_artifact_key, is_cache_bypassed
+)
+from rate_limiter import get_rate_limiter, get_rate_limiter_stats, call_with_rate_limit, acall_with_rate_limit
+from single_flight import get_single_flight
+from skeleton import SKELETON_FIDELITY, build_skeleton, uses_skeleton
+from retrieval import ChunkRetriever, section_query
+from hedging import get_latency_tracker, hedge_delay, call_hedged, acall_hedged
+from endpoint_pool import get_endpoint_pool, endpoint_label
+from metrics import get_metrics, track_call
+from token_budget import (
+    get_token_estimator, get_usage_tracker, cached_prompt_tokens, chunk_text, structural_boundary
+)
 import re
 
 # Configure logging
@@ -15,31 +34,73 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Constants
-MAX_TEXT_LENGTH = 8000  # Increased for API calls to handle larger content
 TTS_MAX_LENGTH = 500     # For text-to-speech
+SDD_PART_WORKERS = 4     # Concurrent section groups in multi-part SDD generation
+EXPECTED_COMPLETION_TOKENS = 2000  # Completion budget reserved against tokens/minute limits
+DEFAULT_CONTEXT_TOKENS = 32768     # Context window assumed when a provider does not configure one
+MAX_PROMPT_TOKENS = 16000          # Largest prompt sent in one call, even to long-context models
+COMPLETION_RESERVE_TOKENS = 4096   # Context window kept free for the response
+MIN_TEXT_TOKENS = 1000             # Smallest input budget per call, whatever the prompt overhead
+MAX_NOTES_REDUCE_DEPTH = 4         # Note-extraction levels before design notes are truncated to fit
+CHUNK_WORKERS = 4                  # Concurrent per-chunk calls in the synchronous path
+MAX_SUMMARY_REDUCE_DEPTH = 3       # Map levels before partial summaries are truncated to fit
+CODE_FACTS_MIN_CHARS = int(os.getenv("LLM_CODE_FACTS_MIN_CHARS", "6000"))  # Smaller inputs go to every artifact as-is
+SDD_SECTION_RETRIEVAL = os.getenv("LLM_SDD_SECTION_RETRIEVAL", "1") == "1"  # Oversized inputs: retrieve chunks per section group
+SDD_UPDATE_MAX_FRACTION = float(os.getenv("LLM_SDD_UPDATE_MAX_FRACTION", "0.5"))  # Rewrite the whole SDD when more of it is affected
 SUPPORTED_FILE_TYPES = ['.txt', '.js', '.py', '.pdf', '.docx', '.md', '.java', '.c', '.cpp', '.h']
 
-# API Configuration
+# API Configuration (rpm/tpm are starting rate limits; the limiter adapts from observed 429s;
+# context_tokens is the model's context window used to size input chunks; stream_usage marks
+# providers that accept stream_options so streamed calls also report token usage)
 API_CONFIGS = {
     "OpenAI": {
         "base_url": "https://api.openai.com/v1",
         "model": "gpt-4",
+        "context_tokens": 8192,
+        "rpm": 500,
+        "tpm": 30000,
+        "stream_usage": True,
     },
     "Deepseek": {
         "base_url": "https://api.deepseek.com",
         "model": "deepseek-chat",
+        "context_tokens": 65536,
+        "rpm": 300,
+        "tpm": 1000000,
+        "stream_usage": True,
     },
     "Aliyun": {
         "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1",
         "model": "deepseek-r1",
+        "context_tokens": 65536,
+        "rpm": 600,
+        "tpm": 1200000,
+        "stream_usage": True,
     },
     "volcengine": {
         "base_url": "https://ark.cn-beijing.volces.com/api/v3",
         "model": "ep- ",
+        "context_tokens": 32768,
+        "rpm": 1000,
+        "tpm": 1000000,
+        "stream_usage": True,
     },
     "siliconflow": {
         "base_url": "https://api.siliconflow.cn/v1",
         "model": "deepseek-ai/DeepSeek-V3",
+        "context_tokens": 65536,
+        "rpm": 1000,
+        "tpm": 50000,
+        "stream_usage": True,
+    },
+    "Mock": {
+        # Local stand-in started with `python mock_server.py`, for offline testing and benchmarks
+        "base_url": "http://127.0.0.1:8765/v1",
+        "model": "mock-model",
+        "context_tokens": 65536,
+        "rpm": 6000,
+        "tpm": 10000000,
+        "stream_usage": True,
     },
     "Other": {
         "base_url": "https://api.otherprovider.com/",
@@ -47,6 +108,15 @@ API_CONFIGS = {
     }
 }
 
+# Common introductory phrases to remove from LLM responses
+INTRO_PATTERNS = [
+    r"^Here's?\s+(?:the\s+)?(?:comprehensive\s+)?(?:software\s+design\s+document|sdd|mindmap|summary).*?:\s*",
+    r"^I'll\s+(?:create|generate|provide).*?:\s*",
+    r"^Based\s+on\s+the\s+provided\s+code.*?:\s*",
+    r"^Below\s+is\s+(?:the\s+)?.*?:\s*",
+    r"^The\s+following\s+is.*?:\s*",
+]
+
 def clean_markdown_wrappers(mindmap_content: str) -> str:
     """
     Remove markdown code block wrappers from mindmap content if present.
@@ -70,6 +140,12 @@ def clean_markdown_wrappers(mindmap_content: str) -> str:
 
     return content
 
+def _strip_intro(text: str) -> str:
+    """Remove introductory phrases (see INTRO_PATTERNS) from the start of any line."""
+    for pattern in INTRO_PATTERNS:
+        text = re.sub(pattern, "", text, flags=re.IGNORECASE | re.MULTILINE)
+    return text
+
 def clean_llm_response(response_text: str) -> str:
     """
     Clean LLM response by removing introductory text but preserving legitimate code blocks.
@@ -83,23 +159,8 @@ def clean_llm_response(response_text: str) -> str:
     if not response_text:
         return ""
     
-    # Common introductory phrases to remove
-    intro_patterns = [
-        r"^Here's?\s+(?:the\s+)?(?:comprehensive\s+)?(?:software\s+design\s+document|sdd|mindmap|summary).*?:\s*",
-        r"^I'll\s+(?:create|generate|provide).*?:\s*",
-        r"^Based\s+on\s+the\s+provided\s+code.*?:\s*",
-        r"^Below\s+is\s+(?:the\s+)?.*?:\s*",
-        r"^The\s+following\s+is.*?:\s*",
-    ]
-    
-    cleaned_text = response_text.strip()
-    
-    # Remove introductory patterns
-    for pattern in intro_patterns:
-        cleaned_text = re.sub(pattern, "", cleaned_text, flags=re.IGNORECASE | re.MULTILINE)
-    
-    # Remove leading/trailing whitespace and empty lines at start
-    cleaned_text = cleaned_text.strip()
+    # Remove introductory patterns, then leading/trailing whitespace and empty lines at start
+    cleaned_text = _strip_intro(response_text.strip()).strip()
     while cleaned_text.startswith('\n'):
         cleaned_text = cleaned_text[1:]
     
@@ -121,6 +182,56 @@ def clean_llm_response(response_text: str) -> str:
     
     return cleaned_text
 
+class StreamingResponseCleaner:
+    """
+    Incremental counterpart of clean_llm_response for token streams.
+    
+    Text is released one complete line at a time, cleaned exactly as clean_llm_response
+    cleans the whole response, so released text only grows by what the final response will
+    contain. While the response opened with a ```markdown wrapper, its opening line is left
+    out and a trailing bare ``` is held back, since both are stripped at the end. A wrapper
+    around further code blocks is kept by clean_llm_response; its opening line only appears
+    with finish() (and clean_markdown_wrappers removes it again for SDDs and mindmaps).
+    finish() returns the authoritative cleaned response.
+    """
+    
+    def __init__(self):
+        self._raw_parts = []
+        self._complete = ""
+        self._pending = ""
+        self.text = ""
+    
+    def feed(self, chunk: str) -> str:
+        """Add a streamed chunk and return the cleaned text released so far."""
+        self._raw_parts.append(chunk)
+        self._pending += chunk
+        if '\n' in self._pending:
+            lines, self._pending = self._pending.rsplit('\n', 1)
+            self._complete += lines + '\n'
+            self.text = self._release(self._complete)
+        return self.text
+    
+    @staticmethod
+    def _release(text: str) -> str:
+        cleaned = _strip_intro(text).strip()
+        if not cleaned.startswith('```markdown'):
+            return cleaned
+        opening_end = cleaned.find('\n')
+        if opening_end == -1:
+            return ""
+        body = cleaned[opening_end + 1:]
+        lines = body.split('\n')
+        if lines[-1].strip() == '```':
+            lines.pop()
+        released = '\n'.join(lines)
+        # With code blocks inside, the wrapper is kept and so is every fence
+        return body.strip() if '```' in released else released.strip()
+    
+    def finish(self) -> str:
+        """Return the fully cleaned response once the stream has ended."""
+        self.text = clean_llm_response(''.join(self._raw_parts))
+        return self.text
+
 def get_current_api_config():
     """
     Get current API configuration from environment variables or session state.
@@ -153,23 +264,36 @@ def get_current_api_config():
         'api_key': api_key,
         'base_url': base_url,
         'model': model,
+        'provider': provider,
+        'secondary': get_secondary_api_config(),
+        # Responses are cached under the configured model, so only keys serving it share the load
+        'endpoints': [endpoint for endpoint in get_endpoint_pool().extra_endpoints() if endpoint['model'] == model],
+        'hedge_percentile': float(os.getenv("LLM_HEDGE_PERCENTILE") or 0) or None
+    }
+
+def get_secondary_api_config() -> Optional[dict]:
+    """
+    Get the optional secondary provider used for failover and hedged requests,
+    or None when no secondary provider is configured.
+    """
+    api_key = os.getenv("SECONDARY_OPENAI_API_KEY")
+    if not api_key:
+        return None
+    provider = os.getenv("SECONDARY_API_PROVIDER", "Other")
+    default_config = API_CONFIGS.get(provider, API_CONFIGS['Other'])
+    return {
+        'api_key': api_key,
+        'base_url': os.getenv("SECONDARY_OPENAI_BASE_URL") or default_config['base_url'],
+        'model': os.getenv("SECONDARY_OPENAI_MODEL") or default_config['model'],
         'provider': provider
     }
 
-# Initialize OpenAI client with dynamic API key handling
-def get_openai_client():
-    """Get OpenAI client with current API key and configuration from user selection."""
-    config = get_current_api_config()
-    
+def _lease_openai_client(config: dict):
+    """Borrow the pooled client for the given configuration for one request."""
     if not config['api_key']:
         raise ValueError("OpenAI API key not configured. Please set your API key in the interface.")
     
-    logger.info(f"Using API provider: {config['provider']}, base_url: {config['base_url']}, model: {config['model']}")
-    
-    return OpenAI(
-        api_key=config['api_key'],
-        base_url=config['base_url']
-    )
+    return lease_client(config['provider'], config['base_url'], config['api_key'])
 
 def extract_code_from_file(uploaded_file) -> str:
     """
@@ -239,91 +363,622 @@ def extract_text_from_file(uploaded_file) -> str:
         logger.error(f"Error extracting text from {uploaded_file.name}: {str(e)}")
         raise ValueError(f"Could not extract text from file: {str(e)}")
 
-def _call_llm(prompt: str, task_description: str, temperature: float = 0.5) -> str:
-    """Helper function for LLM API calls with error handling and response cleaning."""
-    try:
-        client = get_openai_client()
-        config = get_current_api_config()
-        model_name = config['model']
-        
-        logger.info(f"Making API call to {config['provider']} with model {model_name}")
-        
-        # Don't truncate the prompt - send full content
+def _build_source_context(text: str) -> str:
+    """
+    Leading block of every prompt over an input. It is rendered identically for all calls
+    on the same input, so providers with prefix caching (DeepSeek, OpenAI) can reuse it.
+    """
+    return f"Code to analyze:\n{text}"
+
+def _prepare_llm_request(prompt: str, task_description: str, temperature: float, config: Optional[dict] = None,
+                         context: Optional[str] = None):
+    """Resolve the API configuration, full prompt and response-cache key for an LLM call."""
+    config = config or get_current_api_config()
+    
+    # Don't truncate the prompt - send full content. Shared content goes first so that calls
+    # over the same input start with a byte-identical, cacheable prefix.
+    if context is None:
         full_prompt = f"{task_description}: {prompt}"
+    else:
+        full_prompt = f"{context}\n\n{task_description}: {prompt}"
+    cache_key = make_cache_key(config['model'], config['base_url'], temperature, full_prompt)
+    return config, full_prompt, cache_key
+
+def _get_rate_limiter(config: dict):
+    """Get the shared adaptive rate limiter for an endpoint; each API key has its own limits."""
+    provider_config = API_CONFIGS.get(config['provider'], {})
+    return get_rate_limiter(endpoint_label(config), provider_config.get('rpm'), provider_config.get('tpm'))
+
+def _estimate_request_tokens(config: dict, full_prompt: str) -> int:
+    """Estimated token cost of a request plus room for the completion."""
+    return get_token_estimator().estimate(config['model'], full_prompt) + EXPECTED_COMPLETION_TOKENS
+
+def _stream_options(config: dict) -> dict:
+    """Extra arguments asking providers that support it to report usage at the end of a stream."""
+    if API_CONFIGS.get(config['provider'], {}).get('stream_usage'):
+        return {'stream_options': {'include_usage': True}}
+    return {}
+
+def _record_usage(limiter, config: dict, full_prompt: str, estimated_tokens: int, usage) -> None:
+    """
+    Feed the token usage reported by the provider back into the rate limiter and token
+    estimator, and record how many prompt tokens were served from the provider's prefix cache.
+    """
+    if usage is None:
+        return
+    limiter.record_usage(estimated_tokens, getattr(usage, 'total_tokens', None))
+    prompt_tokens = getattr(usage, 'prompt_tokens', None)
+    get_token_estimator().calibrate(config['model'], full_prompt, prompt_tokens)
+    if prompt_tokens:
+        cached_tokens = cached_prompt_tokens(usage)
+        get_usage_tracker().record(config['provider'], prompt_tokens, cached_tokens)
+        logger.info(f"Prompt tokens: {prompt_tokens} ({cached_tokens} cached, {prompt_tokens - cached_tokens} uncached)")
+
+def _send_llm(config: dict, full_prompt: str, temperature: float, task_description: str,
+              on_dispatch=None) -> str:
+    """
+    Send one non-streaming request through an endpoint leased from the pool and return the
+    cleaned response. on_dispatch is called once the request is actually sent.
+    """
+    with track_call(config, task_description, on_dispatch) as call, get_endpoint_pool().lease(config) as endpoint:
+        call.use_endpoint(endpoint)
+        model_name = endpoint['model']
+        logger.info(f"Making API call to {endpoint_label(endpoint)} with model {model_name}")
         
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[{
-                "role": "user",
-                "content": full_prompt
-            }],
-            stream=False,
-            temperature=temperature 
-            # max_tokens=2000,  # Reduced per part to ensure completion
+        limiter = _get_rate_limiter(endpoint)
+        estimated_tokens = _estimate_request_tokens(endpoint, full_prompt)
+        with _lease_openai_client(endpoint) as client:
+            response = call_with_rate_limit(
+                call.sending(lambda: client.chat.completions.create(
+                    model=model_name,
+                    messages=[{
+                        "role": "user",
+                        "content": full_prompt
+                    }],
+                    stream=False,
+                    temperature=temperature 
+                    # max_tokens=2000,  # Reduced per part to ensure completion
+                )),
+                limiter,
+                estimated_tokens
+            )
+        call.complete(response.usage, response.choices[0].finish_reason)
+        get_latency_tracker().record(endpoint['provider'], call.latency())
+        _record_usage(limiter, endpoint, full_prompt, estimated_tokens, response.usage)
+    
+    raw_response = response.choices[0].message.content.strip()
+    # Clean the response to remove introductory text
+    return clean_llm_response(raw_response)
+
+def _request_llm(config: dict, full_prompt: str, temperature: float, cache_key: str,
+                 task_description: str) -> tuple:
+    """
+    Send one non-streaming request, then cache the response. With a secondary provider
+    configured, hard failures fail over to it and slow calls are hedged against it.
+    Returns (response, True if the secondary provider served it).
+    """
+    secondary = config.get('secondary')
+    served_by_secondary = False
+    if secondary:
+        dispatched = Future()
+        cleaned_response, served_by_secondary = call_hedged(
+            lambda: _send_llm(config, full_prompt, temperature, task_description,
+                              on_dispatch=lambda: dispatched.set_result(None)),
+            lambda: _send_llm(secondary, full_prompt, temperature, task_description),
+            config['provider'],
+            hedge_delay(config['provider'], config.get('hedge_percentile')),
+            dispatched
         )
+    else:
+        cleaned_response = _send_llm(config, full_prompt, temperature, task_description)
+    
+    # The cache key names the primary's model; a secondary's response must not be reused as the primary's
+    if cleaned_response and not served_by_secondary:
+        get_response_cache().put(cache_key, cleaned_response)
+    
+    logger.info(f"LLM response length: {len(cleaned_response)} characters")
+    return cleaned_response, served_by_secondary
+
+def _call_llm(prompt: str, task_description: str, temperature: float = 0.5,
+              config: Optional[dict] = None, context: Optional[str] = None) -> str:
+    """
+    Helper function for LLM API calls with error handling and response cleaning.
+    Identical requests are served from the persistent response cache unless the
+    current session bypasses it. Identical requests already in flight in any session are
+    joined instead of sent again. Pass a config snapshot when calling from worker threads,
+    and the large shared input as context so it is sent ahead of the instructions.
+    """
+    try:
+        config, full_prompt, cache_key = _prepare_llm_request(prompt, task_description, temperature, config, context)
         
-        raw_response = response.choices[0].message.content.strip()
-        # Clean the response to remove introductory text
-        cleaned_response = clean_llm_response(raw_response)
+        if not is_cache_bypassed():
+            cached_response = get_response_cache().get(cache_key)
+            if cached_response is not None:
+                logger.info(f"Response cache hit for {task_description} ({len(cached_response)} characters)")
+                return cached_response
         
-        logger.info(f"LLM response length: {len(cleaned_response)} characters")
+        cleaned_response, served_by_secondary = get_single_flight().do(
+            cache_key, lambda: _request_llm(config, full_prompt, temperature, cache_key, task_description)
+        )
+        if served_by_secondary:
+            _note_fallback(f"{task_description} served by the secondary provider")
         return cleaned_response
     except Exception as e:
         logger.error(f"LLM API error: {str(e)}")
         raise ValueError(f"Failed to generate {task_description}: {str(e)}")
 
-def summarize_text(text: str) -> str:
-    """Generate a concise summary of the provided text."""
-    return _call_llm(text, "Summarize the following technical document")
+# Fallbacks noted by calls inside the innermost track_fallbacks block, or None outside one
+_fallbacks = contextvars.ContextVar("llm_fallbacks", default=None)
 
-def get_SDD_perSection(text: str, template_name: str = 'standard') -> str:
+@contextmanager
+def track_fallbacks():
     """
-    Generate Software Design Document from code/text using specified template.
-    Uses multi-part generation to avoid token limits and ensure complete documents.
+    Collect, in the yielded list, a description of every fallback that served a call made
+    inside the block: the secondary provider answering for the primary, or a basic SDD in
+    place of the template. Results that needed one are not what their cache keys describe,
+    so callers should not store them. Worker threads and tasks started inside the block
+    share the list through their copied context.
+    """
+    fallbacks = []
+    token = _fallbacks.set(fallbacks)
+    try:
+        yield fallbacks
+    finally:
+        _fallbacks.reset(token)
+
+def _note_fallback(description: str) -> None:
+    fallbacks = _fallbacks.get()
+    if fallbacks is not None:
+        fallbacks.append(description)
+
+@asynccontextmanager
+async def _no_limit():
+    yield
+
+async def _asend_llm(config: dict, full_prompt: str, temperature: float, task_description: str,
+                     on_partial=None, limits=None, on_dispatch=None) -> str:
+    """
+    Send one async request (streamed when on_partial is given) through a pooled endpoint and
+    return the cleaned response. on_dispatch is called once the request is actually sent.
+    """
+    if not config['api_key']:
+        raise ValueError("OpenAI API key not configured. Please set your API key in the interface.")
+    
+    slot = limits.slot(config['provider']) if limits else _no_limit()
+    with track_call(config, task_description, on_dispatch) as call:
+        async with slot, get_endpoint_pool().alease(config) as endpoint:
+            call.use_endpoint(endpoint)
+            model_name = endpoint['model']
+            limiter = _get_rate_limiter(endpoint)
+            estimated_tokens = _estimate_request_tokens(endpoint, full_prompt)
+            logger.info(f"Making async API call to {endpoint_label(endpoint)} with model {model_name}")
+            async with async_lease_client(endpoint['provider'], endpoint['base_url'], endpoint['api_key']) as client:
+                messages = [{
+                    "role": "user",
+                    "content": full_prompt
+                }]
+                if on_partial is None:
+                    response = await acall_with_rate_limit(
+                        call.sending(lambda: client.chat.completions.create(
+                            model=model_name,
+                            messages=messages,
+                            stream=False,
+                            temperature=temperature
+                        )),
+                        limiter,
+                        estimated_tokens
+                    )
+                    call.complete(response.usage, response.choices[0].finish_reason)
+                    _record_usage(limiter, endpoint, full_prompt, estimated_tokens, response.usage)
+                    cleaned_response = clean_llm_response(response.choices[0].message.content.strip())
+                else:
+                    cleaner = StreamingResponseCleaner()
+                    released = ""
+                    stream = await acall_with_rate_limit(
+                        call.sending(lambda: client.chat.completions.create(
+                            model=model_name,
+                            messages=messages,
+                            stream=True,
+                            temperature=temperature,
+                            **_stream_options(endpoint)
+                        )),
+                        limiter,
+                        estimated_tokens
+                    )
+                    async for chunk in stream:
+                        if getattr(chunk, 'usage', None):
+                            call.usage = chunk.usage
+                            _record_usage(limiter, endpoint, full_prompt, estimated_tokens, chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        call.finish_reason = chunk.choices[0].finish_reason or call.finish_reason
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            call.first_token()
+                            partial = cleaner.feed(delta)
+                            if partial != released:
+                                released = partial
+                                on_partial(partial)
+                    cleaned_response = cleaner.finish()
+                    call.complete()
+            get_latency_tracker().record(endpoint['provider'], call.latency())
+    return cleaned_response
+
+async def _arequest_llm(config: dict, full_prompt: str, temperature: float, cache_key: str,
+                        task_description: str, on_partial=None, limits=None) -> tuple:
+    """
+    Async variant of _request_llm. Streamed calls (on_partial given) fail over to the
+    secondary provider but are never hedged, so partial output comes from one provider.
+    """
+    secondary = config.get('secondary')
+    served_by_secondary = False
+    if secondary:
+        delay = None if on_partial else hedge_delay(config['provider'], config.get('hedge_percentile'))
+        dispatched = asyncio.get_running_loop().create_future()
+        cleaned_response, served_by_secondary = await acall_hedged(
+            lambda: _asend_llm(config, full_prompt, temperature, task_description, on_partial, limits,
+                               on_dispatch=lambda: dispatched.set_result(None)),
+            lambda: _asend_llm(secondary, full_prompt, temperature, task_description, on_partial, limits),
+            config['provider'],
+            delay,
+            dispatched
+        )
+    else:
+        cleaned_response = await _asend_llm(config, full_prompt, temperature, task_description, on_partial, limits)
+    
+    if cleaned_response and not served_by_secondary:
+        get_response_cache().put(cache_key, cleaned_response)
+    
+    logger.info(f"LLM response length: {len(cleaned_response)} characters")
+    return cleaned_response, served_by_secondary
+
+async def _acall_llm(prompt: str, task_description: str, temperature: float = 0.5,
+                     config: Optional[dict] = None, on_partial=None, limits=None,
+                     context: Optional[str] = None) -> str:
+    """
+    Async variant of _call_llm built on the pooled AsyncOpenAI client.
+    Identical requests already in flight in any session or event loop are joined instead of
+    sent again; a joined caller's on_partial receives only the final response.
     
     Args:
-        text: Source code or text to analyze
-        template_name: SDD template to use ('standard', 'microservices', 'web_application', 'api_service')
+        prompt: Prompt body
+        task_description: Task prefix, also used in error messages
+        temperature: Sampling temperature
+        config: API configuration snapshot (defaults to get_current_api_config())
+        on_partial: Optional callback; when given the response is streamed and the
+            callback receives the cleaned text accumulated so far
+        limits: Optional pipeline concurrency limits exposing slot(provider)
+        context: Optional large shared input, sent ahead of the instructions
     
     Returns:
-        str: Generated SDD following the specified template structure
+        str: Cleaned response, identical to what _call_llm would return
     """
     try:
-        # Get the template sections
-        sections = get_template_sections(template_name)
-        template_info = SDD_TEMPLATES.get(template_name, SDD_TEMPLATES['standard'])
+        config, full_prompt, cache_key = _prepare_llm_request(prompt, task_description, temperature, config, context)
         
-        # Split sections into logical groups to avoid token limits
-        section_groups = []
-        if template_name == 'standard':
-            section_groups = [
-                # Group 1: Overview sections
-                ["1. Overview", "1.1 Purpose", "1.2 References"],
-                # Group 2: Solution Overview 
-                ["2. Solution Overview", "2.1 Solution Feature", "2.1.1 Automation Type", "2.1.2 Technologies Involved"],
-                # Group 3: Workflow sections
-                ["2.2 Workflow", "2.2.1 Restriction", "2.2.2 Solution Diagram", "2.2.3 To-Be workflow", "2.2.4 Input and Output", "2.2.5 Data Items in Configuration File"],
-                # Group 4: Design sections
-                ["3. Design", "3.1 Module Design", "3.2 Module Detail", "3.3 Data Structure Design"],
-                # Group 5: Exception and Security
-                ["4. Exception Handling Design", "4.1 Exception Categories", "4.2 System Exception", "4.3 Business Exception", "4.4 Exception Handling Process", "5. Security Design", "5.1 System/Application Credentials", "5.2 Data Transmission"]
-            ]
-        else:
-            # For other templates, split into smaller groups
-            section_groups = [sections[i:i+5] for i in range(0, len(sections), 5)]
+        if not is_cache_bypassed():
+            cached_response = get_response_cache().get(cache_key)
+            if cached_response is not None:
+                logger.info(f"Response cache hit for {task_description} ({len(cached_response)} characters)")
+                if on_partial:
+                    on_partial(cached_response)
+                return cached_response
         
-        logger.info(f"Generating SDD in {len(section_groups)} parts to ensure completeness")
-        
-        # Generate each section group
-        sdd_parts = []
-        for i, section_group in enumerate(section_groups):
-            try:
-                logger.info(f"Generating SDD part {i+1}/{len(section_groups)}: {section_group[:2]}...")
-                
-                section_list = "\n".join([f"- {section}" for section in section_group])
-                
-                part_prompt = f"""
-                Analyze the following code and generate a comprehensive Software Design Document (SDD) section
+        cleaned_response, served_by_secondary = await get_single_flight().ado(
+            cache_key,
+            lambda: _arequest_llm(config, full_prompt, temperature, cache_key, task_description, on_partial, limits)
+        )
+        if served_by_secondary:
+            _note_fallback(f"{task_description} served by the secondary provider")
+        if on_partial:
+            on_partial(cleaned_response)
+        return cleaned_response
+    except Exception as e:
+        logger.error(f"LLM API error: {str(e)}")
+        raise ValueError(f"Failed to generate {task_description}: {str(e)}")
+
+CODE_NOTES_TASK = "Extract design notes from part of a source file"
+
+def _get_context_tokens(config: dict) -> int:
+    """Context window of the configured provider's model."""
+    return API_CONFIGS.get(config['provider'], {}).get('context_tokens', DEFAULT_CONTEXT_TOKENS)
+
+def _text_budget_chars(config: dict, prompt_template: str) -> int:
+    """Characters of input text that fit next to prompt_template in a single call."""
+    estimator = get_token_estimator()
+    available = min(MAX_PROMPT_TOKENS, _get_context_tokens(config) - COMPLETION_RESERVE_TOKENS)
+    available -= estimator.estimate(config['model'], prompt_template)
+    return estimator.chars_for_tokens(config['model'], max(available, MIN_TEXT_TOKENS))
+
+def _build_code_notes_prompt(part: int, total: int) -> str:
+    """Build the instructions that condense one chunk of an oversized input into design notes."""
+    return f"""
+    The code above is part {part} of {total} of a source file that is too large to analyze in one request.
+    
+    Instructions:
+    1. Extract concise design notes that a later step will use to document the whole file
+    2. List every class, function and method with its signature and a one-line description of what it does
+    3. Describe data structures, configuration values, external dependencies and I/O
+    4. Describe the control flow, error handling and how this part interacts with code outside it
+    5. Do not invent behavior for code that is not shown
+    6. IMPORTANT: Return ONLY the markdown notes without any introductory text
+    
+    Design notes:
+    """
+
+CODE_NOTES_MERGE_TASK = "Condense the design notes of several parts of a source file"
+
+def _build_notes_merge_prompt(part: int, total: int) -> str:
+    """Build the instructions that condense one chunk of design notes that are still too large."""
+    return f"""
+    The text above is part {part} of {total} of the design notes extracted from a source file that is too
+    large to analyze in one request; the notes themselves are still too large for one request.
+    
+    Instructions:
+    1. Condense these notes; they will be combined with the condensed notes of the other parts
+    2. Keep every class, function and method with its signature and a one-line description
+    3. Keep data structures, configuration values, external dependencies, I/O and error handling
+    4. Merge repetition and drop boilerplate, but do not drop any component the notes describe
+    5. IMPORTANT: Return ONLY the markdown notes without any introductory text
+    
+    Design notes:
+    """
+
+def _plan_code_notes(text: str, prompt_template: str, config: dict, level: int):
+    """
+    Decide whether text fits next to prompt_template in one call.
+    
+    Returns:
+        None if it fits, otherwise (the (context, prompt) requests condensing all of it into
+        design notes, their task description). Level 0 condenses the source in chunks; later
+        levels condense the combined notes of the previous level, split at their part headings.
+    """
+    budget = _text_budget_chars(config, prompt_template)
+    if len(text) <= budget:
+        return None
+    
+    if level == 0:
+        chunks = chunk_text(text, _text_budget_chars(config, _build_code_notes_prompt(1, 1)))
+        requests = [(_build_source_context(chunk), _build_code_notes_prompt(i + 1, len(chunks)))
+                    for i, chunk in enumerate(chunks)]
+        task_description = CODE_NOTES_TASK
+    else:
+        chunks = chunk_text(text, _text_budget_chars(config, _build_notes_merge_prompt(1, 1)),
+                            structural_boundary(text))
+        requests = [(chunk, _build_notes_merge_prompt(i + 1, len(chunks))) for i, chunk in enumerate(chunks)]
+        task_description = CODE_NOTES_MERGE_TASK
+    logger.info(f"Input of {len(text)} characters exceeds the {budget} character budget; "
+                f"condensing {len(chunks)} chunks into design notes (level {level + 1})")
+    return requests, task_description
+
+def _join_code_notes(notes: list) -> str:
+    """Combine per-chunk design notes into the input of the next level or the final prompt."""
+    return (
+        f"The source was too large for a single request. Below are design notes extracted from each of "
+        f"its {len(notes)} consecutive parts; treat them together as the code to analyze.\n\n"
+        + "\n\n".join(f"## Part {i+1} of {len(notes)}\n\n{note}" for i, note in enumerate(notes))
+    )
+
+def _truncate_code_notes(text: str, prompt_template: str, config: dict) -> str:
+    """Last resort once the reduce depth is exhausted: cut the design notes to the budget."""
+    budget = _text_budget_chars(config, prompt_template)
+    if len(text) > budget:
+        logger.warning(f"Design notes ({len(text)} characters) still exceed the {budget} character budget "
+                       f"after {MAX_NOTES_REDUCE_DEPTH} levels; truncating")
+        text = text[:budget]
+    return text
+
+def _map_prompts(requests: list, task_description: str, temperature: float, config: dict) -> list:
+    """
+    Run independent (context, prompt) requests concurrently on a bounded worker pool,
+    returning results in order.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(CHUNK_WORKERS, len(requests)))) as executor:
+        futures = [
+            # Copy the context so per-session settings (e.g. cache bypass) apply in workers
+            executor.submit(contextvars.copy_context().run, _call_llm,
+                            prompt, task_description, temperature, config, context)
+            for context, prompt in requests
+        ]
+        return [future.result() for future in futures]
+
+async def _amap_prompts(requests: list, task_description: str, temperature: float, config: dict,
+                        limits=None) -> list:
+    """Async variant of _map_prompts; concurrency is bounded by the pipeline limits."""
+    return await asyncio.gather(*[
+        _acall_llm(prompt, task_description, temperature=temperature, config=config, limits=limits, context=context)
+        for context, prompt in requests
+    ])
+
+def _fit_text_to_budget(text: str, prompt_template: str, config: Optional[dict] = None) -> str:
+    """
+    Return text unchanged if it fits next to prompt_template in one call. Otherwise split the
+    whole input into context-sized chunks, condense them into design notes concurrently and,
+    while the combined notes are still too large, condense the notes again, so every part of
+    a large file reaches the final prompt.
+    
+    Args:
+        text: Source code or text to analyze
+        prompt_template: Instructions of the final prompt, used to measure its overhead
+        config: API configuration snapshot (defaults to get_current_api_config())
+    """
+    config = config or get_current_api_config()
+    for level in range(MAX_NOTES_REDUCE_DEPTH):
+        plan = _plan_code_notes(text, prompt_template, config, level)
+        if plan is None:
+            return text
+        requests, task_description = plan
+        text = _join_code_notes(_map_prompts(requests, task_description, 0.2, config))
+    return _truncate_code_notes(text, prompt_template, config)
+
+async def _afit_text_to_budget(text: str, prompt_template: str, config: Optional[dict] = None, limits=None) -> str:
+    """Async variant of _fit_text_to_budget; chunks are condensed concurrently under the pipeline limits."""
+    config = config or get_current_api_config()
+    for level in range(MAX_NOTES_REDUCE_DEPTH):
+        plan = _plan_code_notes(text, prompt_template, config, level)
+        if plan is None:
+            return text
+        requests, task_description = plan
+        text = _join_code_notes(await _amap_prompts(requests, task_description, 0.2, config, limits))
+    return _truncate_code_notes(text, prompt_template, config)
+
+CODE_FACTS_TASK = "Extract structured code facts from the source file"
+CODE_FACTS_HEADER = (
+    "The source file was condensed into the structured code facts below; "
+    "treat them as the code to analyze."
+)
+
+def _build_code_facts_prompt() -> str:
+    """Build the instructions of the facts phase: one compact, structured record of the code per file."""
+    return """
+    Instructions:
+    1. Extract the facts about the code above that are needed to document it; another step will write
+       design documents, mindmaps and summaries from your output alone, without seeing the code
+    2. Use exactly these markdown headings, in this order:
+       ## Modules, ## Classes and Functions, ## Data Structures, ## Inputs and Outputs,
+       ## Errors and Exceptions, ## Configuration, ## External Dependencies, ## Control Flow
+    3. Under "Classes and Functions" list every class, function and method as `signature` - one-line purpose,
+       followed by what it calls and what it raises
+    4. Be terse: bullet points and identifiers only, no prose, no code listings
+    5. Write "None" under a heading with nothing to report; do not invent facts
+    6. IMPORTANT: Return ONLY the markdown facts without any introductory text
+    
+    Code facts:
+    """
+
+def uses_code_facts(text: str) -> bool:
+    """Whether text is large enough for the facts phase to save more prompt tokens than it costs."""
+    return len(text) >= CODE_FACTS_MIN_CHARS
+
+def _wrap_code_facts(facts: str) -> str:
+    """The facts document handed to SDD, mindmap and summary generation in place of the source."""
+    return f"{CODE_FACTS_HEADER}\n\n{clean_markdown_wrappers(facts).strip()}"
+
+async def aget_code_facts(text: str, config: Optional[dict] = None, limits=None) -> str:
+    """
+    Phase one of "extract facts once, write many": condense a source file into a structured
+    facts document (modules, functions, data structures, I/O, errors, configuration). Pass the
+    result to SDD, mindmap and summary generation instead of the source; they read far fewer
+    prompt tokens, and a template change only reruns the SDD.
+    """
+    config = config or get_current_api_config()
+    text = await _afit_text_to_budget(text, _build_code_facts_prompt(), config, limits)
+    facts = await _acall_llm(_build_code_facts_prompt(), CODE_FACTS_TASK, temperature=0.2, config=config,
+                             limits=limits, context=_build_source_context(text))
+    return _wrap_code_facts(facts)
+
+SUMMARY_TASK = "Summarize the technical document above"
+SUMMARY_PART_TASK = "Summarize one part of a larger technical document"
+SUMMARY_INSTRUCTIONS = "Return ONLY the summary without any introductory text."
+
+def _build_summary_part_prompt(part: int, total: int) -> str:
+    """Build the map-step instructions summarizing one part of a large document."""
+    return f"""
+    The text above is part {part} of {total} of a larger technical document or source file.
+    
+    Instructions:
+    1. Summarize this part concisely; it will be merged with the summaries of the other parts
+    2. Keep the names of components, classes, functions and sections it covers
+    3. Keep key behavior, decisions, inputs and outputs; drop boilerplate and repetition
+    4. IMPORTANT: Return ONLY the summary without any introductory text
+    
+    Summary of this part:
+    """
+
+def _join_partial_summaries(partials: list) -> str:
+    """Combine map-step summaries into the input of the next reduce step."""
+    return (
+        f"The document was summarized in {len(partials)} consecutive parts. "
+        f"Combine the part summaries below into one summary of the whole document.\n\n"
+        + "\n\n".join(f"## Part {i+1} of {len(partials)}\n\n{partial}" for i, partial in enumerate(partials))
+    )
+
+def _plan_summary_map(text: str, config: dict) -> Optional[list]:
+    """
+    Return None if text fits in a single summary call, otherwise the (context, prompt) requests
+    summarizing its structural chunks (markdown sections for documents, top-level definitions
+    for code) first.
+    """
+    if len(text) <= _text_budget_chars(config, SUMMARY_TASK + SUMMARY_INSTRUCTIONS):
+        return None
+    chunks = chunk_text(text, _text_budget_chars(config, _build_summary_part_prompt(1, 1)),
+                        structural_boundary(text))
+    requests = [(chunk, _build_summary_part_prompt(i + 1, len(chunks))) for i, chunk in enumerate(chunks)]
+    logger.info(f"Summarizing {len(text)} characters with map-reduce over {len(requests)} parts")
+    return requests
+
+def _truncate_summary_input(text: str, config: dict) -> str:
+    """Last resort once the reduce depth is exhausted: cut the partial summaries to the budget."""
+    budget = _text_budget_chars(config, SUMMARY_TASK + SUMMARY_INSTRUCTIONS)
+    if len(text) > budget:
+        logger.warning(f"Partial summaries ({len(text)} characters) still exceed the {budget} "
+                       f"character budget after {MAX_SUMMARY_REDUCE_DEPTH} levels; truncating")
+        text = text[:budget]
+    return text
+
+def _reduce_summary_input(text: str, config: dict) -> str:
+    """
+    Map step of map-reduce summarization: while text is too large for one summary call,
+    summarize its parts concurrently and continue with the combined partial summaries.
+    Text that already fits is returned unchanged, so small inputs take a single call.
+    """
+    for _ in range(MAX_SUMMARY_REDUCE_DEPTH):
+        requests = _plan_summary_map(text, config)
+        if requests is None:
+            return text
+        text = _join_partial_summaries(_map_prompts(requests, SUMMARY_PART_TASK, 0.5, config))
+    return _truncate_summary_input(text, config)
+
+async def _areduce_summary_input(text: str, config: dict, limits=None) -> str:
+    """Async variant of _reduce_summary_input."""
+    for _ in range(MAX_SUMMARY_REDUCE_DEPTH):
+        requests = _plan_summary_map(text, config)
+        if requests is None:
+            return text
+        text = _join_partial_summaries(await _amap_prompts(requests, SUMMARY_PART_TASK, 0.5, config, limits))
+    return _truncate_summary_input(text, config)
+
+def summarize_text(text: str) -> str:
+    """
+    Generate a concise summary of the provided text.
+    Inputs too large for one call are summarized with map-reduce.
+    """
+    config = get_current_api_config()
+    return _call_llm(SUMMARY_INSTRUCTIONS, SUMMARY_TASK, config=config,
+                     context=_reduce_summary_input(text, config))
+
+async def asummarize_text(text: str, config: Optional[dict] = None, on_partial=None, limits=None) -> str:
+    """Async variant of summarize_text."""
+    config = config or get_current_api_config()
+    text = await _areduce_summary_input(text, config, limits)
+    return await _acall_llm(SUMMARY_INSTRUCTIONS, SUMMARY_TASK, config=config, on_partial=on_partial,
+                            limits=limits, context=text)
+
+def _get_sdd_section_groups(template_name: str, sections: list) -> list:
+    """Split template sections into the groups generated by one LLM call each."""
+    if template_name == 'standard':
+        return [
+            # Group 1: Overview sections
+            ["1. Overview", "1.1 Purpose", "1.2 References"],
+            # Group 2: Solution Overview 
+            ["2. Solution Overview", "2.1 Solution Feature", "2.1.1 Automation Type", "2.1.2 Technologies Involved"],
+            # Group 3: Workflow sections
+            ["2.2 Workflow", "2.2.1 Restriction", "2.2.2 Solution Diagram", "2.2.3 To-Be workflow", "2.2.4 Input and Output", "2.2.5 Data Items in Configuration File"],
+            # Group 4: Design sections
+            ["3. Design", "3.1 Module Design", "3.2 Module Detail", "3.3 Data Structure Design"],
+            # Group 5: Exception and Security
+            ["4. Exception Handling Design", "4.1 Exception Categories", "4.2 System Exception", "4.3 Business Exception", "4.4 Exception Handling Process", "5. Security Design", "5.1 System/Application Credentials", "5.2 Data Transmission"]
+        ]
+    
+    # For other templates, split into smaller groups
+    return [sections[i:i+5] for i in range(0, len(sections), 5)]
+
+def _build_sdd_part_prompt(template_info: dict, section_group: list) -> str:
+    """Build the instructions for one section group of a multi-part SDD; the code is sent as shared context."""
+    section_list = "\n".join([f"- {section}" for section in section_group])
+    
+    return f"""
+                Analyze the code above and generate a comprehensive Software Design Document (SDD) section
                 following the {template_info['name']} template structure.
                 
                 FOCUS ONLY ON THESE SECTIONS:
@@ -343,20 +998,90 @@ def get_SDD_perSection(text: str, template_name: str = 'standard') -> str:
                 9. Each section should have substantial content (minimum 3-4 sentences per section)
                 10. For "Solution Diagram" section, describe the diagram in text format since we cannot generate images
                 
-                Code to analyze:
-                {text[:6000]}
-                
                 Generate the specified sections with detailed content:
                 """
-                
-                part_result = _call_llm(part_prompt, f"Generate SDD part {i+1}", temperature=0.3)
-                if part_result and part_result.strip():
-                    sdd_parts.append(part_result.strip())
-                    
-            except Exception as e:
-                logger.error(f"Error generating SDD part {i+1}: {str(e)}")
-                # Continue with other parts even if one fails
-                continue
+
+def _retrieve_section_contexts(text: str, template_info: dict, section_groups: list, part_prompts: list,
+                               config: dict) -> Optional[list]:
+    """
+    For input too large for one part prompt, the source context of each section group: the
+    code chunks most relevant to its sections, found with a BM25 index built once over the
+    whole input. None when the input fits (every part then shares one cacheable context) or
+    retrieval is disabled.
+    """
+    budget = _text_budget_chars(config, max(part_prompts, key=len))
+    if not SDD_SECTION_RETRIEVAL or len(text) <= budget:
+        return None
+    retriever = ChunkRetriever(text)
+    logger.info(f"Retrieving code for {len(section_groups)} SDD parts from {len(retriever.chunks)} chunks")
+    return [
+        _build_source_context(retriever.select(section_query(group, template_info['description']), budget))
+        for group in section_groups
+    ]
+
+def get_SDD_perSection(text: str, template_name: str = 'standard', max_workers: int = SDD_PART_WORKERS) -> str:
+    """
+    Generate Software Design Document from code/text using specified template.
+    Uses multi-part generation to avoid token limits and ensure complete documents.
+    Section groups are independent prompts, so they are generated concurrently on a
+    bounded worker pool and reassembled in template order. When the input does not fit
+    one prompt, each group gets the code chunks most relevant to its sections.
+    
+    Args:
+        text: Source code or text to analyze
+        template_name: SDD template to use ('standard', 'microservices', 'web_application', 'api_service')
+        max_workers: Maximum number of section groups generated at the same time
+    
+    Returns:
+        str: Generated SDD following the specified template structure
+    """
+    try:
+        # Get the template sections
+        sections = get_template_sections(template_name)
+        template_info = SDD_TEMPLATES.get(template_name, SDD_TEMPLATES['standard'])
+        
+        # Split sections into logical groups to avoid token limits
+        section_groups = _get_sdd_section_groups(template_name, sections)
+        
+        logger.info(f"Generating SDD in {len(section_groups)} parts to ensure completeness")
+        
+        # Resolve the configuration once; worker threads have no Streamlit session context
+        config = get_current_api_config()
+        
+        part_prompts = [_build_sdd_part_prompt(template_info, group) for group in section_groups]
+        contexts = _retrieve_section_contexts(text, template_info, section_groups, part_prompts, config)
+        if contexts is None:
+            # Condense oversized input once, sized for the longest part prompt
+            text = _fit_text_to_budget(text, max(part_prompts, key=len), config)
+            # Every part starts with the same code block so the provider can cache it after the first call
+            contexts = [_build_source_context(text)] * len(section_groups)
+        
+        def generate_part(i, section_group):
+            logger.info(f"Generating SDD part {i+1}/{len(section_groups)}: {section_group[:2]}...")
+            return _call_llm(part_prompts[i], f"Generate SDD part {i+1}", temperature=0.3, config=config,
+                             context=contexts[i])
+        
+        # Generate each section group concurrently, keeping results in template order
+        sdd_parts = [None] * len(section_groups)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(section_groups)))) as executor:
+            futures = {
+                # Copy the context so per-session settings (e.g. cache bypass) apply in workers
+                executor.submit(contextvars.copy_context().run, generate_part, i, section_group): i
+                for i, section_group in enumerate(section_groups)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    part_result = future.result()
+                    if part_result and part_result.strip():
+                        sdd_parts[i] = part_result.strip()
+                        
+                except Exception as e:
+                    logger.error(f"Error generating SDD part {i+1}: {str(e)}")
+                    # Continue with other parts even if one fails
+                    continue
+        
+        sdd_parts = [part for part in sdd_parts if part]
         
         if not sdd_parts:
             # Fallback to single generation if multi-part fails
@@ -380,27 +1105,21 @@ def get_SDD_perSection(text: str, template_name: str = 'standard') -> str:
         return get_SDD_single(text, template_name)
 
 
-def get_SDD(text: str, template_name: str = 'standard') -> str:
-    """
-    Generate Software Design Document from code/text using specified template.
+SDD_TASK = "Generate comprehensive SDD"
+SDD_FALLBACK_TASK = "Review the code above and generate an SDD document showing how the code works"
+SDD_FALLBACK_PROMPT = "Return ONLY the markdown content without any introductory text."
+
+def _build_sdd_prompt(template_name: str) -> str:
+    """Build the single-call SDD instructions for the given template; the code is sent as shared context."""
+    # Get the template sections
+    sections = get_template_sections(template_name)
+    template_info = SDD_TEMPLATES.get(template_name, SDD_TEMPLATES['standard'])
     
-    Args:
-        text: Source code or text to analyze
-        template_name: SDD template to use ('standard', 'microservices', 'web_application', 'api_service')
+    # Create detailed prompt with template structure
+    template_structure = "\n".join([f"- {section}" for section in sections])
     
-    Returns:
-        str: Generated SDD following the specified template structure
-    """
-    try:
-        # Get the template sections
-        sections = get_template_sections(template_name)
-        template_info = SDD_TEMPLATES.get(template_name, SDD_TEMPLATES['standard'])
-        
-        # Create detailed prompt with template structure
-        template_structure = "\n".join([f"- {section}" for section in sections])
-        
-        enhanced_prompt = f"""
-        Analyze the following code and generate a comprehensive Software Design Document (SDD) 
+    return f"""
+        Analyze the code above and generate a comprehensive Software Design Document (SDD) 
         following the {template_info['name']} template structure.
         
         Required sections to cover:
@@ -414,31 +1133,170 @@ def get_SDD(text: str, template_name: str = 'standard') -> str:
         5. Ensure the document is professional and comprehensive
         6. Format the output in proper markdown with headers, lists, and code blocks
         
-        Code to analyze:
-        {text[:MAX_TEXT_LENGTH]}
-        
         Generate a detailed SDD following the above structure:
         """
-        
-        return _call_llm(enhanced_prompt, "Generate comprehensive SDD", temperature=0.3)
+
+def get_SDD(text: str, template_name: str = 'standard') -> str:
+    """
+    Generate Software Design Document from code/text using specified template.
+    
+    Args:
+        text: Source code or text to analyze
+        template_name: SDD template to use ('standard', 'microservices', 'web_application', 'api_service')
+    
+    Returns:
+        str: Generated SDD following the specified template structure, or a basic SDD
+            without it if that fails (noted for track_fallbacks)
+    """
+    try:
+        enhanced_prompt = _build_sdd_prompt(template_name)
+        text = _fit_text_to_budget(text, enhanced_prompt)
+        return _call_llm(enhanced_prompt, SDD_TASK, temperature=0.3, context=_build_source_context(text))
         
     except Exception as e:
         logger.error(f"Error generating SDD: {str(e)}")
         # Fallback to basic SDD generation
-        return _call_llm(text, "Review below code and generate an SDD document showing how the code works")
+        _note_fallback("basic SDD without the template")
+        return _call_llm(SDD_FALLBACK_PROMPT, SDD_FALLBACK_TASK, context=_build_source_context(text))
 
-def get_SDD_single(text: str, template_name: str = 'standard') -> str:
+async def aprepare_SDD_input(text: str, template_name: str = 'standard', config: Optional[dict] = None,
+                             limits=None) -> str:
     """
-    Fallback single-generation method for SDD.
+    Condense oversized input for aget_SDD ahead of the final call, so the pipeline can
+    schedule it as its own step. aget_SDD passes text that already fits through unchanged.
     """
+    return await _afit_text_to_budget(text, _build_sdd_prompt(template_name), config, limits)
+
+async def aget_SDD(text: str, template_name: str = 'standard', config: Optional[dict] = None,
+                   on_partial=None, limits=None) -> str:
+    """Async variant of get_SDD."""
     try:
-        sections = get_template_sections(template_name)
-        template_info = SDD_TEMPLATES.get(template_name, SDD_TEMPLATES['standard'])
+        enhanced_prompt = _build_sdd_prompt(template_name)
+        text = await _afit_text_to_budget(text, enhanced_prompt, config, limits)
+        return await _acall_llm(enhanced_prompt, SDD_TASK, temperature=0.3, config=config,
+                                on_partial=on_partial, limits=limits, context=_build_source_context(text))
         
-        template_structure = "\n".join([f"- {section}" for section in sections])
-        
-        enhanced_prompt = f"""
-        Analyze the following code and generate a Software Design Document (SDD) 
+    except Exception as e:
+        logger.error(f"Error generating SDD: {str(e)}")
+        # Fallback to basic SDD generation
+        _note_fallback("basic SDD without the template")
+        return await _acall_llm(SDD_FALLBACK_PROMPT, SDD_FALLBACK_TASK, config=config,
+                                on_partial=on_partial, limits=limits, context=_build_source_context(text))
+
+SDD_UPDATE_TASK = "Update the SDD sections affected by a code change"
+MARKDOWN_HEADING_PATTERN = re.compile(r"^#{1,6}[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+
+def _normalize_heading(heading: str) -> str:
+    return re.sub(r"[*_`:]", "", heading).strip().lower()
+
+def split_markdown_sections(markdown: str) -> list:
+    """
+    Split markdown into (heading, text) pairs, one per heading of any level; text starts with
+    the heading line. Text before the first heading is returned with heading None.
+    """
+    matches = list(MARKDOWN_HEADING_PATTERN.finditer(markdown))
+    sections = []
+    if not matches or matches[0].start() > 0:
+        sections.append((None, markdown[:matches[0].start() if matches else len(markdown)]))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(markdown)
+        sections.append((match.group(1).strip(), markdown[match.start():end]))
+    return sections
+
+def affected_sdd_sections(sdd_text: str, symbols: list) -> list:
+    """Headings of the SDD sections that mention any of the given symbols."""
+    if not symbols:
+        return []
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(symbol) for symbol in symbols) + r")\b")
+    return [heading for heading, text in split_markdown_sections(sdd_text)
+            if heading is not None and pattern.search(text)]
+
+def _build_sdd_update_prompt(template_name: str, sections: list, symbols: list) -> str:
+    """Build the instructions for rewriting the given (heading, text) SDD sections; the code is sent as shared context."""
+    template_info = SDD_TEMPLATES.get(template_name, SDD_TEMPLATES['standard'])
+    section_list = "\n".join(f"- {heading}" for heading, _ in sections)
+    current_sections = "\n".join(text.strip() + "\n" for _, text in sections)
+    symbol_list = ", ".join(f"`{symbol}`" for symbol in symbols)
+    
+    return f"""
+                The code above has changed since its Software Design Document (SDD) was written,
+                following the {template_info['name']} template structure. These symbols were
+                added, modified or removed: {symbol_list}
+                
+                Rewrite the SDD sections that describe them so they match the current code.
+                
+                FOCUS ONLY ON THESE SECTIONS:
+                {section_list}
+                
+                Current text of these sections:
+                
+                {current_sections}
+                
+                Instructions:
+                1. Return ONLY the sections listed above, with exactly the same headings, in the same order
+                2. Keep everything that is still accurate; change only what the code change affects
+                3. Use proper markdown formatting with headers, lists, and code blocks
+                4. IMPORTANT: Return ONLY the markdown content without any introductory text
+                
+                Updated sections:
+                """
+
+def _merge_sdd_sections(sdd_text: str, updated_text: str, headings: list) -> str:
+    """
+    Replace the given sections of sdd_text with their counterparts from updated_text. Raises
+    ValueError unless updated_text contains every requested section, so a partial update
+    cannot leave stale sections behind.
+    """
+    wanted = {_normalize_heading(heading) for heading in headings}
+    updates = {}
+    for heading, text in split_markdown_sections(updated_text):
+        if heading is not None and _normalize_heading(heading) in wanted:
+            updates.setdefault(_normalize_heading(heading), text.rstrip() + "\n\n")
+    missing = [heading for heading in headings if _normalize_heading(heading) not in updates]
+    if missing:
+        raise ValueError(f"The SDD update is missing sections: {', '.join(missing)}")
+    merged = [
+        updates.get(_normalize_heading(heading), text) if heading is not None else text
+        for heading, text in split_markdown_sections(sdd_text)
+    ]
+    return "".join(merged).rstrip() + "\n"
+
+async def aupdate_SDD(text: str, previous_sdd: str, symbols: list, template_name: str = 'standard',
+                      config: Optional[dict] = None, on_partial=None, limits=None) -> tuple:
+    """
+    Bring a previous SDD up to date with changed code by rewriting only the sections that
+    mention the changed symbols. Falls back to aget_SDD when no section mentions them, when
+    more than SDD_UPDATE_MAX_FRACTION of the sections do, or when the update cannot be merged.
+    
+    Returns:
+        Tuple of (SDD, headings of the rewritten sections, or None if it was regenerated in full)
+    """
+    headings = affected_sdd_sections(previous_sdd, symbols)
+    total = sum(1 for heading, _ in split_markdown_sections(previous_sdd) if heading is not None)
+    if headings and len(headings) <= SDD_UPDATE_MAX_FRACTION * total:
+        try:
+            wanted = set(headings)
+            sections = [(heading, section) for heading, section in split_markdown_sections(previous_sdd)
+                        if heading in wanted]
+            update_prompt = _build_sdd_update_prompt(template_name, sections, symbols)
+            text = await _afit_text_to_budget(text, update_prompt, config, limits)
+            updated = await _acall_llm(update_prompt, SDD_UPDATE_TASK, temperature=0.3, config=config,
+                                       on_partial=on_partial, limits=limits, context=_build_source_context(text))
+            logger.info(f"Updated {len(headings)} of {total} SDD sections")
+            return _merge_sdd_sections(previous_sdd, clean_markdown_wrappers(updated), headings), headings
+        except Exception as e:
+            logger.error(f"Error updating SDD sections, regenerating the SDD: {str(e)}")
+    return await aget_SDD(text, template_name, config=config, on_partial=on_partial, limits=limits), None
+
+def _build_sdd_single_prompt(template_name: str) -> str:
+    """Build the instructions for the fallback single-generation SDD; the code is sent as shared context."""
+    sections = get_template_sections(template_name)
+    template_info = SDD_TEMPLATES.get(template_name, SDD_TEMPLATES['standard'])
+    
+    template_structure = "\n".join([f"- {section}" for section in sections])
+    
+    return f"""
+        Analyze the code above and generate a Software Design Document (SDD) 
         following the {template_info['name']} template structure.
         
         Required sections to cover:
@@ -452,22 +1310,29 @@ def get_SDD_single(text: str, template_name: str = 'standard') -> str:
         5. IMPORTANT: Return ONLY the markdown content without any introductory text
         6. If you cannot complete all sections due to length limits, prioritize the first sections
         
-        Code to analyze:
-        {text[:4000]}
-        
         Generate an SDD following the structure:
         """
-        
-        return _call_llm(enhanced_prompt, "Generate SDD (single generation)", temperature=0.3)
+
+def get_SDD_single(text: str, template_name: str = 'standard') -> str:
+    """
+    Fallback single-generation method for SDD.
+    """
+    try:
+        enhanced_prompt = _build_sdd_single_prompt(template_name)
+        text = _fit_text_to_budget(text, enhanced_prompt)
+        return _call_llm(enhanced_prompt, "Generate SDD (single generation)", temperature=0.3,
+                         context=_build_source_context(text))
         
     except Exception as e:
         logger.error(f"Error in single SDD generation: {str(e)}")
         return f"# Error Generating SDD\n\nAn error occurred while generating the SDD: {str(e)}"
 
-def get_mindmap(text: str) -> str:
-    """Generate a mindmap in markdown format from the text."""
-    enhanced_prompt = f"""
-    Create a comprehensive mindmap to show the workflow of the code in markdown format for the following code.
+MINDMAP_TASK = "Generate comprehensive mindmap in markdown format"
+
+def _build_mindmap_prompt() -> str:
+    """Build the execution-flow mindmap instructions; the code is sent as shared context."""
+    return """
+    Create a comprehensive mindmap to show the workflow of the code in markdown format for the code above.
     
     Instructions:
     1. Use bullet points and proper indentation to show the hierarchical execution flow
@@ -485,16 +1350,251 @@ def get_mindmap(text: str) -> str:
     9. Make it comprehensive enough to understand the complete execution path
     10. Do not include any mermaid or other code blocks, just pure markdown with bullet points
     
-    Code to analyze:
-    {text}
-    
     Generate a detailed mindmap:
     """
-    
-    result = _call_llm(enhanced_prompt, "Generate comprehensive mindmap in markdown format")
+
+def get_mindmap(text: str) -> str:
+    """Generate a mindmap in markdown format from the text."""
+    text = _fit_text_to_budget(text, _build_mindmap_prompt())
+    result = _call_llm(_build_mindmap_prompt(), MINDMAP_TASK, context=_build_source_context(text))
     # Clean markdown wrapper if present
     return result
 
+async def aget_mindmap(text: str, config: Optional[dict] = None, on_partial=None, limits=None) -> str:
+    """Async variant of get_mindmap."""
+    text = await _afit_text_to_budget(text, _build_mindmap_prompt(), config, limits)
+    return await _acall_llm(_build_mindmap_prompt(), MINDMAP_TASK, config=config, on_partial=on_partial,
+                            limits=limits, context=_build_source_context(text))
+
+SIBLING_DIFF_TASK = "Adapt a document of one file to a near-identical file"
+ARTIFACT_DESCRIPTIONS = {
+    "SDD": "Software Design Document (SDD)",
+    "Mindmap": "execution-flow mindmap in markdown",
+    "Summary": "summary"
+}
+
+def _build_sibling_diff_prompt(artifact: str, sibling_name: str, filename: str, sibling_document: str) -> str:
+    """Build the instructions for deriving an artifact from a sibling's; the diff is sent as shared context."""
+    description = ARTIFACT_DESCRIPTIONS.get(artifact, artifact)
+    return f"""
+                The diff above turns {sibling_name} into {filename}; the two files are otherwise identical.
+                Below is the {description} of {sibling_name}.
+
+                Rewrite it so that it documents {filename} instead.
+
+                Instructions:
+                1. Keep the structure, headings and everything the diff does not affect
+                2. Update names, behaviour and details that the diff changes, adds or removes
+                3. Refer to {filename} wherever the document names the file
+                4. IMPORTANT: Return ONLY the rewritten document without any introductory text
+
+                {description} of {sibling_name}:
+
+                {sibling_document}
+
+                {description} of {filename}:
+                """
+
+async def aderive_artifact(artifact: str, sibling_document: str, diff: str, sibling_name: str, filename: str,
+                           config: Optional[dict] = None, on_partial=None, limits=None) -> str:
+    """
+    Generate an artifact ("SDD", "Mindmap" or "Summary") of a near-duplicate file from the same
+    artifact of its sibling and the diff between the two files, in a single call.
+    """
+    prompt = _build_sibling_diff_prompt(artifact, sibling_name, filename, sibling_document)
+    return await _acall_llm(prompt, SIBLING_DIFF_TASK, temperature=0.3, config=config, on_partial=on_partial,
+                            limits=limits, context=f"Diff from {sibling_name} to {filename}:\n{diff}")
+
+# Stored artifacts: finished SDDs, mindmaps and summaries keyed by their input, so unchanged
+# files are served without any LLM call. Bump when generation changes in ways the prompts don't show.
+ARTIFACT_PIPELINE_VERSION = "1"
+
+def _artifact_prompt_version(artifact: str, template_name: str) -> str:
+    """Fingerprint of the prompts and temperature that shape an artifact; editing any of them retires stored results."""
+    if artifact == "SDD":
+        parts = [_build_sdd_prompt(template_name), SDD_TASK, SDD_FALLBACK_PROMPT, SDD_FALLBACK_TASK, "0.3"]
+    elif artifact == "Mindmap":
+        parts = [_build_mindmap_prompt(), MINDMAP_TASK, "0.5"]
+    elif artifact == "Facts":
+        parts = [_build_code_facts_prompt(), CODE_FACTS_TASK, CODE_FACTS_HEADER, "0.2"]
+    else:
+        parts = [SUMMARY_INSTRUCTIONS, SUMMARY_TASK, _build_summary_part_prompt(1, 1), SUMMARY_PART_TASK, "0.5"]
+    parts += [_build_code_notes_prompt(1, 1), CODE_NOTES_TASK, _build_notes_merge_prompt(1, 1), CODE_NOTES_MERGE_TASK,
+              ARTIFACT_PIPELINE_VERSION]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+def artifact_store_key(text: str, artifact: str, template_name: str, config: dict) -> str:
+    """
+    Result-store key of an artifact generated from text. Only the SDD depends on the
+    template; a summary of an SDD is keyed by the SDD text it summarizes.
+    """
+    template = template_name if artifact == "SDD" else ""
+    return make_artifact_key(text, artifact, template, config['model'], config['base_url'],
+                             _artifact_prompt_version(artifact, template_name))
+
+def load_artifact(key: str) -> Optional[str]:
+    """Stored artifact for key, or None (always None while the session bypasses caches)."""
+    if is_cache_bypassed():
+        return None
+    return get_result_store().get(key)
+
+def save_artifact(key: str, value: Optional[str]) -> None:
+    if value and value.strip():
+        get_result_store().put(key, value)
+
+# Batch plans: generators that yield lists of batch requests (see _batch_request) and receive
+# the cleaned responses in the same order, None for requests that failed. A plan's return
+# value is its artifact. batch.py merges the rounds of every file into one batch per round.
+
+def _batch_request(prompt: str, task_description: str, temperature: float, config: dict,
+                   context: Optional[str] = None) -> dict:
+    """Build one batch request; its id is the response-cache key, so batch and interactive calls share results."""
+    config, full_prompt, cache_key = _prepare_llm_request(prompt, task_description, temperature, config, context)
+    return {
+        'custom_id': cache_key,
+        'task': task_description,
+        'body': {
+            'model': config['model'],
+            'messages': [{"role": "user", "content": full_prompt}],
+            'temperature': temperature
+        }
+    }
+
+def _require_responses(responses: list, task_description: str) -> list:
+    if any(response is None for response in responses):
+        raise ValueError(f"Batch request failed: {task_description}")
+    return responses
+
+def _batch_parallel(plans: list):
+    """Run several plans in lockstep, merging their rounds; returns their results in order."""
+    results = [None] * len(plans)
+    active = {}
+    
+    def advance(i, responses=None):
+        try:
+            active[i] = plans[i].send(responses)
+        except StopIteration as stop:
+            active.pop(i, None)
+            results[i] = stop.value
+    
+    for i in range(len(plans)):
+        advance(i)
+    while active:
+        rounds = list(active.items())
+        responses = yield [request for _, requests in rounds for request in requests]
+        offset = 0
+        for i, requests in rounds:
+            advance(i, responses[offset:offset + len(requests)])
+            offset += len(requests)
+    return results
+
+def _batch_fit_text(text: str, prompt_template: str, config: dict):
+    """Batch plan variant of _fit_text_to_budget; each level of notes is one batch round."""
+    for level in range(MAX_NOTES_REDUCE_DEPTH):
+        plan = _plan_code_notes(text, prompt_template, config, level)
+        if plan is None:
+            return text
+        requests, task_description = plan
+        notes = yield [_batch_request(prompt, task_description, 0.2, config, context) for context, prompt in requests]
+        text = _join_code_notes(_require_responses(notes, task_description))
+    return _truncate_code_notes(text, prompt_template, config)
+
+def _batch_sdd(text: str, template_name: str, config: dict):
+    """Batch plan variant of get_SDD_perSection; failed parts are left out like in interactive runs."""
+    template_info = SDD_TEMPLATES.get(template_name, SDD_TEMPLATES['standard'])
+    section_groups = _get_sdd_section_groups(template_name, get_template_sections(template_name))
+    part_prompts = [_build_sdd_part_prompt(template_info, group) for group in section_groups]
+    
+    contexts = _retrieve_section_contexts(text, template_info, section_groups, part_prompts, config)
+    if contexts is None:
+        text = yield from _batch_fit_text(text, max(part_prompts, key=len), config)
+        contexts = [_build_source_context(text)] * len(section_groups)
+    parts = yield [
+        _batch_request(part_prompt, f"Generate SDD part {i+1}", 0.3, config, contexts[i])
+        for i, part_prompt in enumerate(part_prompts)
+    ]
+    sdd_parts = [part.strip() for part in parts if part and part.strip()]
+    if not sdd_parts:
+        raise ValueError("Every SDD part failed")
+    
+    complete_sdd = "\n\n".join(sdd_parts)
+    if not complete_sdd.startswith('#'):
+        complete_sdd = f"# {template_info['name']}\n\n*Generated by CodeDocuAI*\n\n" + complete_sdd
+    return complete_sdd
+
+def _batch_mindmap(text: str, config: dict):
+    """Batch plan variant of get_mindmap."""
+    text = yield from _batch_fit_text(text, _build_mindmap_prompt(), config)
+    (mindmap,) = yield [_batch_request(_build_mindmap_prompt(), MINDMAP_TASK, 0.5, config, _build_source_context(text))]
+    return _require_responses([mindmap], MINDMAP_TASK)[0]
+
+def _batch_code_facts(text: str, config: dict):
+    """Batch plan variant of aget_code_facts."""
+    text = yield from _batch_fit_text(text, _build_code_facts_prompt(), config)
+    (facts,) = yield [_batch_request(_build_code_facts_prompt(), CODE_FACTS_TASK, 0.2, config,
+                                     _build_source_context(text))]
+    return _wrap_code_facts(_require_responses([facts], CODE_FACTS_TASK)[0])
+
+def _batch_summary(text: str, config: dict):
+    """Batch plan variant of summarize_text, one round per map-reduce level."""
+    for _ in range(MAX_SUMMARY_REDUCE_DEPTH):
+        requests = _plan_summary_map(text, config)
+        if requests is None:
+            break
+        partials = yield [
+            _batch_request(prompt, SUMMARY_PART_TASK, 0.5, config, context) for context, prompt in requests
+        ]
+        text = _join_partial_summaries(_require_responses(partials, SUMMARY_PART_TASK))
+    else:
+        text = _truncate_summary_input(text, config)
+    (summary,) = yield [_batch_request(SUMMARY_INSTRUCTIONS, SUMMARY_TASK, 0.5, config, text)]
+    return _require_responses([summary], SUMMARY_TASK)[0]
+
+def batch_file_plan(source: dict, options: list, template_name: str, config: dict, code_facts: bool = True,
+                    skeleton_fidelity: str = SKELETON_FIDELITY):
+    """
+    Batch plan producing the same file_result dict as the interactive pipeline.
+    Large files are first compressed into a code skeleton and condensed into code facts;
+    SDD and mindmap then run side by side, and the summary is made from the SDD when one
+    is generated.
+    
+    Args:
+        source: {'filename', 'content'} dict
+        options: Artifacts to generate ("SDD", "Mindmap", "Summary")
+        template_name: SDD template to use
+        config: API configuration snapshot
+        code_facts: Generate artifacts from a code-facts document instead of the source
+        skeleton_fidelity: Skeleton fidelity for large code files (see skeleton.py)
+    """
+    file_result = {
+        'filename': source['filename'],
+        'content': source['content'],
+        'sdd': None,
+        'mindmap': None,
+        'summary': None,
+        'template_used': template_name
+    }
+    text = source['content']
+    if options and uses_skeleton(text, skeleton_fidelity):
+        text = build_skeleton(text, source['filename'], skeleton_fidelity)
+    if code_facts and options and uses_code_facts(text):
+        text = yield from _batch_code_facts(text, config)
+    plans = {}
+    if "SDD" in options:
+        plans['sdd'] = _batch_sdd(text, template_name, config)
+    if "Mindmap" in options:
+        plans['mindmap'] = _batch_mindmap(text, config)
+    if "Summary" in options and "SDD" not in options:
+        plans['summary'] = _batch_summary(text, config)
+    
+    artifacts = yield from _batch_parallel(list(plans.values()))
+    file_result.update(zip(plans, artifacts))
+    if file_result['sdd']:
+        file_result['sdd'] = clean_markdown_wrappers(file_result['sdd'])
+        if "Summary" in options:
+            file_result['summary'] = yield from _batch_summary(file_result['sdd'], config)
+    return file_result
+
 def generate_flowchart(summary: str) -> str:
     """
     Generate Graphviz flowchart from summary text.
@@ -541,21 +1641,21 @@ def generate_tts(text: str, output_path: Optional[str] = None) -> str:
 def test_api_connection() -> bool:
     """Test if the API connection is working with current configuration."""
     try:
-        client = get_openai_client()
         config = get_current_api_config()
         model_name = config['model']
         
         logger.info(f"Testing API connection for {config['provider']} with model {model_name}")
         
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[{
-                "role": "user",
-                "content": "Say 'Hello, API is working!'"
-            }],
-            stream=False,
-            temperature=0.1
-        )
+        with _lease_openai_client(config) as client:
+            response = client.chat.completions.create(
+                model=model_name,
+                messages=[{
+                    "role": "user",
+                    "content": "Say 'Hello, API is working!'"
+                }],
+                stream=False,
+                temperature=0.1
+            )
         
         result = response.choices[0].message.content.strip()
         st.success(f"✅ API Test Successful ({config['provider']}): {result}")
@@ -581,6 +1681,107 @@ def get_api_configs() -> dict:
     """Get available API configurations."""
     return API_CONFIGS
 
+def get_connection_pool_stats() -> dict:
+    """Get statistics for the shared LLM connection pool."""
+    return get_pool_stats()
+
+def get_provider_rate_limit_stats() -> dict:
+    """Get adaptive rate limiter statistics per provider."""
+    return get_rate_limiter_stats()
+
+def get_prompt_cache_stats() -> dict:
+    """Get cached vs. uncached prompt token totals per provider, as reported in response.usage."""
+    return get_usage_tracker().stats()
+
+def get_single_flight_stats() -> dict:
+    """Get counters for in-flight request deduplication."""
+    return get_single_flight().stats()
+
+def get_response_cache_stats() -> dict:
+    """Get hit/miss and size statistics for the persistent response cache."""
+    return get_response_cache().stats()
+
+def clear_response_cache():
+    """Remove all cached LLM responses."""
+    get_response_cache().clear()
+    logger.info("Response cache cleared")
+
+def get_result_store_stats() -> dict:
+    """Get hit/miss and size statistics for the store of finished artifacts."""
+    return get_result_store().stats()
+
+def clear_result_store():
+    """Remove all stored artifacts, so every file is regenerated on the next run."""
+    get_result_store().clear()
+    logger.info("Result store cleared")
+
+def get_provider_latency_stats() -> dict:
+    """Get p50/p95/p99 call latency, hedge and failover counters per provider."""
+    return get_latency_tracker().stats()
+
+def add_api_endpoint(provider: str, base_url: str, model: str, api_key: str,
+                     weight: float = 1.0, max_concurrency: Optional[int] = None):
+    """
+    Add an extra API key/endpoint that shares the load with the active configuration.
+    Responses are cached under the active model, so the endpoint must serve that model;
+    raises ValueError otherwise. Endpoints left serving another model after the active
+    configuration changes stay in the pool but take no calls.
+    """
+    active_model = get_current_api_config()['model']
+    if model != active_model:
+        raise ValueError(f"Pooled endpoints must serve the configured model {active_model}, not {model}")
+    get_endpoint_pool().add_endpoint({
+        'provider': provider,
+        'base_url': base_url,
+        'model': model,
+        'api_key': api_key,
+        'weight': weight,
+        'max_concurrency': max_concurrency
+    })
+
+def remove_api_endpoint(label: str):
+    """Remove an extra endpoint by its label."""
+    get_endpoint_pool().remove_endpoint(label)
+    logger.info(f"Removed endpoint {label} from the pool")
+
+def get_api_endpoints() -> list:
+    """Get the extra endpoints with their labels, and whether they serve the active model; API keys are left out."""
+    active_model = get_current_api_config()['model']
+    return [
+        {'label': endpoint_label(endpoint), 'provider': endpoint['provider'], 'base_url': endpoint['base_url'],
+         'model': endpoint['model'], 'weight': endpoint['weight'], 'max_concurrency': endpoint['max_concurrency'],
+         'active': endpoint['model'] == active_model}
+        for endpoint in get_endpoint_pool().extra_endpoints()
+    ]
+
+def get_call_metrics_summary(group_by: str = 'provider') -> dict:
+    """Get request counts, latency percentiles and token totals grouped by 'provider', 'model' or 'task'."""
+    return get_metrics().summary(group_by)
+
+def export_call_metrics(fmt: str = 'prometheus') -> str:
+    """Export per-call metrics as Prometheus text ('prometheus') or recent call records as JSON lines ('jsonl')."""
+    if fmt == 'jsonl':
+        return get_metrics().json_lines()
+    return get_metrics().prometheus_text()
+
+def get_endpoint_pool_stats() -> dict:
+    """Get load, latency and error rate per endpoint."""
+    return get_endpoint_pool().stats()
+
+def set_secondary_api_config(provider: str, base_url: str, model: str, api_key: str,
+                             hedge_percentile: Optional[float] = None):
+    """
+    Set the secondary provider used for failover, and optionally for hedging calls slower
+    than the primary provider's hedge_percentile latency. An empty api_key disables it.
+    """
+    os.environ["SECONDARY_OPENAI_API_KEY"] = api_key
+    os.environ["SECONDARY_OPENAI_BASE_URL"] = base_url
+    os.environ["SECONDARY_OPENAI_MODEL"] = model
+    os.environ["SECONDARY_API_PROVIDER"] = provider
+    os.environ["LLM_HEDGE_PERCENTILE"] = str(hedge_percentile or "")
+    logger.info(f"Secondary API configuration set for provider: {provider} "
+                f"(hedging {'at p' + str(hedge_percentile) if hedge_percentile else 'off'})")
+
 def set_api_config(provider: str, base_url: str, model: str, api_key: str):
     """Set API configuration in environment variables."""
     os.environ["OPENAI_API_KEY"] = api_key